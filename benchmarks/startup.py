@@ -0,0 +1,141 @@
+# Startup benchmark
+#
+# Measures how long skel takes to start and finish in the two situations that hooks and
+# scripts hit over and over:
+#   help   - skel without arguments
+#   cached - skel applying a template whose compiled plan is already cached
+# Every run is a fresh interpreter. The scenarios are run interleaved with a bare "python -c pass",
+# the fastest of all runs is kept, and times are reported relative to the bare interpreter so
+# that the baseline can be compared across machines.
+#
+# The benchmark fails (exit status 1) if:
+#   - a module that must stay off the hot path (see LAZY_MODULES) is imported by a cached run
+#   - the relative startup time of a scenario exceeds its baseline by more than the tolerance
+#
+# Usage: python benchmarks/startup.py [--runs N] [--tolerance PERCENT] [--update-baseline]
+
+import os, os.path, sys, compileall, json, shutil, subprocess, tempfile, time, argparse
+
+from typing import Callable, Dict, List, Set
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+SKEL_HOME            = os.path.dirname(BENCHMARKS_DIRECTORY)
+BASELINE_FILE        = os.path.join(BENCHMARKS_DIRECTORY, "startup_baseline.json")
+
+# Modules that are only needed to compile templates or to generate several targets at once
+LAZY_MODULES = ("lxml", "utils.compiler", "utils.validators", "concurrent.futures", "hashlib", "typing")
+
+TEMPLATE = """<root>
+    <dir name="src">
+        <file name="main.py"/>
+        <dir name="utils">
+            <file name="__init__.py"/>
+        </dir>
+    </dir>
+    <dir name="docs"/>
+    <file name="README.md"/>
+</root>
+"""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of skel")
+    parser.add_argument("--runs", type=int, default=30, help="Number of runs per scenario (default: 30)")
+    parser.add_argument("--tolerance", type=float, default=25.0, help="Allowed regression in percent (default: 25)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="skel-startup-") as workdir:
+        main_py = _make_skel_home(workdir)
+        # Measure in-process runs, even if a skel daemon is running
+        os.environ["SKEL_SOCKET"] = os.path.join(workdir, "skel.sock")
+        scenarios: Dict[str, Callable[[object], List[str]]] = {
+            "bare"  : lambda run: [sys.executable, "-c", "pass"],
+            "help"  : lambda run: [sys.executable, main_py],
+            "cached": lambda run: [sys.executable, main_py, "startup", os.path.join(workdir, "targets", str(run))],
+        }
+        # Compile and cache the template once
+        subprocess.run(scenarios["cached"]("warmup"), stdout=subprocess.DEVNULL, check=True)
+
+        failed = False
+        eager_modules = sorted(m for m in _imported_modules(scenarios["cached"]("imports")) if m.startswith(LAZY_MODULES))
+        if eager_modules:
+            print("✘ Imported on the cached path: {}".format(", ".join(eager_modules)))
+            failed = True
+
+        timings = _fastest_ms(scenarios, runs=args.runs)
+        bare_ms = timings.pop("bare")
+        results = {}
+        for name, ms in timings.items():
+            results[name] = round(ms / bare_ms, 3)
+            print("{:<8} {:7.1f} ms  ({:.2f}x python -c pass, {:.1f} ms)".format(name, ms, ms / bare_ms, bare_ms))
+
+    if args.update_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump({"python": "{}.{}".format(*sys.version_info[:2]), "scenarios": results}, f, indent=4)
+            f.write("\n")
+        print("Baseline updated: \"{}\"".format(BASELINE_FILE))
+        return 1 if failed else 0
+
+    try:
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)["scenarios"]
+    except (OSError, ValueError, KeyError):
+        print("No baseline found; run with --update-baseline first")
+        return 1
+    for name, ratio in results.items():
+        limit = baseline.get(name, ratio) * (1 + args.tolerance / 100)
+        if ratio > limit:
+            print("✘ {}: {:.2f}x exceeds the baseline of {:.2f}x".format(name, ratio, baseline[name]))
+            failed = True
+    if not failed:
+        print("✔ No startup regression")
+    return 1 if failed else 0
+
+
+def _make_skel_home(workdir: str) -> str:
+    # A private copy of skel, so that the benchmark neither reads nor pollutes the real template cache
+    skel_home = os.path.join(workdir, "skel")
+    shutil.copytree(os.path.join(SKEL_HOME, "src"), os.path.join(skel_home, "src"),
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    # Byte-compile the copy up front, as an installation would be (PYTHONDONTWRITEBYTECODE would
+    # otherwise make every run compile the sources again)
+    compileall.compile_dir(os.path.join(skel_home, "src"), quiet=1)
+    templates_dir = os.path.join(skel_home, "resources", "templates")
+    os.makedirs(templates_dir)
+    os.makedirs(os.path.join(skel_home, "resources", "filesrc"))
+    template_file = os.path.join(templates_dir, "startup.xml")
+    with open(template_file, "w") as f:
+        f.write(TEMPLATE)
+    # Pretend that the templates were installed a while ago, as they would be in practice
+    # (the cache doesn't trust files modified within the last couple of seconds)
+    an_hour_ago = time.time() - 3600
+    os.utime(template_file, (an_hour_ago, an_hour_ago))
+    os.utime(templates_dir, (an_hour_ago, an_hour_ago))
+    return os.path.join(skel_home, "src", "main.py")
+
+
+def _imported_modules(args: List[str]) -> Set[str]:
+    # Parses the output of "python -X importtime"
+    result = subprocess.run(args[:1] + ["-X", "importtime"] + args[1:], stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True, check=True)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def _fastest_ms(scenarios: Dict[str, Callable[[object], List[str]]], *, runs: int) -> Dict[str, float]:
+    # Runs the scenarios in turn, so that they are equally affected by changes in the load of the machine
+    fastest = {name: float("inf") for name in scenarios}
+    for run in range(runs):
+        for name, make_args in scenarios.items():
+            start = time.perf_counter()
+            subprocess.run(make_args(run), stdout=subprocess.DEVNULL, check=True)
+            fastest[name] = min(fastest[name], time.perf_counter() - start)
+    return {name: seconds * 1000 for name, seconds in fastest.items()}
+
+
+if __name__ == "__main__":
+    sys.exit(main())
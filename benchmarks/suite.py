@@ -0,0 +1,336 @@
+# Benchmark suite
+#
+# Generates synthetic templates of several shapes and times every phase of skel separately:
+#   parse    - reading the XML with lxml, without validating or compiling it
+#   validate - the validation of the elements and of the src paths (part of compile)
+#   compile  - parse_template() without the cache: parsing, validation and compilation
+#   load     - parse_template() with the compiled template in the cache
+#   generate - generate_skeleton() into fresh targets, on a tmpfs and on a regular disk
+# Every measurement is repeated and the fastest run is kept.
+#
+# Filesystem operations are counted with an audit hook (sys.addaudithook) while generating,
+# and reported per created entry. Only operations that raise audit events are counted (open,
+# mkdir, link, symlink, chmod, ...); stat() calls aren't audited.
+#
+# The results are written as JSON and compared with the stored baseline. The benchmark fails
+# (exit status 1) if a phase takes longer than the baseline by more than the tolerance, or if
+# more filesystem operations are needed per entry. Timings are only comparable on the same
+# machine: record a baseline (--update-baseline) before making changes.
+#
+# Usage: python benchmarks/suite.py [--scale X] [--repeat N] [--shapes a,b] [--tmpfs DIR] [--disk DIR]
+#                                   [--output FILE] [--tolerance PERCENT] [--update-baseline]
+
+import os, os.path, sys, io, json, shutil, subprocess, tempfile, time, argparse
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+SKEL_HOME            = os.path.dirname(BENCHMARKS_DIRECTORY)
+BASELINE_FILE        = os.path.join(BENCHMARKS_DIRECTORY, "suite_baseline.json")
+
+# Phases shorter than this (in the baseline) are too noisy to be compared
+MIN_COMPARED_MS = 5.0
+
+
+class Shape:
+    def __init__(self, *, name: str, desc: str, write_template: Callable[[io.TextIOBase, float, str], None],
+                 targets: Callable[[float], int] = lambda scale: 1) -> None:
+        self.name           = name
+        self.desc           = desc
+        self.write_template = write_template
+        self.targets        = targets  # Number of targets to generate, given the scale
+
+
+def _write_wide(f: io.TextIOBase, scale: float, filesrc_dir: str) -> None:
+    f.write("<root>\n")
+    for d in range(max(1, int(20 * scale))):
+        f.write("  <dir name=\"d{}\">\n".format(d))
+        for i in range(1000):
+            f.write("    <file name=\"f{}\"/>\n".format(i))
+        f.write("  </dir>\n")
+    f.write("</root>\n")
+
+
+def _write_deep(f: io.TextIOBase, scale: float, filesrc_dir: str) -> None:
+    # libxml2 doesn't accept more than 2048 levels of nesting
+    depth = min(2000, max(1, int(1000 * scale)))
+    f.write("<root>\n")
+    for d in range(depth):
+        f.write("<dir name=\"d{}\"><file name=\"f\"/>\n".format(d))
+    f.write("</dir>" * depth)
+    f.write("\n</root>\n")
+
+
+def _write_many_src(f: io.TextIOBase, scale: float, filesrc_dir: str) -> None:
+    # Many <file> elements sharing a few small src files
+    sources = []
+    for s in range(50):
+        sources.append("many{}.txt".format(s))
+        with open(os.path.join(filesrc_dir, sources[-1]), "w") as src:
+            src.write("# Source file {}\n".format(s) * 64)
+    f.write("<root>\n")
+    for i in range(max(1, int(20000 * scale))):
+        f.write("  <file name=\"f{}\" src=\"{}\"/>\n".format(i, sources[i % len(sources)]))
+    f.write("</root>\n")
+
+
+def _write_large_src(f: io.TextIOBase, scale: float, filesrc_dir: str) -> None:
+    # A few <file> elements with large src files
+    chunk = os.urandom(1024 * 1024)
+    f.write("<root>\n")
+    for s in range(8):
+        name = "large{}.bin".format(s)
+        with open(os.path.join(filesrc_dir, name), "wb") as src:
+            for _ in range(max(1, int(32 * scale))):
+                src.write(chunk)
+        f.write("  <file name=\"f{}\" src=\"{}\"/>\n".format(s, name))
+    f.write("</root>\n")
+
+
+def _write_many_targets(f: io.TextIOBase, scale: float, filesrc_dir: str) -> None:
+    # A small, typical project skeleton
+    with open(os.path.join(filesrc_dir, "LICENSE"), "w") as src:
+        src.write("Permission is hereby granted, free of charge, to any person obtaining a copy\n" * 20)
+    f.write("<root>\n  <file name=\"LICENSE\" src=\"LICENSE\"/>\n  <file name=\"README.md\"/>\n")
+    for d in ("src", "tests", "docs"):
+        f.write("  <dir name=\"{}\">\n".format(d))
+        for sub in range(3):
+            f.write("    <dir name=\"pkg{}\">\n".format(sub))
+            for i in range(4):
+                f.write("      <file name=\"module{}.py\"/>\n".format(i))
+            f.write("    </dir>\n")
+        f.write("  </dir>\n")
+    f.write("</root>\n")
+
+
+SHAPES: Dict[str, Shape] = {shape.name: shape for shape in (
+    Shape(name="wide",         desc="20 directories of 1000 files",         write_template=_write_wide),
+    Shape(name="deep",         desc="1000 levels of nested directories",    write_template=_write_deep),
+    Shape(name="many-src",     desc="20000 files sharing 50 src files",     write_template=_write_many_src),
+    Shape(name="large-src",    desc="8 files with 32 MiB src files",        write_template=_write_large_src),
+    Shape(name="many-targets", desc="a 50-entry skeleton applied to 200 targets", write_template=_write_many_targets,
+          targets=lambda scale: max(1, int(200 * scale))),
+)}
+
+
+class AuditCounter:
+    # Counts the filesystem-related audit events raised while it is enabled
+    EVENTS = ("open", "os.mkdir", "os.link", "os.symlink", "os.chmod", "os.rename", "os.remove",
+              "os.rmdir", "os.scandir", "os.listdir", "os.truncate", "os.utime", "os.chown", "fcntl.ioctl")
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.count   = 0
+        sys.addaudithook(self.__hook)  # Audit hooks can't be removed
+
+    def __hook(self, event: str, args: tuple) -> None:
+        if self.enabled and event in self.EVENTS:
+            self.count += 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the phases of skel on synthetic templates")
+    parser.add_argument("--scale", type=float, default=1.0, help="Size of the templates relative to the defaults (default: 1)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per measurement (default: 3)")
+    parser.add_argument("--shapes", default=",".join(SHAPES), help="Comma-separated shapes (default: {})".format(",".join(SHAPES)))
+    parser.add_argument("--tmpfs", default=_default_tmpfs(), help="Directory on a tmpfs (default: /dev/shm if available)")
+    parser.add_argument("--disk", default=None, help="Directory on a regular disk (default: a temporary directory, see TMPDIR)")
+    parser.add_argument("--output", default="", help="Also write the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=30.0, help="Allowed regression in percent (default: 30)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args()
+
+    shapes = [SHAPES[name] for name in args.shapes.split(",") if name]
+
+    with tempfile.TemporaryDirectory(prefix="skel-bench-") as workdir:
+        # Targets are never generated inside the source tree, unless asked to
+        disk = args.disk
+        if disk is None:
+            disk = os.path.join(workdir, "disk")
+            os.mkdir(disk)
+        filesystems = [(fs, d) for fs, d in (("tmpfs", args.tmpfs), ("disk", disk)) if d]
+        skel = PrivateSkel(workdir)
+        audit = AuditCounter()
+        results = {"scale": args.scale, "shapes": {}}
+        for shape in shapes:
+            results["shapes"][shape.name] = _benchmark_shape(skel, shape, audit=audit, scale=args.scale,
+                                                             repeat=args.repeat, filesystems=filesystems)
+
+    text = json.dumps(results, indent=4) + "\n"
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    if args.update_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            f.write(text)
+        print("Baseline updated: \"{}\"".format(BASELINE_FILE))
+        return 0
+
+    try:
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        print("No baseline found; run with --update-baseline first")
+        return 1
+    if baseline.get("scale") != args.scale:
+        print("The baseline was recorded with --scale {}; results aren't comparable".format(baseline.get("scale")))
+        return 1
+    regressions = _compare(results, baseline, tolerance=args.tolerance)
+    for regression in regressions:
+        print("✘ {}".format(regression))
+    if not regressions:
+        print("✔ No regression")
+    return 1 if regressions else 0
+
+
+def _benchmark_shape(skel: "PrivateSkel", shape: Shape, *, audit: AuditCounter, scale: float, repeat: int,
+                     filesystems: List[Tuple[str, str]]) -> Dict:
+    template_file = os.path.join(skel.templates_dir, shape.name + ".xml")
+    with open(template_file, "w") as f:
+        shape.write_template(f, scale, skel.filesrc_dir)
+    # The cache doesn't trust files modified within the last couple of seconds
+    an_hour_ago = time.time() - 3600
+    for path in [template_file] + [entry.path for entry in os.scandir(skel.filesrc_dir)]:
+        os.utime(path, (an_hour_ago, an_hour_ago))
+
+    result: Dict = {}
+    result["parse_ms"]    = _fastest_ms(lambda: skel.parse_only(template_file), repeat=repeat)
+    result["validate_ms"] = round(min(skel.validation_ms(template_file) for _ in range(repeat)), 3)
+    result["compile_ms"]  = _fastest_ms(lambda: skel.compiler.compile_template(template_file), repeat=repeat)
+
+    plan = skel.operations.parse_template(shape.name)  # Stores the compiled template in the cache
+    result["entries"] = len(plan)
+    result["load_ms"] = _fastest_ms(lambda: skel.operations.parse_template(shape.name), repeat=repeat)
+
+    targets = shape.targets(scale)
+    result["targets"] = targets
+    for fs, directory in filesystems:
+        runs: List[float] = []
+        ops: List[int] = []
+        for _ in range(repeat):
+            root = tempfile.mkdtemp(prefix="skel-bench-", dir=directory)
+            try:
+                target_dirs = [os.path.join(root, "t{}".format(t)) for t in range(targets)]
+                plan = skel.operations.parse_template(shape.name)
+                reporter = skel.make_reporter(quiet=True, stream=io.StringIO())
+                audit.count = 0
+                audit.enabled = True
+                start = time.perf_counter()
+                skel.operations.generate_skeleton(inside=target_dirs, based_on=plan, reporter=reporter)
+                runs.append(time.perf_counter() - start)
+                audit.enabled = False
+                ops.append(audit.count)
+            finally:
+                audit.enabled = False
+                _remove_tree(root)
+        result["generate_{}_ms".format(fs)] = round(min(runs) * 1000, 3)
+        result["fs_ops_per_entry_{}".format(fs)] = round(min(ops) / max(1, len(plan) * targets), 3)
+
+    print("{:<13} {}".format(shape.name, ", ".join("{}={}".format(k, v) for k, v in result.items())))
+    os.unlink(template_file)
+    return result
+
+
+def _compare(results: Dict, baseline: Dict, *, tolerance: float) -> List[str]:
+    regressions = []
+    for shape_name, result in results["shapes"].items():
+        previous = baseline["shapes"].get(shape_name)
+        if previous is None:
+            continue
+        for key, value in result.items():
+            old = previous.get(key)
+            if old is None:
+                continue
+            if key.endswith("_ms"):
+                if (old >= MIN_COMPARED_MS) and (value > old * (1 + tolerance / 100)):
+                    regressions.append("{} {}: {} ms (baseline: {} ms)".format(shape_name, key, value, old))
+            elif key.startswith("fs_ops_per_entry"):
+                if value > old + 0.01:
+                    regressions.append("{} {}: {} (baseline: {})".format(shape_name, key, value, old))
+    return regressions
+
+
+def _remove_tree(path: str) -> None:
+    # shutil.rmtree() is recursive, and runs out of stack on the "deep" shape
+    subprocess.run(["rm", "-rf", "--", path], check=True)
+
+
+def _fastest_ms(run: Callable[[], None], *, repeat: int) -> float:
+    fastest = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        fastest = min(fastest, time.perf_counter() - start)
+    return round(fastest * 1000, 3)
+
+
+class PrivateSkel:
+    # A copy of skel with its own resources directory, so that the benchmark neither reads nor
+    # pollutes the real templates and cache
+    def __init__(self, workdir: str) -> None:
+        skel_home = os.path.join(workdir, "skel")
+        shutil.copytree(os.path.join(SKEL_HOME, "src"), os.path.join(skel_home, "src"),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+        self.templates_dir = os.path.join(skel_home, "resources", "templates")
+        self.filesrc_dir   = os.path.join(skel_home, "resources", "filesrc")
+        os.makedirs(self.templates_dir)
+        os.makedirs(self.filesrc_dir)
+
+        sys.path.insert(0, os.path.join(skel_home, "src"))
+        from utils import compiler, operations, validators
+        from utils.reporting import make_reporter
+        from lxml import etree
+        self.compiler      = compiler
+        self.operations    = operations
+        self.validators    = validators
+        self.make_reporter = make_reporter
+        self.etree         = etree
+
+    def validation_ms(self, template_file: str) -> float:
+        # Validation is interleaved with parsing and compiling, so the validating functions are
+        # timed individually during one compilation
+        elapsed = [0.0]
+        def timed(function: Callable) -> Callable:
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    elapsed[0] += time.perf_counter() - start
+            return wrapper
+        validate_element = self.compiler._validate_xml_element
+        check_src_paths  = self.validators.check_src_paths
+        self.compiler._validate_xml_element = timed(validate_element)
+        self.validators.check_src_paths     = timed(check_src_paths)
+        try:
+            self.compiler.compile_template(template_file)
+        finally:
+            self.compiler._validate_xml_element = validate_element
+            self.validators.check_src_paths     = check_src_paths
+        return elapsed[0] * 1000
+
+    def parse_only(self, template_file: str) -> None:
+        # The same streaming parse as compile_template(), without validating or compiling
+        for _, element in self.etree.iterparse(template_file, events=("end",), huge_tree=True,
+                                               remove_comments=True, remove_pis=True):
+            element.clear()
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+
+
+def _default_tmpfs() -> str:
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                fields = line.split()
+                if (len(fields) > 2) and (fields[1] == "/dev/shm") and (fields[2] == "tmpfs"):
+                    return fields[1]
+    except OSError:
+        pass
+    return ""
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,47 @@
 import sys
-from utils.operations import *
+from utils import daemon
+from utils.error_handling import BadCmdlineArgument
+from utils.cli import parse_cmdline_options
 
-cli_args = sys.argv[1:]
+# utils.operations (and everything it imports) is only loaded when the command isn't handled by a daemon
 
-try:
+
+def run(options, cli_args) -> None:
+    from utils import operations
+    if options.batch:
+        if not operations.run_batch(options, options.batch):
+            sys.exit(1)
+        return
     if len(cli_args) == 0:
+        operations.display_help()
+        return
+    operations.run(options, cli_args)
+
+
+def display_help() -> None:
+    from utils import operations
+    operations.display_help()
+
+
+try:
+    options, cli_args = parse_cmdline_options(sys.argv[1:])
+    status = daemon.forward(sys.argv[1:]) if daemon.can_forward(options, cli_args) else None
+    if status == daemon.EXIT_BAD_ARGUMENT:
+        print()
         display_help()
+    elif status is not None:
+        pass  # The command was run by the daemon
+    elif options.serve:
+        daemon.serve()
+    elif options.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(run, options, cli_args)
+        finally:
+            profiler.dump_stats(options.profile)
     else:
-        check_cli_arguments(cli_args)
-        chosen_template = cli_args[0]
-        target_directories = cli_args[1:]
-        root_element = parse_template(chosen_template)
-        generate_skeleton(inside=target_directories, based_on=root_element)
+        run(options, cli_args)
 except BadCmdlineArgument as error:
     print(error)
     print()
@@ -8,30 +8,31 @@ SRC_DIRECTORY = os.path.dirname(UTILS_PACKAGE_DIRECTORY)
 SKEL_HOME = os.path.dirname(SRC_DIRECTORY) 
 TEMPLATES_DIRECTORY = os.path.join(SKEL_HOME, "resources/templates")
 FILE_SRC_DIRECTORY  = os.path.join(SKEL_HOME, "resources/filesrc")
+CACHE_DIRECTORY     = os.path.join(SKEL_HOME, "resources/cache")
 VALID_TAGS          = {
     # Valid tags and their required attributes
     "root": tuple(),
     "dir" : ("name",),
-    "file": ("name",)
+    "file": ("name",),
+    "include": ("template",)
 }
 
-# Create templates and filesrc directories if missing
-for d in (TEMPLATES_DIRECTORY, FILE_SRC_DIRECTORY):
-    try:
-        if not os.path.exists(d):
-            os.makedirs(d)
-    except Exception as err:
-        print("Unable to create directory: \"{}\"".format(d))
-        print("Cause: ", err)
-        print("Aborting.")
-        os._exit(1)
+DEPENDENCIES        = ("lxml",)  # Only needed to compile templates; see operations.parse_template()
 
+# Importing this package must stay cheap: skel is often run in tight loops, and most runs only
+# load an already-compiled template. Anything that touches the filesystem or imports heavy
+# modules belongs in a function that is called when it's actually needed.
+# For the same reason, modules on that path only import typing for type checkers.
 
-# Make sure that all dependencies are installed
-import importlib.util
-DEPENDENCIES = ("lxml",)
-for pkg in DEPENDENCIES:
-    if not importlib.util.find_spec(pkg):
-        print("Missing dependency: '{}'".format(pkg))
-        print("Please run the setup script first.")
-        os._exit(1)
+
+def ensure_resource_directories() -> None:
+    # Create templates and filesrc directories if missing
+    for d in (TEMPLATES_DIRECTORY, FILE_SRC_DIRECTORY):
+        try:
+            if not os.path.exists(d):
+                os.makedirs(d)
+        except Exception as err:
+            print("Unable to create directory: \"{}\"".format(d))
+            print("Cause: ", err)
+            print("Aborting.")
+            os._exit(1)
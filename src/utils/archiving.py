@@ -0,0 +1,197 @@
+# Archive output (--archive)
+#
+# Instead of creating the entries of a skeleton on disk, they can be streamed straight into a
+# tar or zip archive. The contents of src files are read in chunks and written into the archive
+# as they are read, so the tree is never materialized and src files are never held in memory.
+# The archive is written sequentially, so it can be sent to a pipe ("-" for stdout).
+#
+# Formats, chosen by the extension of the archive:
+#   .tar              - uncompressed tar (also used for stdout)
+#   .tar.gz, .tgz     - gzip-compressed tar
+#   .tar.zst, .tzst   - zstd-compressed tar (requires the optional 'zstandard' package)
+#   .zip              - zip, with deflate-compressed files
+
+from __future__ import annotations
+
+import os, stat, sys, time
+
+from .error_handling import BadCmdlineArgument, MissingOptionalDependency
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import BinaryIO, Dict, Tuple
+
+STDOUT = "-"
+
+# Extension -> (container, compression)
+ARCHIVE_FORMATS = {
+    ".tar"    : ("tar", ""),
+    ".tar.gz" : ("tar", "gz"),
+    ".tgz"    : ("tar", "gz"),
+    ".tar.zst": ("tar", "zst"),
+    ".tzst"   : ("tar", "zst"),
+    ".zip"    : ("zip", ""),
+}
+
+# Method reported for the files whose contents are streamed into the archive
+ARCHIVED = "archive"
+
+DIR_MODE  = 0o755
+FILE_MODE = 0o644
+CHUNK_SIZE = 1024 * 1024
+
+
+def archive_format(path: str) -> Tuple[str, str]:
+    # Output: (container, compression) of the archive at path
+    if path == STDOUT:
+        return ARCHIVE_FORMATS[".tar"]
+    for extension, archive_format in ARCHIVE_FORMATS.items():
+        if path.endswith(extension):
+            return archive_format
+    raise BadCmdlineArgument("The archive must end with one of: {}".format(", ".join(ARCHIVE_FORMATS)))
+
+
+class ArchiveWriter:
+    # Writes entries into an archive, in the order in which they are added
+    def __init__(self, stream: BinaryIO) -> None:
+        self.stream = stream
+        self.entries: Dict[str, bool] = {}  # Path of every entry added -> whether it's a directory
+        self.mtime = int(time.time())       # All the entries get the same mtime
+
+    def add_directory(self, path: str) -> None:
+        self.entries[path] = True
+
+    def add_file(self, path: str) -> None:
+        self.entries[path] = False
+
+    def add_src_file(self, path: str, src: str) -> int:
+        # Output: The number of bytes copied from src
+        self.entries[path] = False
+        return 0
+
+    def add_symlink(self, path: str, target: str) -> None:
+        self.entries[path] = False
+
+    def close(self) -> None:
+        # Writes the end of the archive and closes the stream (stdout is only flushed)
+        if self.stream is sys.stdout.buffer:
+            self.stream.flush()
+        else:
+            self.stream.close()
+
+
+class TarArchiveWriter(ArchiveWriter):
+    def __init__(self, stream: BinaryIO, *, compression: str = "") -> None:
+        super().__init__(stream)
+        import tarfile
+        self.__tarfile = tarfile
+        self.__compressor = None
+        if compression == "zst":
+            try:
+                import zstandard
+            except ModuleNotFoundError:
+                raise MissingOptionalDependency(name="zstandard", feature="writing .zst archives")
+            self.__compressor = zstandard.ZstdCompressor().stream_writer(stream, closefd=False)
+            stream, compression = self.__compressor, ""
+        self.__tar = tarfile.open(fileobj=stream, mode="w|" + compression, format=tarfile.PAX_FORMAT)
+
+    def add_directory(self, path: str) -> None:
+        super().add_directory(path)
+        self.__tar.addfile(self.__tar_info(path, type=self.__tarfile.DIRTYPE, mode=DIR_MODE))
+
+    def add_file(self, path: str) -> None:
+        super().add_file(path)
+        self.__tar.addfile(self.__tar_info(path, type=self.__tarfile.REGTYPE, mode=FILE_MODE))
+
+    def add_src_file(self, path: str, src: str) -> int:
+        super().add_src_file(path, src)
+        with open(src, "rb") as fsrc:
+            st = os.fstat(fsrc.fileno())
+            info = self.__tar_info(path, type=self.__tarfile.REGTYPE, mode=stat.S_IMODE(st.st_mode))
+            info.size = st.st_size
+            self.__tar.addfile(info, fsrc)
+        return st.st_size
+
+    def add_symlink(self, path: str, target: str) -> None:
+        super().add_symlink(path, target)
+        info = self.__tar_info(path, type=self.__tarfile.SYMTYPE, mode=0o777)
+        info.linkname = target
+        self.__tar.addfile(info)
+
+    def close(self) -> None:
+        self.__tar.close()
+        if self.__compressor is not None:
+            self.__compressor.close()
+        super().close()
+
+    def __tar_info(self, path: str, *, type: bytes, mode: int):
+        info = self.__tarfile.TarInfo(path)
+        info.type  = type
+        info.mode  = mode
+        info.mtime = self.mtime
+        return info
+
+
+class ZipArchiveWriter(ArchiveWriter):
+    def __init__(self, stream: BinaryIO) -> None:
+        super().__init__(stream)
+        import zipfile
+        self.__zipfile = zipfile
+        self.__zip = zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED)
+        self.__date_time = time.localtime(self.mtime)[:6]
+
+    def add_directory(self, path: str) -> None:
+        super().add_directory(path)
+        info = self.__zip_info(path + "/", mode=stat.S_IFDIR | DIR_MODE)
+        info.external_attr |= 0x10  # MS-DOS directory flag
+        self.__zip.writestr(info, b"", compress_type=self.__zipfile.ZIP_STORED)
+
+    def add_file(self, path: str) -> None:
+        super().add_file(path)
+        self.__zip.writestr(self.__zip_info(path, mode=stat.S_IFREG | FILE_MODE), b"")
+
+    def add_src_file(self, path: str, src: str) -> int:
+        super().add_src_file(path, src)
+        with open(src, "rb") as fsrc:
+            st = os.fstat(fsrc.fileno())
+            info = self.__zip_info(path, mode=stat.S_IFREG | stat.S_IMODE(st.st_mode))
+            info.compress_type = self.__zipfile.ZIP_DEFLATED
+            info.file_size = st.st_size
+            with self.__zip.open(info, "w", force_zip64=st.st_size >= self.__zipfile.ZIP64_LIMIT) as fdst:
+                while True:
+                    chunk = fsrc.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    fdst.write(chunk)
+        return st.st_size
+
+    def add_symlink(self, path: str, target: str) -> None:
+        # Stored like Info-ZIP does: the target is the contents of the entry
+        super().add_symlink(path, target)
+        self.__zip.writestr(self.__zip_info(path, mode=stat.S_IFLNK | 0o777), os.fsencode(target),
+                            compress_type=self.__zipfile.ZIP_STORED)
+
+    def close(self) -> None:
+        self.__zip.close()
+        super().close()
+
+    def __zip_info(self, path: str, *, mode: int):
+        info = self.__zipfile.ZipInfo(path, date_time=self.__date_time)
+        info.external_attr = mode << 16
+        info.create_system = 3  # Unix, so that the permission bits are honored
+        return info
+
+
+def open_archive(path: str) -> ArchiveWriter:
+    # The caller must close() the writer
+    container, compression = archive_format(path)
+    stream = sys.stdout.buffer if path == STDOUT else open(path, "wb")
+    try:
+        if container == "zip":
+            return ZipArchiveWriter(stream)
+        return TarArchiveWriter(stream, compression=compression)
+    except BaseException:
+        if path != STDOUT:
+            stream.close()
+            os.unlink(path)
+        raise
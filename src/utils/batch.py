@@ -0,0 +1,70 @@
+# Batch files (--batch)
+#
+# A batch file lists jobs, one per line. Each job applies a template to some targets, written
+# either like a command line or as a JSON object:
+#   gradle-java services/api services/worker
+#   {"template": "gradle-java", "targets": ["services/api", "services/worker"]}
+# Command-line style lines support shell-like quoting. Blank lines and lines starting with '#'
+# are ignored. As on the command line, a job without targets applies its template to the
+# current working directory.
+
+from __future__ import annotations
+
+import os, sys
+
+from .error_handling import BadCmdlineArgument
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import List, TextIO
+
+STDIN = "-"
+
+
+class BatchJob:
+    __slots__ = ("template", "targets", "line")
+
+    def __init__(self, *, template: str, targets: List[str], line: int) -> None:
+        self.template = template
+        self.targets  = targets
+        self.line     = line  # Line number in the batch file
+
+
+def read_batch_file(path: str) -> List[BatchJob]:
+    # Input : Path of the batch file, or STDIN
+    # Output: The jobs, in the order in which they are listed
+    try:
+        if path == STDIN:
+            return _parse_batch(sys.stdin)
+        with open(path) as f:
+            return _parse_batch(f)
+    except OSError as e:
+        raise BadCmdlineArgument("Unable to read the batch file \"{}\": {}".format(path, e.strerror))
+
+
+def _parse_batch(stream: TextIO) -> List[BatchJob]:
+    import json, shlex
+    jobs = []
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            if line.startswith("{"):
+                record = json.loads(line)
+                if not isinstance(record, dict) or "template" not in record:
+                    raise ValueError("A JSON job must be an object with a 'template'")
+                template, targets = record["template"], record.get("targets", [])
+                if isinstance(targets, str):
+                    targets = [targets]
+                if not isinstance(template, str) or not isinstance(targets, list) or not all(isinstance(t, str) for t in targets):
+                    raise ValueError("'template' must be a string and 'targets' a list of strings")
+            else:
+                template, *targets = shlex.split(line, comments=True)
+        except ValueError as e:
+            raise BadCmdlineArgument("Invalid job on line {} of the batch file: {}".format(number, e))
+        if os.sep in template:
+            raise BadCmdlineArgument("Invalid job on line {} of the batch file: "
+                                     "Template names cannot contain path separators ({})".format(number, os.sep))
+        jobs.append(BatchJob(template=template, targets=list(targets), line=number))
+    return jobs
@@ -0,0 +1,153 @@
+# Persistent cache of compiled (parsed + validated) templates
+#
+# Each template is stored as a single file inside CACHE_DIRECTORY. The file holds the
+# compact creation plan of the template along with everything needed to decide whether
+# the plan is still valid:
+#   - the path, mtime, size and content hash of the template file
+#   - the path and mtime of every file referenced by a 'src' attribute, and of every included template
+# Loading a cached plan doesn't require lxml; it only costs a few stat() calls.
+# Entries are only written once all these files are older than RACY_WINDOW_NS: a file modified
+# again within the same mtime tick would keep its mtime, and the stale entry would be served.
+
+from __future__ import annotations
+
+import os, os.path, stat, sys, time, marshal
+
+from . import *
+from .plan import Plan
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional, Tuple
+
+# Bump this whenever the layout of the compiled plan or the validation rules change
+CACHE_FORMAT = ("skel-plan", 9, sys.version_info[:2])
+
+# mtimes closer than this to the current time aren't trusted: the file could be modified again
+# within the same mtime tick, and the change would go unnoticed
+RACY_WINDOW_NS = 2 * 10 ** 9
+
+
+def load_compiled_template(template_file: str) -> Optional[Plan]:
+    # Returns the cached plan of the template, or None if there is no valid cache entry
+    cache_file = _cache_file_for(template_file)
+    try:
+        with open(cache_file, "rb") as f:
+            entry = marshal.load(f)
+        fmt, path, mtime_ns, size, digest, dependencies, record = entry
+    except Exception:
+        # Missing, unreadable, or corrupted cache entry
+        return None
+
+    if (fmt != CACHE_FORMAT) or (path != template_file):
+        return None
+
+    try:
+        st = os.stat(template_file)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+
+    if (st.st_mtime_ns != mtime_ns) or (st.st_size != size):
+        # The template file might have been touched without being modified
+        # Only discard the entry if its contents actually changed
+        if (st.st_size != size) or (_hash_file(template_file) != digest):
+            return None
+        if not _is_racy([st.st_mtime_ns]):
+            write_cache_file(cache_file, (fmt, path, st.st_mtime_ns, st.st_size, digest, dependencies, record))
+
+    src_stats = {}
+    for src_path, src_mtime_ns in dependencies:
+        try:
+            src_stats[src_path] = os.stat(src_path)
+        except OSError:
+            return None
+        if src_stats[src_path].st_mtime_ns != src_mtime_ns:
+            return None
+
+    try:
+        plan = Plan.from_record(record)
+    except Exception:
+        return None
+    for included_file in plan.includes:
+        src_stats.pop(included_file, None)
+    plan.src_stats = src_stats
+    return plan
+
+
+def store_compiled_template(template_file: str, plan: Plan) -> None:
+    # Failing to write the cache is never fatal; the template will simply be compiled again next time
+    try:
+        st = os.stat(template_file)
+        digest = _hash_file(template_file)
+        dependencies = tuple((p, _stat_src(plan, p).st_mtime_ns) for p in sorted(set(plan.dependency_paths())))
+    except OSError:
+        return
+    if _is_racy([st.st_mtime_ns] + [mtime_ns for _, mtime_ns in dependencies]):
+        # The template will simply be compiled again next time
+        return
+    entry = (CACHE_FORMAT, template_file, st.st_mtime_ns, st.st_size, digest, dependencies, plan.to_record())
+    write_cache_file(_cache_file_for(template_file), entry)
+
+
+def stat_dependencies(template_file: str, src_paths: List[str]) -> Optional[Tuple[tuple, Dict[str, os.stat_result]]]:
+    # src_paths: The src files of the template, and the templates it includes (see Plan.dependency_paths())
+    # Output: (fingerprint of the template file and of its src files, stat results of the src files)
+    #         None if one of the files is missing
+    # The fingerprint changes whenever one of the files is modified or replaced
+    try:
+        st = os.stat(template_file)
+        src_stats = {p: os.stat(p) for p in set(src_paths)}
+    except OSError:
+        return None
+    fingerprint = ((st.st_ino, st.st_mtime_ns, st.st_size),
+                   tuple(sorted((p, s.st_ino, s.st_mtime_ns, s.st_size) for p, s in src_stats.items())))
+    return fingerprint, src_stats
+
+
+def is_racy(fingerprint: tuple) -> bool:
+    # Whether one of the files of a fingerprint (see stat_dependencies()) is too recent to be trusted
+    # Plans with such fingerprints mustn't be kept for later
+    (_, mtime_ns, _), src_fingerprints = fingerprint
+    return _is_racy([mtime_ns] + [src_mtime_ns for _, _, src_mtime_ns, _ in src_fingerprints])
+
+
+def _is_racy(mtimes_ns: List[int]) -> bool:
+    return time.time_ns() - max(mtimes_ns) < RACY_WINDOW_NS
+
+
+def _stat_src(plan: Plan, src_path: str) -> os.stat_result:
+    st = plan.src_stats.get(src_path)
+    return os.stat(src_path) if st is None else st
+
+
+def _cache_file_for(template_file: str) -> str:
+    # Templates all live in TEMPLATES_DIRECTORY, so their file names are unique
+    # The full path is stored in the entry and checked on load
+    return os.path.join(CACHE_DIRECTORY, os.path.basename(template_file) + ".plan")
+
+
+def _hash_file(path: str) -> str:
+    # Only needed when a template is compiled or touched; hashlib is slow to import
+    import hashlib
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def write_cache_file(cache_file: str, entry: Tuple) -> bool:
+    # Write to a temporary file first so that concurrent runs never read a half-written entry
+    # Output: Whether the file was written
+    tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, "wb") as f:
+            marshal.dump(entry, f)
+        os.replace(tmp_file, cache_file)
+        return True
+    except Exception:
+        try:
+            os.unlink(tmp_file)
+        except OSError:
+            pass
+        return False
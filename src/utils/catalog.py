@@ -0,0 +1,198 @@
+# Catalog of the available templates
+#
+# Instead of listing TEMPLATES_DIRECTORY on every run, the names of the templates are kept in
+# a small index file inside CACHE_DIRECTORY, along with the mtime of every template and (once
+# the template has been compiled) its statistics: the number of directories and files it
+# creates, the total size of its src files, and the src files it depends on.
+# The index is only rebuilt when the mtime of TEMPLATES_DIRECTORY changes, i.e. when templates
+# are added, removed, or renamed; compiling a template only updates its own entry. Statistics
+# are taken from compiled plans, so showing them never requires parsing XML. They are recorded
+# along with the fingerprint of the files the plan was compiled from (see
+# cache.stat_dependencies()), and are only shown while it still matches.
+
+from __future__ import annotations
+
+import os, os.path, sys, time, marshal
+
+from . import *
+from .cache import RACY_WINDOW_NS, is_racy, stat_dependencies, write_cache_file
+from .plan import Plan, MKDIR
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional, Tuple
+
+CATALOG_FILE   = os.path.join(CACHE_DIRECTORY, "templates.catalog")
+CATALOG_FORMAT = ("skel-catalog", 2, sys.version_info[:2])
+
+
+class TemplateStats:
+    __slots__ = ("dirs", "files", "src_bytes", "src_paths", "dependencies", "fingerprint")
+
+    def __init__(self, *, dirs: int, files: int, src_bytes: int, src_paths: Tuple[str, ...],
+                 dependencies: Tuple[str, ...], fingerprint: tuple) -> None:
+        self.dirs      = dirs
+        self.files     = files
+        self.src_bytes = src_bytes
+        self.src_paths = src_paths        # Distinct src files referenced by the template
+        self.dependencies = dependencies  # Distinct src files and included templates (see Plan.dependency_paths())
+        self.fingerprint  = fingerprint   # Of the template file and its dependencies when the stats were taken
+
+    def __str__(self) -> str:
+        text = "{} director{}, {} file{}".format(self.dirs, "y" if self.dirs == 1 else "ies",
+                                                 self.files, "" if self.files == 1 else "s")
+        if self.src_paths:
+            text += ", {} byte{} from src files".format(self.src_bytes, "" if self.src_bytes == 1 else "s")
+        return text
+
+    def is_current(self, template_file: str) -> bool:
+        # Whether neither the template nor its dependencies changed since the stats were taken
+        dependencies = stat_dependencies(template_file, list(self.dependencies))
+        return (dependencies is not None) and (dependencies[0] == self.fingerprint)
+
+    @classmethod
+    def of_plan(cls, plan: Plan, *, template_file: str) -> "Optional[TemplateStats]":
+        # Output: None if one of the files the plan was compiled from is missing, or too recent to be trusted
+        # Repeated entries are counted once per copy
+        dependency_paths = tuple(sorted(set(plan.dependency_paths())))
+        dependencies = stat_dependencies(template_file, list(dependency_paths))
+        if (dependencies is None) or is_racy(dependencies[0]):
+            return None
+        copies = plan.copies()
+        dirs = sum(count for kind, count in zip(plan.kinds, copies) if kind == MKDIR)
+        sizes: Dict[str, int] = {}
+        for src in plan.srcs.values():
+            if src not in sizes:
+                try:
+                    st = plan.src_stats.get(src) or os.stat(src)
+                    sizes[src] = st.st_size
+                except OSError:
+                    sizes[src] = 0
+        src_bytes = sum(sizes[src] * copies[index] for index, src in plan.srcs.items())
+        return cls(dirs=dirs, files=sum(copies) - dirs, src_bytes=src_bytes, src_paths=tuple(sorted(sizes)),
+                   dependencies=dependency_paths, fingerprint=dependencies[0])
+
+
+class TemplateInfo:
+    __slots__ = ("name", "path", "mtime_ns", "stats")
+
+    def __init__(self, *, name: str, path: str, mtime_ns: int, stats: Optional[TemplateStats] = None) -> None:
+        self.name     = name
+        self.path     = path
+        self.mtime_ns = mtime_ns
+        self.stats    = stats  # None until the template has been compiled
+
+
+class Catalog:
+    def __init__(self, *, dir_mtime_ns: int = -1, templates: Optional[Dict[str, TemplateInfo]] = None) -> None:
+        self.dir_mtime_ns = dir_mtime_ns  # mtime of TEMPLATES_DIRECTORY when it was last scanned
+        self.templates    = templates if templates is not None else {}
+
+    def lookup(self, name: str) -> Optional[TemplateInfo]:
+        return self.templates.get(name)
+
+    def names(self) -> List[str]:
+        return sorted(self.templates)
+
+    def save(self) -> None:
+        # Failing to write the catalog is never fatal; the directory will simply be scanned again
+        templates = {}
+        for name, info in self.templates.items():
+            stats = info.stats
+            if stats is not None:
+                stats = (stats.dirs, stats.files, stats.src_bytes, stats.src_paths, stats.dependencies, stats.fingerprint)
+            templates[name] = (info.path, info.mtime_ns, stats)
+        write_cache_file(CATALOG_FILE, (CATALOG_FORMAT, TEMPLATES_DIRECTORY, self.dir_mtime_ns, templates))
+
+
+# The catalog is loaded once, and loaded again whenever its file or TEMPLATES_DIRECTORY changes
+# (e.g. in a long-running daemon, when other processes compile templates)
+_catalog: Optional[Catalog] = None
+_catalog_key: tuple = ()
+
+
+def get_catalog() -> Catalog:
+    global _catalog, _catalog_key
+    key = (_stat_key(CATALOG_FILE), _stat_key(TEMPLATES_DIRECTORY))
+    if (_catalog is None) or (key != _catalog_key) or (_catalog.dir_mtime_ns < 0):
+        _catalog = _load_catalog()
+        _catalog_key = (_stat_key(CATALOG_FILE), key[1])
+    return _catalog
+
+
+def record_template_stats(template_file: str, plan: Plan) -> None:
+    # Called whenever a template is compiled, so that its statistics are up to date
+    # Only the entry of the template is updated; TEMPLATES_DIRECTORY is scanned when the templates are listed
+    name = os.path.splitext(os.path.basename(template_file))[0]
+    catalog = _read_catalog_file()
+    info = catalog.lookup(name)
+    if (info is None) or (info.path != template_file):
+        return
+    stats = TemplateStats.of_plan(plan, template_file=template_file)
+    if stats is None:
+        return
+    try:
+        info.mtime_ns = os.stat(template_file).st_mtime_ns
+    except OSError:
+        return
+    info.stats = stats
+    catalog.save()
+
+
+def _stat_key(path: str) -> tuple:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ()
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _load_catalog() -> Catalog:
+    dir_mtime_ns = os.stat(TEMPLATES_DIRECTORY).st_mtime_ns
+    catalog = _read_catalog_file()
+    if catalog.dir_mtime_ns == dir_mtime_ns:
+        return catalog
+
+    # Templates were added, removed, or renamed since the last scan
+    # The statistics of the templates that haven't changed are carried over
+    templates = {}
+    with os.scandir(TEMPLATES_DIRECTORY) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".xml"):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                mtime_ns = entry.stat().st_mtime_ns
+            except OSError:
+                continue
+            name = os.path.splitext(entry.name)[0]
+            previous = catalog.lookup(name)
+            stats = previous.stats if (previous is not None) and (previous.mtime_ns == mtime_ns) else None
+            templates[name] = TemplateInfo(name=name, path=entry.path, mtime_ns=mtime_ns, stats=stats)
+
+    if time.time_ns() - dir_mtime_ns < RACY_WINDOW_NS:
+        # Scan the directory again next time
+        dir_mtime_ns = -1
+    catalog = Catalog(dir_mtime_ns=dir_mtime_ns, templates=templates)
+    catalog.save()
+    return catalog
+
+
+def _read_catalog_file() -> Catalog:
+    try:
+        with open(CATALOG_FILE, "rb") as f:
+            fmt, directory, dir_mtime_ns, records = marshal.load(f)
+        if (fmt != CATALOG_FORMAT) or (directory != TEMPLATES_DIRECTORY):
+            return Catalog()
+        templates = {}
+        for name, (path, mtime_ns, stats) in records.items():
+            if stats is not None:
+                dirs, files, src_bytes, src_paths, dependencies, fingerprint = stats
+                stats = TemplateStats(dirs=dirs, files=files, src_bytes=src_bytes, src_paths=src_paths,
+                                      dependencies=dependencies, fingerprint=fingerprint)
+            templates[name] = TemplateInfo(name=name, path=path, mtime_ns=mtime_ns, stats=stats)
+        return Catalog(dir_mtime_ns=dir_mtime_ns, templates=templates)
+    except Exception:
+        # Missing, unreadable, or corrupted catalog
+        return Catalog()
@@ -0,0 +1,238 @@
+# Parsing of the command-line options
+#
+# Options are written as "--name value" or "--name=value" and may appear anywhere on the
+# command line. "--" marks the end of the options. Every option is registered in
+# REGISTERED_CMDLINE_OPTIONS along with a handler that validates its value.
+
+from __future__ import annotations
+
+from .archiving import ARCHIVE_FORMATS, STDOUT, archive_format
+from .copying import LINK_MODES
+from .error_handling import BadCmdlineArgument
+from .reporting import OUTPUT_FORMATS
+from .srccache import DEFAULT_BUDGET
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Callable, Dict, List, Tuple
+
+
+class CmdlineOptions:
+    def __init__(self) -> None:
+        # Default values
+        self.jobs = 1
+        self.link = ""
+        self.src_cache_budget = DEFAULT_BUDGET
+        self.quiet = False
+        self.format = "pretty"
+        self.stats = False
+        self.profile = ""
+        self.incremental = False
+        self.verify = False
+        self.archive = ""
+        self.serve = False
+        self.batch = ""
+        self.atomic = False
+        self.dry_run = False
+
+
+class CmdlineOption:
+    def __init__(self, *, handler: Callable[[CmdlineOptions, str], None], metavar: str, desc: str) -> None:
+        self.handler = handler
+        self.metavar = metavar  # Empty for options that don't take a value
+        self.desc    = desc
+
+
+def parse_cmdline_options(args: List[str]) -> Tuple[CmdlineOptions, List[str]]:
+    # Input : The raw command-line arguments
+    # Output: The parsed options and the remaining positional arguments
+    options = CmdlineOptions()
+    positional_args: List[str] = []
+    remaining = iter(args)
+    for arg in remaining:
+        if arg == "--":
+            positional_args.extend(remaining)
+            break
+        if not arg.startswith("--") or arg == "-":
+            positional_args.append(arg)
+            continue
+
+        name, has_value, value = arg[2:].partition("=")
+        if name not in REGISTERED_CMDLINE_OPTIONS:
+            raise BadCmdlineArgument("Unrecognized option: \"--{}\"".format(name))
+        option = REGISTERED_CMDLINE_OPTIONS[name]
+        if option.metavar:
+            if not has_value:
+                value = next(remaining, None)
+                if value is None:
+                    raise BadCmdlineArgument("The option \"--{}\" requires a value".format(name))
+        elif has_value:
+            raise BadCmdlineArgument("The option \"--{}\" doesn't take a value".format(name))
+        option.handler(options, value)
+    if options.archive and options.incremental:
+        raise BadCmdlineArgument("\"--archive\" can't be combined with \"--incremental\" or \"--verify\"")
+    if options.dry_run and (options.archive or options.incremental):
+        raise BadCmdlineArgument("\"--dry-run\" can't be combined with \"--archive\", \"--incremental\", or \"--verify\"")
+    if options.archive and options.atomic:
+        raise BadCmdlineArgument("\"--archive\" can't be combined with \"--atomic\"")
+    if options.batch:
+        if options.archive:
+            raise BadCmdlineArgument("\"--batch\" can't be combined with \"--archive\"")
+        if positional_args:
+            raise BadCmdlineArgument("With \"--batch\", the templates and targets are read from the batch file")
+    return options, positional_args
+
+
+def _parse_jobs_option(options: CmdlineOptions, value: str) -> None:
+    try:
+        options.jobs = int(value)
+    except ValueError:
+        options.jobs = 0
+    if options.jobs < 1:
+        raise BadCmdlineArgument("The value of \"--jobs\" must be a positive integer")
+
+
+def _parse_link_option(options: CmdlineOptions, value: str) -> None:
+    if value not in LINK_MODES:
+        raise BadCmdlineArgument("The value of \"--link\" must be one of: {}".format(", ".join(LINK_MODES)))
+    options.link = value
+
+
+def _parse_src_cache_option(options: CmdlineOptions, value: str) -> None:
+    # Accepts a number of bytes with an optional K, M, or G suffix
+    multipliers = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    number, multiplier = value, 1
+    if value[-1:].upper() in multipliers:
+        number, multiplier = value[:-1], multipliers[value[-1:].upper()]
+    try:
+        options.src_cache_budget = int(number) * multiplier
+    except ValueError:
+        options.src_cache_budget = -1
+    if options.src_cache_budget < 0:
+        raise BadCmdlineArgument("The value of \"--src-cache\" must be a size such as 65536, 512K, or 64M")
+
+
+def _parse_quiet_option(options: CmdlineOptions, value: str) -> None:
+    options.quiet = True
+
+
+def _parse_format_option(options: CmdlineOptions, value: str) -> None:
+    if value not in OUTPUT_FORMATS:
+        raise BadCmdlineArgument("The value of \"--format\" must be one of: {}".format(", ".join(OUTPUT_FORMATS)))
+    options.format = value
+
+
+def _parse_stats_option(options: CmdlineOptions, value: str) -> None:
+    options.stats = True
+
+
+def _parse_profile_option(options: CmdlineOptions, value: str) -> None:
+    if not value:
+        raise BadCmdlineArgument("The value of \"--profile\" must be a file path")
+    options.profile = value
+
+
+def _parse_incremental_option(options: CmdlineOptions, value: str) -> None:
+    options.incremental = True
+
+
+def _parse_verify_option(options: CmdlineOptions, value: str) -> None:
+    # Implies --incremental
+    options.incremental = True
+    options.verify = True
+
+
+def _parse_archive_option(options: CmdlineOptions, value: str) -> None:
+    archive_format(value)  # Raises BadCmdlineArgument for unknown formats
+    options.archive = value
+
+
+def _parse_serve_option(options: CmdlineOptions, value: str) -> None:
+    options.serve = True
+
+
+def _parse_batch_option(options: CmdlineOptions, value: str) -> None:
+    options.batch = value
+
+
+def _parse_atomic_option(options: CmdlineOptions, value: str) -> None:
+    options.atomic = True
+
+
+def _parse_dry_run_option(options: CmdlineOptions, value: str) -> None:
+    options.dry_run = True
+
+
+REGISTERED_CMDLINE_OPTIONS: Dict[str, CmdlineOption]
+REGISTERED_CMDLINE_OPTIONS = {
+    "jobs": CmdlineOption(
+        handler=_parse_jobs_option,
+        metavar="N",
+        desc="Generate up to N targets (or the entries of a single target) concurrently"
+    ),
+    "link": CmdlineOption(
+        handler=_parse_link_option,
+        metavar="MODE",
+        desc="How to materialize <file src=...>: {}".format("|".join(LINK_MODES))
+    ),
+    "src-cache": CmdlineOption(
+        handler=_parse_src_cache_option,
+        metavar="SIZE",
+        desc="Memory budget for caching src files (default: {}M, 0 disables)".format(DEFAULT_BUDGET // 1024 ** 2)
+    ),
+    "quiet": CmdlineOption(
+        handler=_parse_quiet_option,
+        metavar="",
+        desc="Only report the number of entries created and skipped"
+    ),
+    "format": CmdlineOption(
+        handler=_parse_format_option,
+        metavar="FORMAT",
+        desc="Output format: {}".format("|".join(OUTPUT_FORMATS))
+    ),
+    "stats": CmdlineOption(
+        handler=_parse_stats_option,
+        metavar="",
+        desc="Report the time spent in every phase, bytes copied, and the slowest entries"
+    ),
+    "profile": CmdlineOption(
+        handler=_parse_profile_option,
+        metavar="FILE",
+        desc="Profile the run with cProfile and write the results to FILE (.prof)"
+    ),
+    "incremental": CmdlineOption(
+        handler=_parse_incremental_option,
+        metavar="",
+        desc="Only create the entries that weren't created by previous runs (see the manifest of each target)"
+    ),
+    "verify": CmdlineOption(
+        handler=_parse_verify_option,
+        metavar="",
+        desc="With --incremental, first check that the entries created by previous runs still exist"
+    ),
+    "archive": CmdlineOption(
+        handler=_parse_archive_option,
+        metavar="FILE",
+        desc="Write the skeleton into an archive ({}) instead of the filesystem; \"{}\" for stdout".format("|".join(ARCHIVE_FORMATS), STDOUT)
+    ),
+    "serve": CmdlineOption(
+        handler=_parse_serve_option,
+        metavar="",
+        desc="Run as a daemon that keeps templates in memory and applies them for other skel invocations"
+    ),
+    "batch": CmdlineOption(
+        handler=_parse_batch_option,
+        metavar="FILE",
+        desc="Apply every job (template and targets) listed in FILE, one per line; \"-\" for stdin"
+    ),
+    "atomic": CmdlineOption(
+        handler=_parse_atomic_option,
+        metavar="",
+        desc="Build new targets in a staging directory and publish each of them with a single rename"
+    ),
+    "dry-run": CmdlineOption(
+        handler=_parse_dry_run_option,
+        metavar="",
+        desc="Only report what would be created and skipped, without changing anything"
+    ),
+}
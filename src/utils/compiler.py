@@ -0,0 +1,160 @@
+# Compilation of template files into creation plans
+#
+# This module (and lxml) is only imported when a template isn't in the cache.
+#
+# <include template="..."/> elements are replaced by the plan of the included template (a
+# "fragment"), which is compiled like any other template: it is cached on its own, and loaded
+# from the cache by every template that includes it. Within a process, fragments are also kept in
+# memory, so a fragment included by several templates (or several times) is only loaded once.
+
+from . import *
+from .error_handling import *
+from . import cache, catalog, validators
+from .plan import *
+
+from lxml import etree
+from lxml.etree import _Element as Element
+from typing import Dict, List, Optional, Tuple
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .stats import RunStats
+
+# Fragments loaded by this process: template file -> (fingerprint of its files, plan)
+# See cache.stat_dependencies()
+_fragments: Dict[str, Tuple[tuple, Plan]] = {}
+
+
+def compile_template(template_file: str, *, including: Tuple[str, ...] = (), stats: Optional["RunStats"] = None) -> Plan:
+    # Parses, validates and compiles the template in a single streaming pass
+    # Every element is validated and compiled as soon as its start tag is parsed, and freed
+    # once its end tag is parsed, so neither memory nor the call stack grows with the template
+    # including: The template files whose compilation led to this one, when it's compiled as a fragment
+    # stats: If given, the validation is timed (--stats)
+    issues = IssueCollector()
+    context = validators.ValidationContext(issues=issues, template_file=template_file, including=including,
+                                           load_fragment=load_fragment)
+    plan = Plan()
+    # One frame per open element: (index of its operation in the plan, or -1 if it has none; whether it is a <file>)
+    open_elements: List[Tuple[int, bool]] = []
+    ignored_depth = 0  # Depth inside the children of a <file>, which are neither validated nor compiled
+    validate_xml_element = _validate_xml_element if stats is None else stats.timed("validate", _validate_xml_element)
+    check_src_paths = validators.check_src_paths if stats is None else stats.timed("validate", validators.check_src_paths)
+
+    try:
+        for event, element in etree.iterparse(template_file, events=("start", "end"), huge_tree=True,
+                                              remove_comments=True, remove_pis=True):
+            if event == "start":
+                if ignored_depth:
+                    ignored_depth += 1
+                    continue
+                if open_elements and open_elements[-1][1]:
+                    # First child of a <file> (or an <include>, which has no operation of its own)
+                    if open_elements[-1][0] >= 0:
+                        plan.flags[open_elements[-1][0]] |= IGNORES_CHILDREN
+                    else:
+                        plan.ignored_includes.append(element.getparent().get("template") or "")
+                    ignored_depth = 1
+                    continue
+                is_root = not open_elements
+                validate_xml_element(element, template_file, is_root=is_root, context=context)
+                open_elements.append(_compile_xml_element(element, plan, is_root=is_root, context=context))
+            else:
+                if ignored_depth:
+                    ignored_depth -= 1
+                else:
+                    index, _ = open_elements.pop()
+                    if index >= 0:
+                        plan.ends[index] = len(plan.kinds)
+                # The element (and its preceding siblings) won't be needed again
+                element.clear()
+                parent = element.getparent()
+                if parent is not None:
+                    while element.getprevious() is not None:
+                        del parent[0]
+    except etree.ParseError as e:
+        raise UnableToParse(template_path=template_file, trigger=e)
+
+    # Each distinct src path is checked once, however many <file> elements refer to it
+    plan.src_stats.update(check_src_paths(context))
+
+    if issues:
+        # Raise an exception if at least one issue with the template file is detected
+        raise InvalidTemplateFile(template_file=template_file, issues=list(issues))
+
+    # All good
+    return plan
+
+
+def load_fragment(template_file: str, including: Tuple[str, ...]) -> Plan:
+    # Output: The plan of an included template, from memory, from the cache, or freshly compiled
+    # Raises InvalidTemplateFile if the template is invalid
+    fingerprint, plan = _fragments.get(template_file, (None, None))
+    if plan is not None:
+        dependencies = cache.stat_dependencies(template_file, plan.dependency_paths())
+        if (dependencies is not None) and (dependencies[0] == fingerprint):
+            return plan
+    plan = cache.load_compiled_template(template_file)
+    if plan is None:
+        plan = compile_template(template_file, including=including)
+        cache.store_compiled_template(template_file, plan)
+        catalog.record_template_stats(template_file, plan)
+    dependencies = cache.stat_dependencies(template_file, plan.dependency_paths())
+    if (dependencies is not None) and not cache.is_racy(dependencies[0]):
+        _fragments[template_file] = (dependencies[0], plan)
+    return plan
+
+
+def _compile_xml_element(element: Element, plan: Plan, is_root: bool, context: "validators.ValidationContext") -> Tuple[int, bool]:
+    # Adds the operation of the element to the plan
+    # Output: (index of the operation or -1 if the element has none, whether the element ignores its children)
+    name = element.get("name") or ""
+    if is_root:
+        return -1, False
+    if element.tag == "include":
+        # The operations of the included template are spliced in place (if it's valid; see validators.py)
+        template_file = os.path.join(TEMPLATES_DIRECTORY, "{}.xml".format(element.get("template")))
+        fragment = context.fragments.get(template_file)
+        if fragment is not None:
+            plan.splice(fragment, template_file=template_file)
+        return -1, True
+    # Repeated elements are compiled once; see Plan.entries()
+    repeat = parse_repeat_attribute(repeat=element.get("repeat")) if "repeat" in element.attrib else None
+    if element.tag == "file":
+        if "src" in element.attrib:
+            src = resolve_src_attribute(src=element.get("src"))
+            return plan.add(kind=COPY, name=name, src=src, link=element.get("link", ""), repeat=repeat), True
+        return plan.add(kind=TOUCH, name=name, repeat=repeat), True
+    if element.tag == "dir":
+        return plan.add(kind=MKDIR, name=name, repeat=repeat), False
+    # Invalid elements are only compiled so that their children can be validated
+    return -1, False
+
+
+def _validate_xml_element(element: Element, template_path: str, is_root: bool, context: "validators.ValidationContext"):
+    # Validates a single element; its children are validated separately by the caller
+    issues = context.issues
+
+    # Make sure that the tag is valid
+    if element.tag == "noroot":
+        raise NotWellFormedXML(template_path=template_path)
+    if is_root and (element.tag != "root"):
+        # The root element of the document cannot be something other than <root>
+        issues.log_issue(InvalidRootElement(affected_element=element))
+    if element.tag not in VALID_TAGS:
+        issues.log_issue(UnrecognizedTag(affected_element=element))
+
+    # Make sure that mandatory attributes are present for all valid tags
+    if element.tag in VALID_TAGS:
+        for attr in VALID_TAGS[element.tag]:
+            if attr not in element.attrib:
+                issues.log_issue(MissingRequiredAttribute(affected_element=element, attribute=attr))
+
+    # Invoke the appropriate handlers to validate the values of all registered attributes
+    for attr in element.attrib:
+        if attr in validators.REGISTERED_ATTRIBUTE_CHECKERS:
+            validators.REGISTERED_ATTRIBUTE_CHECKERS[attr](element, context)
+
+    if (element.tag == "root") and not is_root:
+        # <root> must be the top level in the template file
+        issues.log_issue(NestedRootTag(affected_element=element))
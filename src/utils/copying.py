@@ -0,0 +1,160 @@
+# Materialization of <file src="..."> entries
+#
+# Link modes:
+#   auto    - (default) reflink if the filesystem supports it, otherwise copy
+#   reflink - share the data blocks of src (copy-on-write); fails if unsupported
+#   copy    - copy the data, in the kernel whenever possible
+#   hard    - create a hard link to src
+#   sym     - create a symbolic link to src
+# Copies preserve the permission bits of src (like shutil.copy).
+
+from __future__ import annotations
+
+import os, stat, errno
+
+try:
+    import fcntl
+except ImportError:  # Not a POSIX system
+    fcntl = None
+
+from .srccache import SrcCache
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Optional, Set, Tuple
+
+LINK_MODES = ("auto", "reflink", "copy", "hard", "sym")
+
+# Methods reported for each file
+REFLINK       = "reflink"
+COPY_RANGE    = "copy_file_range"
+SENDFILE      = "sendfile"
+BUFFERED      = "buffered copy"
+CACHED        = "copy from memory"
+HARDLINK      = "hard link"
+SYMLINK       = "symbolic link"
+
+FICLONE = 0x40049409  # From <linux/fs.h>
+BUFFER_SIZE = 1024 * 1024
+
+# errnos meaning that a copy method isn't available for this pair of files
+_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF, errno.ETXTBSY}
+
+# Devices on which reflinks have failed during this run; copies into them skip the attempt
+_devices_without_reflink: Set[int] = set()
+
+
+class LinkNotSupported(Exception):
+    def __init__(self, *, mode: str, reason: str) -> None:
+        super().__init__(reason)
+        self.mode   = mode
+        self.reason = reason
+
+
+def copy_into(dst_fd: int, src: str, *, mode: str = "auto", src_cache: Optional[SrcCache] = None) -> Tuple[str, int]:
+    # Copies the contents and permission bits of src into the (empty) file referred to by dst_fd
+    # Contents are written from src_cache whenever a reflink isn't going to be attempted
+    # Output: (method used, number of bytes copied)
+    if (src_cache is not None) and (mode == "copy" or (mode == "auto" and not _may_reflink(dst_fd))):
+        blob = src_cache.lookup(src)
+        if blob is not None:
+            _write_all(dst_fd, memoryview(blob.data))
+            os.chmod(dst_fd, stat.S_IMODE(blob.mode))
+            return CACHED, len(blob.data)
+
+    with open(src, "rb") as fsrc:
+        src_fd = fsrc.fileno()
+        st = os.fstat(src_fd)
+        method = ""
+        if (mode == "reflink") or (mode == "auto" and _may_reflink(dst_fd)):
+            if _reflink(src_fd, dst_fd):
+                method = REFLINK
+            elif mode == "reflink":
+                raise LinkNotSupported(mode=mode, reason="The filesystem doesn't support reflinks")
+        if not method:
+            method = _kernel_copy(src_fd, dst_fd, st.st_size) or _buffered_copy(fsrc, dst_fd)
+        os.chmod(dst_fd, stat.S_IMODE(st.st_mode))
+    return method, st.st_size
+
+
+def link_to(name: str, src: str, *, dir_fd: int, mode: str) -> str:
+    # Creates 'name' inside dir_fd as a link to src
+    # Raises FileExistsError if the path is taken
+    if mode == "hard":
+        try:
+            os.link(src, name, dst_dir_fd=dir_fd)
+        except OSError as e:
+            if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise LinkNotSupported(mode=mode, reason="Unable to hard-link \"{}\": {}".format(src, e.strerror))
+            raise
+        return HARDLINK
+    os.symlink(src, name, dir_fd=dir_fd)
+    return SYMLINK
+
+
+def _may_reflink(dst_fd: int) -> bool:
+    return (fcntl is not None) and (os.fstat(dst_fd).st_dev not in _devices_without_reflink)
+
+
+def _reflink(src_fd: int, dst_fd: int) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError as e:
+        if e.errno in _UNSUPPORTED:
+            _devices_without_reflink.add(os.fstat(dst_fd).st_dev)
+            return False
+        raise
+
+
+def _kernel_copy(src_fd: int, dst_fd: int, size: int) -> str:
+    # Copies without moving the data through userspace
+    # Output: The method used, or "" if the kernel can't copy this pair of files
+    for method, copy_chunk in ((COPY_RANGE, _copy_file_range_chunk), (SENDFILE, _sendfile_chunk)):
+        if copy_chunk is None:
+            continue
+        offset = 0
+        try:
+            while True:
+                copied = copy_chunk(src_fd, dst_fd, offset, max(size - offset, BUFFER_SIZE))
+                if copied == 0:
+                    break
+                offset += copied
+            return method
+        except OSError as e:
+            if (offset == 0) and (e.errno in _UNSUPPORTED):
+                continue
+            raise
+    return ""
+
+
+def _copy_file_range_chunk(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _sendfile_chunk(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+if not hasattr(os, "copy_file_range"):
+    _copy_file_range_chunk = None
+if not hasattr(os, "sendfile"):
+    _sendfile_chunk = None
+
+
+def _buffered_copy(fsrc, dst_fd: int) -> str:
+    fsrc.seek(0)
+    os.lseek(dst_fd, 0, os.SEEK_SET)
+    while True:
+        chunk = fsrc.read(BUFFER_SIZE)
+        if not chunk:
+            break
+        _write_all(dst_fd, memoryview(chunk))
+    return BUFFERED
+
+
+def _write_all(fd: int, view: memoryview) -> None:
+    while view:
+        view = view[os.write(fd, view):]
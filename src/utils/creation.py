@@ -0,0 +1,236 @@
+# Low-level creation of directories and files
+#
+# Entries are created relative to the file descriptor of their parent directory, so every
+# path is resolved only once. Nothing is checked before it is created: the outcome is
+# derived from the errno of the creating syscall instead, which also means that there is
+# no window between the check and the creation.
+
+from __future__ import annotations
+
+import os, os.path, stat, errno
+
+from . import copying
+from .error_handling import DirPathBelongsToExistingFile
+from .srccache import SrcCache
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional, Tuple
+
+# Outcomes of make_file()
+CREATED        = 0
+EXISTS         = 1  # A file already exists at the path
+IS_A_DIRECTORY = 2  # A directory already exists at the path
+
+# Flags used to open directories that are only needed as dir_fd
+# O_PATH doesn't require read permission on the directory (Linux only)
+DIR_OPEN_FLAGS = getattr(os, "O_PATH", os.O_RDONLY) | os.O_DIRECTORY | os.O_CLOEXEC
+# Flags used to open directories that are listed; symlinks to directories aren't followed
+LIST_OPEN_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+FILE_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_CLOEXEC
+
+RENAME_NOREPLACE = 1  # From <linux/fs.h>
+
+# renameat2() from the C library; None until it's looked up, False if it isn't available
+_renameat2 = None
+
+
+def make_directories(path: str) -> List[str]:
+    # Input : An absolute path that points to a directory
+    # Output: All directories (including intermediate dirs) that had to be created, top-down
+    # Raises DirPathBelongsToExistingFile if the path (or one of its parents) is not a directory
+    try:
+        os.mkdir(path)
+        return [path]
+    except FileExistsError:
+        if not os.path.isdir(path):
+            raise DirPathBelongsToExistingFile()
+        return []
+    except NotADirectoryError:
+        raise DirPathBelongsToExistingFile()
+    except FileNotFoundError:
+        parent = os.path.dirname(path)
+        if parent == path:
+            raise
+    created = make_directories(parent)
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        # Created concurrently by someone else
+        if not os.path.isdir(path):
+            raise DirPathBelongsToExistingFile()
+        return created
+    created.append(path)
+    return created
+
+
+def open_directory(path: str) -> int:
+    return os.open(path, DIR_OPEN_FLAGS)
+
+
+def open_parent_directory(fd: int) -> int:
+    return os.open("..", DIR_OPEN_FLAGS, dir_fd=fd)
+
+
+def make_directory(name: str, *, dir_fd: int, keep_open: bool) -> Tuple[bool, int]:
+    # Creates the directory 'name' inside the directory referred to by dir_fd
+    # Output: (whether the directory was created, its file descriptor or -1 if keep_open is False)
+    # Raises DirPathBelongsToExistingFile if something other than a directory exists at the path
+    try:
+        os.mkdir(name, dir_fd=dir_fd)
+        created = True
+    except FileExistsError:
+        created = False
+
+    if keep_open:
+        try:
+            return created, os.open(name, DIR_OPEN_FLAGS, dir_fd=dir_fd)
+        except (NotADirectoryError, FileNotFoundError):
+            raise DirPathBelongsToExistingFile()
+    if not created and not _is_directory(name, dir_fd=dir_fd):
+        raise DirPathBelongsToExistingFile()
+    return created, -1
+
+
+def make_file(name: str, *, dir_fd: int, src: str = "", link: str = "auto", src_cache: Optional[SrcCache] = None) -> Tuple[int, str, int]:
+    # Creates the file 'name' inside the directory referred to by dir_fd
+    # If src is given, the file is materialized from src according to the link mode (see copying.py)
+    # Output: (CREATED, EXISTS, or IS_A_DIRECTORY; method used for src; number of bytes copied)
+    # Raises copying.LinkNotSupported if the requested link mode can't be honored
+    try:
+        if src and link in ("hard", "sym"):
+            return CREATED, copying.link_to(name, src, dir_fd=dir_fd, mode=link), 0
+        fd = os.open(name, FILE_OPEN_FLAGS, 0o666, dir_fd=dir_fd)
+    except FileExistsError:
+        return (IS_A_DIRECTORY if _is_directory(name, dir_fd=dir_fd) else EXISTS), "", 0
+    if not src:
+        os.close(fd)
+        return CREATED, "", 0
+    try:
+        method, copied = copying.copy_into(fd, src, mode=link, src_cache=src_cache)
+    except copying.LinkNotSupported:
+        # Don't leave an empty file behind
+        os.unlink(name, dir_fd=dir_fd)
+        raise
+    finally:
+        os.close(fd)
+    return CREATED, method, copied
+
+
+def list_directory(path: str) -> Optional[Dict[str, bool]]:
+    # Lists a directory with a single os.scandir() (no stat call per entry on most filesystems)
+    # Output: Maps the basenames of the entries to whether they are directories (symlinks are followed),
+    #         or None if there is no directory at the path
+    # Raises OSError if the directory exists but can't be listed (e.g. PermissionError, or a path longer than PATH_MAX)
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name: entry.is_dir() for entry in entries}
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _is_directory(name: str, *, dir_fd: int) -> bool:
+    try:
+        return stat.S_ISDIR(os.stat(name, dir_fd=dir_fd).st_mode)
+    except OSError:
+        # E.g. a dangling symlink
+        return False
+
+
+def make_staging_directory(name: str, *, dir_fd: int) -> str:
+    # Creates an empty, hidden directory next to 'name' inside the directory referred to by dir_fd
+    # Unlike tempfile.mkdtemp(), the directory gets the default permissions (subject to the umask),
+    # so that it can be published as is
+    # Output: The basename of the directory
+    while True:
+        staging_name = ".{}.skel-{}".format(name, os.urandom(4).hex())
+        try:
+            os.mkdir(staging_name, dir_fd=dir_fd)
+            return staging_name
+        except FileExistsError:
+            continue
+
+
+def remove_tree(name: str, *, dir_fd: int) -> None:
+    # Removes the directory 'name' inside the directory referred to by dir_fd, and everything in it
+    # Unlike shutil.rmtree(), this isn't recursive and keeps a single directory open at a time (it climbs
+    # back up with ".."), so trees of any depth can be removed, even past PATH_MAX
+    # Raises OSError if something can't be removed
+    fd = os.open(name, LIST_OPEN_FLAGS, dir_fd=dir_fd)
+    try:
+        # The directories from 'name' down to fd, and the subdirectories left to remove in each of them
+        path = [name]
+        pending = [_remove_files(fd)]
+        while True:
+            if pending[-1]:
+                child = pending[-1].pop()
+                child_fd = os.open(child, LIST_OPEN_FLAGS, dir_fd=fd)
+                os.close(fd)
+                fd = child_fd
+                path.append(child)
+                pending.append(_remove_files(fd))
+                continue
+            pending.pop()
+            removed = path.pop()
+            if not path:
+                break
+            parent_fd = os.open("..", LIST_OPEN_FLAGS, dir_fd=fd)
+            os.close(fd)
+            fd = parent_fd
+            os.rmdir(removed, dir_fd=fd)
+    finally:
+        os.close(fd)
+    os.rmdir(name, dir_fd=dir_fd)
+
+
+def _remove_files(fd: int) -> List[str]:
+    # Removes everything but the subdirectories from the directory referred to by fd
+    # Output: The basenames of the subdirectories
+    subdirs = []
+    with os.scandir(fd) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            else:
+                os.unlink(entry.name, dir_fd=fd)
+    return subdirs
+
+
+def rename_no_replace(name: str, new_name: str, *, dir_fd: int) -> None:
+    # Renames 'name' to 'new_name' inside the directory referred to by dir_fd, in a single step
+    # Raises FileExistsError if something already exists at new_name
+    renameat2 = _get_renameat2()
+    if renameat2:
+        if renameat2(dir_fd, os.fsencode(name), dir_fd, os.fsencode(new_name), RENAME_NOREPLACE) == 0:
+            return
+        import ctypes
+        error = ctypes.get_errno()
+        if error not in (errno.ENOSYS, errno.EINVAL):
+            raise OSError(error, os.strerror(error), new_name)
+        # The kernel or the filesystem doesn't support RENAME_NOREPLACE
+
+    # rename() would silently replace an empty directory, so new_name is checked first
+    # This leaves a small window during which new_name may be created by someone else
+    try:
+        os.lstat(new_name, dir_fd=dir_fd)
+    except FileNotFoundError:
+        os.rename(name, new_name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        return
+    raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), new_name)
+
+
+def _get_renameat2():
+    # ctypes is only imported by runs that publish directories (--atomic)
+    global _renameat2
+    if _renameat2 is None:
+        _renameat2 = False
+        try:
+            import ctypes
+            renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+        except (ImportError, OSError, AttributeError):
+            pass
+        else:
+            renameat2.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+            renameat2.restype  = ctypes.c_int
+            _renameat2 = renameat2
+    return _renameat2
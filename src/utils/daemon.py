@@ -0,0 +1,278 @@
+# Warm server mode (--serve)
+#
+# "skel --serve" starts a daemon that listens on a Unix socket (SOCKET_FILE) and applies
+# templates on behalf of other skel processes. The daemon keeps the plans of the templates in
+# memory (see operations.keep_templates_warm()), so requests neither import lxml nor load or parse
+# templates; a plan is only reloaded when its template or one of its src files changes.
+#
+# Every skel invocation first tries to hand its command line over to the daemon (see forward()):
+# it sends its arguments, working directory, and umask, and writes the report streamed back by the
+# daemon to stdout. If no daemon is running, skel runs the command itself, as usual.
+# Both sides check that the process at the other end belongs to the same user: anyone can create
+# a socket file at SOCKET_FILE, e.g. in /tmp.
+# Commands that can't be run remotely (--stats, --profile, --batch, and archives written to stdout) are
+# always run in-process.
+#
+# Protocol: both sides exchange frames made of a 1-byte kind, a 4-byte big-endian length, and
+# a payload. The client sends a REQUEST frame; the daemon answers with a READY frame, or with an
+# EXIT frame if it refuses the request. The client then sends a START frame, and the daemon runs
+# the command: it answers with any number of OUTPUT frames followed by an EXIT frame, whose
+# payload is one of the EXIT_* statuses.
+# A client that gets no READY frame within CLIENT_TIMEOUT (e.g. the daemon is stopped or
+# overloaded) runs the command itself; since it never sends START, the command can't run twice.
+
+from __future__ import annotations
+
+import os, os.path, sys, contextlib, marshal
+
+from . import *
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import threading
+    from typing import BinaryIO, Iterator, List, Optional, Tuple
+    from .cli import CmdlineOptions
+
+SOCKET_FILE = os.environ.get("SKEL_SOCKET") or os.path.join(os.environ.get("XDG_RUNTIME_DIR") or "/tmp",
+                                                            "skel-{}.sock".format(os.getuid()))
+PROTOCOL = ("skel-daemon", 3)
+
+# Seconds the client waits for the daemon to accept the connection and the request
+CLIENT_TIMEOUT = 2.0
+
+# Frame kinds
+REQUEST = b"q"
+READY   = b"r"
+START   = b"s"
+OUTPUT  = b"o"
+EXIT    = b"x"
+
+# Exit statuses
+EXIT_DONE         = 0  # The command ran (errors in the template are part of the output)
+EXIT_FAILED       = 1  # The command failed; the error message was sent as output
+EXIT_BAD_ARGUMENT = 2  # Like EXIT_FAILED, and the client should show the usage
+EXIT_REFUSED      = 3  # The daemon can't run the command; the client should run it itself
+
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+def can_forward(options: CmdlineOptions, args: List[str]) -> bool:
+    # Whether the command can be run by the daemon
+    return bool(args) and not (options.serve or options.batch or options.stats or options.profile or options.archive == "-")
+
+
+def forward(argv: List[str]) -> Optional[int]:
+    # Hands the command line over to the daemon, and writes its report to stdout
+    # Output: The exit status sent by the daemon, or None if no daemon is running
+    if not os.path.exists(SOCKET_FILE):
+        return None
+    # socket is only imported when there is a daemon to talk to
+    import socket
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(CLIENT_TIMEOUT)
+    try:
+        try:
+            connection.connect(SOCKET_FILE)
+        except OSError:
+            # Stale socket file (the daemon is gone), or a daemon that doesn't accept connections
+            return None
+        if _peer_uid(connection, socket_file=SOCKET_FILE) != os.getuid():
+            # Not our daemon: the command line isn't sent to another user's process
+            return None
+        # The entries are created with the umask of this process, not the daemon's
+        umask = os.umask(0)
+        os.umask(umask)
+        stream = connection.makefile("rwb")
+        try:
+            _write_frame(stream, REQUEST, marshal.dumps((PROTOCOL, SKEL_HOME, argv, os.getcwd(), umask)))
+            stream.flush()
+            frame = _read_frame(stream)
+        except socket.timeout:
+            # The daemon is unresponsive; it won't run the command without a START frame
+            return None
+        if (frame is None) or (frame[0] != READY):
+            # Refused (EXIT frame), or the daemon went away
+            return None
+        # From now on, the command runs for as long as it takes
+        connection.settimeout(None)
+        _write_frame(stream, START, b"")
+        stream.flush()
+        received_output = False
+        while True:
+            frame = _read_frame(stream)
+            if frame is None:
+                if received_output:
+                    raise ConnectionError("The skel daemon stopped before the command completed")
+                return None
+            kind, payload = frame
+            if kind == OUTPUT:
+                sys.stdout.buffer.write(payload)
+                sys.stdout.buffer.flush()
+                received_output = True
+            elif kind == EXIT:
+                status = payload[0]
+                return None if status == EXIT_REFUSED else status
+    finally:
+        connection.close()
+
+
+def serve() -> None:
+    # Runs the daemon until it's interrupted (Ctrl+C or SIGTERM)
+    import signal, socket, socketserver, threading
+    from . import operations
+
+    if os.path.exists(SOCKET_FILE):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(SOCKET_FILE)
+        except OSError:
+            os.unlink(SOCKET_FILE)  # Left behind by a daemon that didn't exit cleanly
+        else:
+            raise RuntimeError("A skel daemon is already listening on \"{}\"".format(SOCKET_FILE))
+        finally:
+            probe.close()
+
+    operations.keep_templates_warm()
+    umask_gate = _UmaskGate(threading.Condition())
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            try:
+                _handle_request(self.rfile, self.wfile, peer_uid=_peer_uid(self.request, socket_file=SOCKET_FILE),
+                                umask_gate=umask_gate)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client went away
+
+    # Only the user running the daemon may connect to it
+    previous_umask = os.umask(0o177)
+    try:
+        server = Server(SOCKET_FILE, RequestHandler)
+    finally:
+        os.umask(previous_umask)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print("Listening on \"{}\"".format(SOCKET_FILE), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(SOCKET_FILE)
+        except OSError:
+            pass
+
+
+def _handle_request(rfile: BinaryIO, wfile: BinaryIO, *, peer_uid: int, umask_gate: _UmaskGate) -> None:
+    frame = _read_frame(rfile)
+    if frame is None:
+        return
+    kind, payload = frame
+    try:
+        protocol, skel_home, argv, cwd, umask = marshal.loads(payload)
+    except Exception:
+        protocol = skel_home = None
+    if (kind != REQUEST) or (protocol != PROTOCOL) or (skel_home != SKEL_HOME) or (peer_uid != os.getuid()):
+        # E.g. another installation of skel, or another user
+        _write_frame(wfile, EXIT, bytes([EXIT_REFUSED]))
+        return
+    _write_frame(wfile, READY, b"")
+    wfile.flush()
+    frame = _read_frame(rfile)
+    if (frame is None) or (frame[0] != START):
+        return  # The client gave up waiting, and runs the command itself
+
+    from . import operations
+    from .cli import parse_cmdline_options
+    from .error_handling import BadCmdlineArgument
+    stream = _FrameWriter(wfile)
+    try:
+        options, args = parse_cmdline_options(argv)
+        if not can_forward(options, args):
+            status = EXIT_REFUSED
+        else:
+            with umask_gate.applied(umask):
+                operations.run(options, args, cwd=cwd, stream=stream)
+            status = EXIT_DONE
+    except BadCmdlineArgument as error:
+        stream.write("{}\n".format(error))
+        status = EXIT_BAD_ARGUMENT
+    except Exception as error:
+        stream.write("{}\n".format(error))
+        status = EXIT_FAILED
+    _write_frame(wfile, EXIT, bytes([status]))
+
+
+def _peer_uid(connection, *, socket_file: str) -> int:
+    # Output: The uid of the process at the other end of the connection
+    import socket, struct
+    try:
+        credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        _, uid, _ = struct.unpack("3i", credentials)
+        return uid
+    except (AttributeError, OSError):
+        pass
+    # Not Linux: fall back to the owner of the socket file, which only its owner can connect to
+    try:
+        return os.stat(socket_file).st_uid
+    except OSError:
+        return -1
+
+
+class _UmaskGate:
+    # The umask is per process, so the daemon applies the umask of every client while its request runs
+    # Requests that need the same umask run concurrently; the others wait until no request is running
+    def __init__(self, condition: threading.Condition) -> None:
+        self.__condition = condition
+        self.__umask = -1
+        self.__running = 0
+
+    @contextlib.contextmanager
+    def applied(self, umask: int) -> Iterator[None]:
+        with self.__condition:
+            self.__condition.wait_for(lambda: (self.__running == 0) or (self.__umask == umask))
+            if self.__running == 0:
+                os.umask(umask)
+                self.__umask = umask
+            self.__running += 1
+        try:
+            yield
+        finally:
+            with self.__condition:
+                self.__running -= 1
+                if self.__running == 0:
+                    self.__condition.notify_all()
+
+
+class _FrameWriter:
+    # Text stream that sends everything written to it as OUTPUT frames (for the reporters)
+    def __init__(self, wfile: BinaryIO) -> None:
+        self.__wfile = wfile
+
+    def write(self, text: str) -> int:
+        _write_frame(self.__wfile, OUTPUT, text.encode())
+        return len(text)
+
+    def flush(self) -> None:
+        self.__wfile.flush()
+
+
+def _write_frame(stream: BinaryIO, kind: bytes, payload: bytes) -> None:
+    stream.write(kind + len(payload).to_bytes(4, "big") + payload)
+
+
+def _read_frame(stream: BinaryIO) -> Optional[Tuple[bytes, bytes]]:
+    # Output: (kind, payload), or None if the connection was closed
+    header = stream.read(5)
+    if len(header) < 5:
+        return None
+    length = int.from_bytes(header[1:], "big")
+    if length > MAX_FRAME_SIZE:
+        return None
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return header[:1], payload
@@ -1,20 +1,29 @@
 # This module contains the tools required to detect errors and issues with the template xml files
 
+from __future__ import annotations
+
 from . import *
 from .helpers import *
-from lxml.etree import _Element as Element
-from typing import List
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    # Only needed for type annotations; lxml is imported lazily when a template is parsed
+    from lxml.etree import _Element as Element
+    from typing import Dict, Hashable, Iterator, List, Optional
 
 
 class TemplateFileIssue:
-    def __init__(self, *, affected_element: Element) -> None:
+    def __init__(self, *, affected_element: "Optional[Element]") -> None:
+        # affected_element: None for issues with the template file as a whole
         self.title = "Invalid template file"
-        self.elems = [affected_element]  # A list of all the elements with the issue
+        # Ordered sets (dicts with None values) of the tags and source lines of all the elements with the issue
+        # The elements themselves aren't kept, so that they can be freed once they are validated
+        self.tags:  Dict[str, None] = {affected_element.tag: None} if affected_element is not None else {}
+        self.lines: Dict[int, None] = {affected_element.sourceline: None} if affected_element is not None else {}
         self.desc  = []  # A list of descriptions (to be added by subclasses)
 
     def __str__(self) -> str:
-        self.elems: List[Element]
-        affected_lines = [str(line) for line in sorted(set([elem.sourceline for elem in self.elems]))]
+        affected_lines = [str(line) for line in sorted(self.lines)]
         if affected_lines:
             header = self.title + " " + "(line: {})".format(", ".join(affected_lines))
         else:
@@ -26,23 +35,31 @@ class TemplateFileIssue:
         printed_lines.extend(formatted_desc)
         return "\n".join(printed_lines)
 
+    def key(self) -> Hashable:
+        # Issues with the same key are reported together
+        return (type(self),)
+
     def __eq__(self, __value: object) -> bool:
-        return type(__value) == type(self)
+        return isinstance(__value, TemplateFileIssue) and (self.key() == __value.key())
+
+    def __hash__(self) -> int:
+        return hash(self.key())
 
     def merge_with(self, other: "TemplateFileIssue") -> None:
-        self.elems.extend(e for e in other.elems if e not in self.elems)
+        self.tags.update(other.tags)
+        self.lines.update(other.lines)
 
     def add_descriptions(self, desc: List[str]) -> None:
         self.desc.extend(desc)
 
 
 class UnrecognizedTag(TemplateFileIssue):
-    def __init__(self, *, affected_element: Element) -> None:
+    def __init__(self, *, affected_element: "Element") -> None:
         super().__init__(affected_element=affected_element)
 
     def __str__(self) -> str:
         # Customize title and descriptions first
-        problematic_tagnames = sorted(set([elem.tag for elem in self.elems]))
+        problematic_tagnames = sorted(self.tags)
         if (len(problematic_tagnames) > 1):
             be      = "are"        
             suffix  = "s"
@@ -58,20 +75,20 @@ class UnrecognizedTag(TemplateFileIssue):
         self.title = "Unrecognized tag{suffix}".format(suffix=suffix)
         self.desc  = [
             "{taglist} {be} not {article}valid tag{suffix}".format(taglist=taglist, be=be, article=article, suffix=suffix),
-            "Only <root>, <dir>, and <file> tags are allowed"
+            "Only <root>, <dir>, <file>, and <include> tags are allowed"
         ]
         return super().__str__()
 
 
 class NestedRootTag(TemplateFileIssue):
-    def __init__(self, *, affected_element: Element) -> None:
+    def __init__(self, *, affected_element: "Element") -> None:
         super().__init__(affected_element=affected_element)
         self.desc  = [
             "The <root> tag can only be used as the top-level element of the template file",
         ]
 
     def __str__(self) -> str:
-        if len(self.elems) > 1:
+        if len(self.lines) > 1:
             suffix = "s"
         else:
             suffix = ""
@@ -80,7 +97,7 @@ class NestedRootTag(TemplateFileIssue):
 
 
 class InvalidRootElement(TemplateFileIssue):
-    def __init__(self, *, affected_element: Element) -> None:
+    def __init__(self, *, affected_element: "Element") -> None:
         super().__init__(affected_element=affected_element)
         self.title = "Invalid root element"
         self.desc  = [
@@ -90,14 +107,14 @@ class InvalidRootElement(TemplateFileIssue):
 
 
 class MissingRequiredAttribute(TemplateFileIssue):
-    def __init__(self, *, affected_element: Element, attribute: str) -> None:
+    def __init__(self, *, affected_element: "Element", attribute: str) -> None:
         super().__init__(affected_element=affected_element)
         self.__affected_tag = affected_element.tag
-        self.__missing_attributes = [attribute]
+        self.__missing_attributes: Dict[str, None] = {attribute: None}
 
-    def __eq__(self, other: "MissingRequiredAttribute") -> bool:
+    def key(self) -> Hashable:
         # Same tag, same issue
-        return super().__eq__(other) and (self.__affected_tag == other.__affected_tag)
+        return (type(self), self.__affected_tag)
 
     def __str__(self) -> str:
         # Update title based on affected tag
@@ -108,21 +125,22 @@ class MissingRequiredAttribute(TemplateFileIssue):
             suffix = ""
             be = "is"
         missing_attr_names = ["'{}'".format(attr) for attr in self.__missing_attributes]
+        first_missing_attr = next(iter(self.__missing_attributes))
         missing_attr_names = ", ".join(missing_attr_names)
         self.title = "Missing required attribute{suffix}".format(suffix=suffix)
         self.desc = [
             "{attr_list} {be} required for <{tag}>".format(attr_list=missing_attr_names, be=be, tag=self.__affected_tag),
-            " e.g. <{tag} {attr}=\"foo\"></{tag}> or <{tag} {attr}=\"foo\"/>".format(tag=self.__affected_tag, attr=self.__missing_attributes[0])
+            " e.g. <{tag} {attr}=\"foo\"></{tag}> or <{tag} {attr}=\"foo\"/>".format(tag=self.__affected_tag, attr=first_missing_attr)
         ]
         return super().__str__()
 
     def merge_with(self, other: "MissingRequiredAttribute") -> None:
         super().merge_with(other) # Add the elements first to track the line numbers
-        self.__missing_attributes.extend([attr for attr in other.__missing_attributes if attr not in self.__missing_attributes])
+        self.__missing_attributes.update(other.__missing_attributes)
 
 
 class InvalidAttributeValue(TemplateFileIssue):
-    def __init__(self, *, affected_element: Element, attribute_name: str, attribute_value: str) -> None:
+    def __init__(self, *, affected_element: "Element", attribute_name: str, attribute_value: str) -> None:
         super().__init__(affected_element=affected_element)
         self.__affected_tag       = affected_element.tag
         self.__affected_attribute = attribute_name
@@ -132,28 +150,55 @@ class InvalidAttributeValue(TemplateFileIssue):
                 tag=self.__affected_tag
         )
 
-    def __eq__(self, other: "InvalidAttributeValue") -> bool:
-        if super().__eq__(other):
-            # For two issues to be equal, the affected_tag, affected_attribute, and problematic value must be the same
-            return (
-                (self.__affected_tag == other.__affected_tag) and
-                (self.__affected_attribute == other.__affected_attribute) and
-                (self.__problematic_value == other.__problematic_value)
-            )
-        else:
-            return False
+    def key(self) -> Hashable:
+        # For two issues to be equal, the affected_tag, affected_attribute, and problematic value must be the same
+        return (type(self), self.__affected_tag, self.__affected_attribute, self.__problematic_value)
+
 
+class IncludedTemplateIssue(TemplateFileIssue):
+    # An issue of an included template, reported among the issues of the including template
+    # It keeps the line numbers of the included template file, which is named before the title
+    def __init__(self, *, template_file: str, issue: TemplateFileIssue) -> None:
+        super().__init__(affected_element=None)
+        self.__template_file = template_file
+        self.__issue = issue
 
-ALL_ISSUES: List[TemplateFileIssue] = []
+    def key(self) -> Hashable:
+        return (type(self), self.__template_file, self.__issue.key())
 
+    def merge_with(self, other: "IncludedTemplateIssue") -> None:
+        # The same issue of a template included more than once
+        pass
 
-def log_issue(issue: TemplateFileIssue) -> None:
-    for iss in ALL_ISSUES:
-        if iss == issue:
-            iss.merge_with(issue)
-            break
-    else:
-        ALL_ISSUES.append(issue)
+    def __str__(self) -> str:
+        return "(in {}) {}".format(os.path.basename(self.__template_file), self.__issue)
+
+
+class IssueCollector:
+    # Collects the issues detected while validating a template
+    # Issues are indexed by their key, so logging an issue takes constant time
+    def __init__(self) -> None:
+        self.__issues: Dict[Hashable, TemplateFileIssue] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.__issues)
+
+    def __len__(self) -> int:
+        return len(self.__issues)
+
+    def __iter__(self) -> Iterator[TemplateFileIssue]:
+        # In the order in which the issues were first logged
+        return iter(self.__issues.values())
+
+    def log_issue(self, issue: TemplateFileIssue) -> TemplateFileIssue:
+        # Output: The logged issue that the given issue was merged into (or the issue itself)
+        key = issue.key()
+        logged = self.__issues.get(key)
+        if logged is None:
+            self.__issues[key] = issue
+            return issue
+        logged.merge_with(issue)
+        return logged
 
 
 class InvalidTemplateFile(Exception):
@@ -162,6 +207,10 @@ class InvalidTemplateFile(Exception):
         self.__all_issues    = issues
         self.header_line     = "\nInvalid template file: \"{}\"\n".format(self.__template_file)
 
+    @property
+    def issues(self) -> List[TemplateFileIssue]:
+        return list(self.__all_issues)
+
     def __str__(self) -> str:
         issue_reports = [indent_block(textblock=str(issue)) + "\n" for issue in self.__all_issues]
         printed_lines = [self.header_line]
@@ -173,13 +222,25 @@ class NotWellFormedXML(InvalidTemplateFile):
     def __init__(self, *, template_path: str) -> None:
         super().__init__(template_file=template_path)
 
-    def __str__(self) -> str:
-        subtitle = indent("The XML file is not well-formed")
-        details  = [
+    @property
+    def issues(self) -> List[TemplateFileIssue]:
+        # The whole file is affected
+        issue = TemplateFileIssue(affected_element=None)
+        issue.title, issue.desc = self.subtitle(), self.details()
+        return [issue]
+
+    def subtitle(self) -> str:
+        return "The XML file is not well-formed"
+
+    def details(self) -> List[str]:
+        return [
             "A well-formed XML document must have a root element",
             "Please include a <root> element at the document's top level"
         ]
-        details = [indent(text=add_bullet(text=d), level=2) for d in details]
+
+    def __str__(self) -> str:
+        subtitle = indent(self.subtitle())
+        details = [indent(text=add_bullet(text=d), level=2) for d in self.details()]
         printed_lines = [self.header_line]
         printed_lines.append(subtitle)
         printed_lines.extend(details)
@@ -192,17 +253,35 @@ class UnableToParse(NotWellFormedXML):
         super().__init__(template_path=template_path)
         self.__trigger = trigger
 
-    def __str__(self) -> str:
-        subtitle = "Failed to parse the template file"
-        details  = [
+    def subtitle(self) -> str:
+        return "Failed to parse the template file"
+
+    def details(self) -> List[str]:
+        return [
             "An exception was raised by lxml.etree.parse() with the following error message:",
             "\"{}\"".format(str(self.__trigger)),
         ]
-        details = [indent(text=add_bullet(text=d), level=2) for d in details]
+
+    def __str__(self) -> str:
+        # Unlike NotWellFormedXML, the subtitle isn't indented
+        details = [indent(text=add_bullet(text=d), level=2) for d in self.details()]
         printed_lines = [self.header_line]
-        printed_lines.append(subtitle)
+        printed_lines.append(self.subtitle())
         printed_lines.extend(details)
         return "\n".join(printed_lines) + "\n"
 
 class BadCmdlineArgument(Exception): pass
 class DirPathBelongsToExistingFile(Exception): pass
+
+
+class MissingDependency(Exception):
+    def __init__(self, *, name: str) -> None:
+        super().__init__("Missing dependency: '{}'\nPlease run the setup script first.".format(name))
+        self.name = name
+
+
+class MissingOptionalDependency(Exception):
+    # Optional dependencies are only needed by some features, and aren't installed by the setup script
+    def __init__(self, *, name: str, feature: str) -> None:
+        super().__init__("Missing optional dependency: '{}' (needed for {})\nInstall it with \"pip install {}\".".format(name, feature, name))
+        self.name = name
@@ -3,6 +3,10 @@
 from . import *
 import os.path
 
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Optional, Tuple
+
 def indent(*, text: str, level: int=1) -> str:
     indentation = " " * level * 2
     return indentation + text
@@ -23,3 +27,17 @@ def resolve_src_attribute(*, src: str) -> str:
         return os.path.join(FILE_SRC_DIRECTORY, src)
     else:
         return src
+
+def parse_repeat_attribute(*, repeat: str) -> "Optional[Tuple[int, int]]":
+    # "first..last" (both inclusive) -> (first, last)
+    # Returns None if the value isn't a valid range
+    first, separator, last = repeat.strip().partition("..")
+    first, last = first.strip(), last.strip()
+    if (not separator) or (not _is_ascii_number(first)) or (not _is_ascii_number(last)) or (int(first) > int(last)):
+        return None
+    return int(first), int(last)
+
+def _is_ascii_number(text: str) -> bool:
+    # str.isdigit() also accepts digits that int() rejects, such as "²"
+    # Numbers too long for int() to convert aren't valid either
+    return text.isascii() and text.isdigit() and len(text) <= 18
@@ -0,0 +1,168 @@
+# Per-target manifests (--incremental)
+#
+# In incremental mode, every target gets a manifest file (MANIFEST_NAME) that records, for every
+# template applied to the target, a digest of the plan, the plan itself (along with the link mode
+# of the files that don't specify one, i.e. --link), and which of its entries
+# are known to be present in the target (created, or found already existing). When a template is
+# applied again:
+#   - if its plan hasn't changed, only the entries that weren't present last time are processed
+#   - if its plan has changed, only the entries that aren't in the previous plan (matched by their
+#     relative path, kind, src and effective link mode) are processed
+# Re-applying an unchanged template therefore doesn't touch the target at all. Files that were
+# already present but were materialized with another link mode (e.g. after --link changed) are
+# left untouched: they are recorded as RELINK, and reported on every run until they are removed.
+# Entries removed
+# from the target behind skel's back go unnoticed, unless the quick verification pass (--verify)
+# is requested: it lists every directory of the target once (one os.scandir() per directory) and
+# processes again the entries that are missing or have the wrong type.
+
+from __future__ import annotations
+
+import os, os.path, sys, marshal
+
+from .cache import write_cache_file
+from .creation import list_directory
+from .plan import Plan, MKDIR, COPY
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Iterator, Optional, Tuple
+    # Template name -> (plan digest, serialized plan, present entries)
+    # The plan is kept serialized, so that it's only decoded when the template has changed
+    # Present entries: one byte per entry of the plan, 1 if the entry is present in the target,
+    # RELINK if it's a file present with another link mode, 0 otherwise
+    Records = Dict[str, Tuple[str, bytes, bytes]]
+
+MANIFEST_NAME   = ".skel-manifest"
+MANIFEST_FORMAT = ("skel-manifest", 4, sys.version_info[:2])
+
+# State of an entry, both in the present entries of a record and in pending entries: a file that is
+# present in the target, but wasn't materialized with the effective link mode of its entry
+RELINK = 2
+
+# Maps the present entries of a record to the pending ones
+_PRESENT_TO_PENDING = bytes([1, 0, RELINK]) + bytes(253)
+
+
+def serialize_plan(plan: Plan, link: str) -> bytes:
+    # link: The link mode of the files that don't specify one; changing it changes the digest of the plan
+    return marshal.dumps((plan.to_record(), link))
+
+
+def plan_digest(serialized_plan: bytes) -> str:
+    # hashlib is slow to import; only incremental runs need it
+    import hashlib
+    return hashlib.sha256(serialized_plan).hexdigest()
+
+
+def load_manifest(target_dir: str) -> Records:
+    # Output: The records of the manifest of the target; empty if there is no (valid) manifest
+    try:
+        with open(os.path.join(target_dir, MANIFEST_NAME), "rb") as f:
+            fmt, records = marshal.load(f)
+        if fmt != MANIFEST_FORMAT:
+            return {}
+        return records
+    except Exception:
+        # Missing, unreadable, or corrupted manifest
+        return {}
+
+
+def store_manifest(target_dir: str, records: Records) -> bool:
+    # Output: Whether the manifest was written
+    return write_cache_file(os.path.join(target_dir, MANIFEST_NAME), (MANIFEST_FORMAT, records))
+
+
+def pending_entries(plan: Plan, link: str, digest: str, previous: Optional[Tuple[str, bytes, bytes]]) -> bytearray:
+    # Input : The plan about to be applied, its default link mode and digest, and the record of the previous application
+    # Output: One byte per entry of the plan, 1 if the entry has to be processed, RELINK if it's a file that is
+    #         present with another link mode (see has_pending())
+    if previous is None:
+        return bytearray(b"\x01") * len(plan)
+    previous_digest, previous_plan, present = previous
+    if previous_digest == digest:
+        return bytearray(present.translate(_PRESENT_TO_PENDING))
+
+    # The template has changed: match the entries by their key
+    try:
+        previous_record, previous_link = marshal.loads(previous_plan)
+        previous_plan = Plan.from_record(previous_record)
+    except Exception:
+        return bytearray(b"\x01") * len(plan)
+    present_keys  = set()
+    present_files = set()  # (path, kind, src) of the files present with any link mode
+    for i, key in enumerate(_entry_keys(previous_plan, previous_link)):
+        state = present[i] if i < len(present) else 0
+        if state == 1:
+            present_keys.add(key)
+        if state and (key[1] == COPY):
+            present_files.add(key[:3])
+    pending = bytearray(len(plan))
+    for i, key in enumerate(_entry_keys(plan, link)):
+        if key in present_keys:
+            continue
+        pending[i] = RELINK if (key[1] == COPY) and (key[:3] in present_files) else 1
+    return pending
+
+
+def has_pending(pending: bytearray, start: int = 0, end: Optional[int] = None) -> bool:
+    # Output: Whether any of the entries between start and end has to be processed
+    end = len(pending) if end is None else end
+    return pending.count(0, start, end) < end - start
+
+
+def verify_entries(target_dir: str, plan: Plan, pending: bytearray) -> None:
+    # Marks the entries that are recorded as present, but are missing from the target, as pending
+    # Every directory that contains such entries is listed once
+    kinds = plan.kinds
+    # Directories being verified: (position right after the end of the subtree, listing, path)
+    # The listing maps basenames to whether the entry is a directory; None if the directory is missing
+    parents = [(len(plan), _list_or_none(target_dir), target_dir)]
+    skip_until = 0
+    for i, (index, end, name) in enumerate(plan.entries()):
+        if i < skip_until:
+            continue
+        while i >= parents[-1][0]:
+            parents.pop()
+        _, listing, parent_path = parents[-1]
+        if listing is None:
+            # The parent directory is missing: so is its whole subtree
+            pending[i:end] = b"\x01" * (end - i)
+            skip_until = end
+            continue
+        is_dir = listing.get(name)
+        if kinds[index] == MKDIR:
+            if is_dir is not True:
+                pending[i] = 1
+            if end > i + 1:
+                if pending.find(0, i + 1, end) < 0:
+                    # Every entry of the subtree is pending anyway
+                    skip_until = end
+                    continue
+                path = os.path.join(parent_path, name)
+                parents.append((end, _list_or_none(path) if is_dir else None, path))
+        elif is_dir is not False:
+            pending[i] = 1
+
+
+def _list_or_none(path: str) -> Optional[Dict[str, bool]]:
+    # A directory that can't be listed is treated as missing: its entries are processed again,
+    # and the ones that are present are simply reported as such
+    try:
+        return list_directory(path)
+    except OSError:
+        return None
+
+
+def _entry_keys(plan: Plan, link: str) -> Iterator[tuple]:
+    # link: The link mode of the files that don't specify one
+    # Output: (path relative to the target, kind, src, effective link mode) of every entry, in the order of Plan.entries()
+    kinds, srcs, links = plan.kinds, plan.srcs, plan.links
+    parents = [(len(plan), "")]  # (position right after the end of the subtree, path)
+    for i, (index, end, name) in enumerate(plan.entries()):
+        while i >= parents[-1][0]:
+            parents.pop()
+        path = parents[-1][1] + name
+        yield (path, kinds[index], srcs.get(index, ""), links.get(index, link) if kinds[index] == COPY else "")
+        if end > i + 1:
+            parents.append((end, path + "/"))
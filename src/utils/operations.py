@@ -1,71 +1,675 @@
-import os, os.path, shutil
+from __future__ import annotations
+
+import os, os.path, posixpath, stat, sys, contextlib
 
 from . import *
 from .error_handling import *
-from . import validators
-
-from lxml import etree
-from lxml.etree import _Element as Element
-
-def display_help() -> None:
-    print("Usage: skel <template> [targets...]")
-    print()
-    display_available_templates()
+from . import archiving, batch, cache, catalog, copying, creation, manifest
+from .copying import LinkNotSupported
+from .cli import REGISTERED_CMDLINE_OPTIONS
+from .plan import *
+from .reporting import Reporter, make_reporter
+from .srccache import SrcCache, DEFAULT_BUDGET
 
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Callable, ContextManager, Dict, List, Optional, TextIO, Tuple, Union
+    from .cli import CmdlineOptions
+    from .stats import RunStats
 
-def display_available_templates() -> None:
-    print("Available templates:")
-    for template in _get_available_templates():
-        print("→ {}".format(template))
+# Maximum number of directory fds kept open per target
+MAX_OPEN_DIRS = 64
 
+# With concurrent creation inside a target, maximum number of subtrees waiting for a worker, per worker
+# Each of them holds the fd of its directory
+QUEUED_SUBTREES_PER_WORKER = 4
 
-def parse_template(template: str) -> Element:
-    # Check whether the template file exists
-    template_file = os.path.join(TEMPLATES_DIRECTORY, "{}.xml".format(template)) 
-    if (template not in _get_available_templates()):
-        raise BadCmdlineArgument("The template file \"{}\" doesn't exist".format(template_file))
+# Plans kept in memory by long-running processes (see keep_templates_warm())
+# Template file -> (fingerprint of the template and its src files, plan)
+_warm_plans: Optional[Dict[str, Tuple[tuple, Plan]]] = None
 
-    # Perform the actual parsing
-    try:
-        root_xml_element = etree.parse(template_file).getroot()
-    except etree.ParseError as e:
-        raise UnableToParse(template_path=template_file, trigger=e) 
 
-    # Validate the root element
-    _validate_xml_element(root_xml_element, template_file, is_root=True)
+def display_help() -> None:
+    print("Usage: skel [options] <template> [targets...]")
+    print()
+    display_available_options()
+    print()
+    display_available_templates()
 
-    if ALL_ISSUES:
-        # Raise an exception if at least one issue with the template file is detected
-        raise InvalidTemplateFile(template_file=template_file, issues=ALL_ISSUES)
 
-    # All good
-    return root_xml_element
+def display_available_options() -> None:
+    print("Options:")
+    for name, option in REGISTERED_CMDLINE_OPTIONS.items():
+        usage = "--{} {}".format(name, option.metavar) if option.metavar else "--{}".format(name)
+        print("  {usage:<20} {desc}".format(usage=usage, desc=option.desc))
 
 
-def generate_skeleton(*, inside: List[str], based_on: Element):
-    root_element = based_on
+def display_available_templates() -> None:
+    print("Available templates:")
+    templates = _get_template_catalog()
+    names = templates.names()
+    width = max((len(name) for name in names), default=0)
+    found_new_stats = False
+    for name in names:
+        info = templates.lookup(name)
+        if (info.stats is not None) and not info.stats.is_current(info.path):
+            # The template, one of its src files, or one of the templates it includes has changed
+            info.stats = None
+            found_new_stats = True
+        if info.stats is None:
+            # The statistics are taken from the compiled template, if it's cached
+            plan = cache.load_compiled_template(info.path)
+            if plan is not None:
+                info.stats = catalog.TemplateStats.of_plan(plan, template_file=info.path)
+                found_new_stats = True
+        if info.stats is None:
+            print("→ {}".format(name))
+        else:
+            print("→ {:<{width}}  ({})".format(name, info.stats, width=width))
+    if found_new_stats:
+        templates.save()
+
+
+def parse_template(template: str, *, stats: Optional[RunStats] = None) -> Plan:
+    # stats: If given, the phases of parsing are timed (--stats)
+    template_file = os.path.join(TEMPLATES_DIRECTORY, "{}.xml".format(template))
+    with _phase(stats, "parse_template"):
+        # Plans kept in memory and cached plans are only found if the template file exists,
+        # so its existence is only checked when it has to be compiled
+        if _warm_plans is not None:
+            plan = _load_warm_template(template_file)
+            if plan is not None:
+                return plan
+
+        # Reuse the compiled template if neither the template nor its src files have changed
+        with _phase(stats, "load cached template"):
+            plan = cache.load_compiled_template(template_file)
+        if plan is not None:
+            plan.name = template
+            _keep_template_warm(template_file, plan)
+            return plan
+
+        # Check whether the template file exists
+        if not os.path.isfile(template_file):
+            ensure_resource_directories()
+            raise BadCmdlineArgument("The template file \"{}\" doesn't exist".format(template_file))
+
+        # The template has to be (re)compiled
+        # lxml and the validators are only imported here, so runs that hit the cache never load them
+        try:
+            from .compiler import compile_template
+        except ModuleNotFoundError as e:
+            if e.name in DEPENDENCIES:
+                raise MissingDependency(name=e.name)
+            raise
+        plan = compile_template(template_file, stats=stats)
+        cache.store_compiled_template(template_file, plan)
+        catalog.record_template_stats(template_file, plan)
+        plan.name = template
+        _keep_template_warm(template_file, plan)
+        return plan
+
+
+def keep_templates_warm() -> None:
+    # Makes parse_template() keep the plans in memory, for processes that parse templates over and over (--serve)
+    # A plan is reused as long as neither its template nor its src files change
+    global _warm_plans
+    if _warm_plans is None:
+        _warm_plans = {}
+
+
+def _load_warm_template(template_file: str) -> Optional[Plan]:
+    fingerprint, plan = _warm_plans.get(template_file, (None, None))
+    if plan is None:
+        return None
+    dependencies = cache.stat_dependencies(template_file, plan.dependency_paths())
+    if (dependencies is None) or (dependencies[0] != fingerprint):
+        return None
+    # The stat results are handed to the src caches of the next generations
+    plan.src_stats = dependencies[1]
+    return plan
+
+
+def _keep_template_warm(template_file: str, plan: Plan) -> None:
+    if _warm_plans is None:
+        return
+    dependencies = cache.stat_dependencies(template_file, plan.dependency_paths())
+    if (dependencies is not None) and not cache.is_racy(dependencies[0]):
+        _warm_plans[template_file] = (dependencies[0], plan)
+
+
+def run(options: CmdlineOptions, args: List[str], *, cwd: Optional[str] = None, stream: Optional[TextIO] = None) -> None:
+    # Applies a template as requested on the command line
+    # Input : The parsed options and the positional arguments (template and targets), which must not be empty
+    #         cwd: Directory relative to which the targets and the archive are resolved (default: the current directory)
+    #         stream: Where the report is written (default: stdout)
+    check_cli_arguments(args)
+    chosen_template = args[0]
+    target_directories = args[1:]
+    archive = options.archive
+    if cwd is not None:
+        if not archive:
+            target_directories = [os.path.join(cwd, d) for d in target_directories] or [cwd]
+        elif archive != archiving.STDOUT:
+            # Targets are paths inside the archive
+            archive = os.path.join(cwd, archive)
+    stats = _make_run_stats() if options.stats else None
+    # When the archive is written to stdout, the report goes to stderr
+    if (stream is None) and (archive == archiving.STDOUT):
+        stream = sys.stderr
+    reporter = make_reporter(output_format=options.format, quiet=options.quiet, dry_run=options.dry_run, stream=stream, stats=stats)
+    template_plan = parse_template(chosen_template, stats=stats)
+    if archive:
+        generate_archive(archive=archive, inside=target_directories, based_on=template_plan, link=options.link, reporter=reporter,
+                         stats=stats)
+    else:
+        generate_skeleton(inside=target_directories, based_on=template_plan, jobs=options.jobs, link=options.link,
+                          src_cache_budget=options.src_cache_budget, incremental=options.incremental, verify=options.verify,
+                          atomic=options.atomic, dry_run=options.dry_run, reporter=reporter, stats=stats)
+    reporter.finish()
+    if stats is not None:
+        reporter.report_stats(stats.to_dict(reporter))
+        reporter.flush()
+
+
+def run_batch(options: CmdlineOptions, batch_file: str, *, cwd: Optional[str] = None, stream: Optional[TextIO] = None) -> bool:
+    # Runs every job of a batch file (--batch)
+    # Every distinct template is parsed (and validated) once, and its plan is shared by all its jobs
+    # Up to options.jobs jobs run concurrently; their reports come out in the order of the batch file,
+    # followed by the outcome of every job
+    # Output: Whether every job succeeded
+    jobs = batch.read_batch_file(batch_file)
+    stats = _make_run_stats() if options.stats else None
+    reporter = make_reporter(output_format=options.format, quiet=options.quiet, dry_run=options.dry_run, stream=stream, stats=stats)
+
+    # Template name -> plan, or the error raised while parsing it
+    plans: Dict[str, Union[Plan, Exception]] = {}
+    for job in jobs:
+        if job.template not in plans:
+            try:
+                plans[job.template] = parse_template(job.template, stats=stats)
+            except Exception as e:
+                plans[job.template] = e
+    cwd = os.getcwd() if cwd is None else cwd
+
+    def run_job(job: batch.BatchJob) -> Tuple[Reporter, Optional[Exception]]:
+        # Runs inside a worker thread when jobs run concurrently
+        child_reporter = reporter.for_target()
+        plan = plans[job.template]
+        if isinstance(plan, Exception):
+            return child_reporter, plan
+        try:
+            # As on the command line, relative targets are resolved against the working directory
+            target_dirs = [os.path.join(cwd, d) for d in job.targets] or [cwd]
+            generate_skeleton(inside=target_dirs, based_on=plan, link=options.link, src_cache_budget=options.src_cache_budget,
+                              incremental=options.incremental, verify=options.verify, atomic=options.atomic,
+                              dry_run=options.dry_run, reporter=child_reporter, stats=stats)
+        except Exception as e:
+            return child_reporter, e
+        return child_reporter, None
+
+    if (options.jobs <= 1) or (len(jobs) <= 1):
+        results = [run_job(job) for job in jobs]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=options.jobs) as pool:
+            results = list(pool.map(run_job, jobs))
+
+    for child_reporter, _ in results:
+        reporter.merge(child_reporter)
+    for job, (child_reporter, error) in zip(jobs, results):
+        reporter.report_job(line=job.line, template=job.template, targets=job.targets, counts=child_reporter.counts,
+                            error="" if error is None else str(error))
+    reporter.finish()
+    if stats is not None:
+        reporter.report_stats(stats.to_dict(reporter))
+        reporter.flush()
+    return all(error is None for _, error in results)
+
+
+def _make_run_stats() -> RunStats:
+    # The stats module is only imported with --stats
+    from .stats import RunStats
+    return RunStats()
+
+
+def _phase(stats: Optional[RunStats], phase: str) -> ContextManager[None]:
+    # Times a phase of the run with --stats; does nothing otherwise
+    return contextlib.nullcontext() if stats is None else stats.phase(phase)
+
+
+class GenerationContext:
+    # Settings and state shared by all the targets of a generate_skeleton() call
+    def __init__(self, *, link: str = "", src_cache_budget: int = DEFAULT_BUDGET,
+                 src_stats: Optional[Dict[str, os.stat_result]] = None, incremental: bool = False, verify: bool = False,
+                 atomic: bool = False, dry_run: bool = False, stats: Optional[RunStats] = None) -> None:
+        self.link            = link or "auto"  # Link mode of <file src=...> entries that don't specify one
+        self.src_cache       = SrcCache(budget=src_cache_budget, known_stats=src_stats) if src_cache_budget > 0 else None
+        self.incremental     = incremental     # Whether to skip the entries recorded in the manifests of the targets
+        self.verify          = verify          # Whether to check that the recorded entries are still present
+        self.atomic          = atomic          # Whether to build new targets aside and publish them with a single rename
+        self.dry_run         = dry_run         # Whether to only report what would be done, without changing anything
+        self.stats           = stats           # If given, the creation of every entry is timed (--stats)
+        self.entry_jobs      = 1               # Number of threads creating the entries of a target (see _create_dir_entries_concurrently())
+        self.serialized_plan = b""             # Serialized form of the plan and link mode (incremental mode only)
+        self.plan_digest     = ""              # Digest of the serialized plan and link mode (incremental mode only)
+
+
+def generate_skeleton(*, inside: List[str], based_on: Plan, jobs: int = 1, link: str = "", src_cache_budget: int = DEFAULT_BUDGET,
+                      incremental: bool = False, verify: bool = False, atomic: bool = False, dry_run: bool = False,
+                      reporter: Optional[Reporter] = None, stats: Optional[RunStats] = None):
+    # stats: If given, the run and the creation of every entry are timed (--stats)
+    plan = based_on
     target_dirs = inside
+    context = GenerationContext(link=link, src_cache_budget=src_cache_budget, src_stats=plan.src_stats,
+                                incremental=incremental or verify, verify=verify, atomic=atomic, dry_run=dry_run,
+                                stats=stats)
+    if context.incremental:
+        context.serialized_plan = manifest.serialize_plan(plan, context.link)
+        context.plan_digest = manifest.plan_digest(context.serialized_plan)
+    reporter = make_reporter() if reporter is None else reporter
 
     if not target_dirs:
         target_dirs = [os.getcwd()]
     else:
         # Expand all paths to absolute paths
         target_dirs = [os.path.realpath(d) for d in target_dirs]
+    if (jobs > 1) and (len(target_dirs) == 1):
+        # A single target: its entries are created concurrently instead
+        context.entry_jobs = jobs
 
-    # Create every target dirs if they don't exist
-    # Set up the dir structure as specified by the root element
-    for dir in target_dirs:
+    with _phase(stats, "generate_skeleton"):
         try:
-            _make_paths(path_type="directory", path=dir)
-            _create_dir_entries(inside=dir, based_on=root_element)
-        except DirPathBelongsToExistingFile:
-            remarks = [
-                    "Unable to create the target directory",
-                    "The path belongs to an existing file",
-            ]
-            _report_path_creation_status(path_type="directory", path=dir, skipping=True, remarks=remarks)
+            if (jobs <= 1) or (len(target_dirs) == 1):
+                for dir in target_dirs:
+                    _generate_skeleton_in_target(target_dir=dir, plan=plan, context=context, reporter=reporter)
+            else:
+                # Targets are independent of each other, so they can be generated concurrently
+                # Every target reports into its own child reporter, which is merged in the original order of the targets
+                # As in serial mode, an unexpected error stops the run: the targets that haven't been started yet are
+                # abandoned, and the error is raised once the targets already started have been reported
+                # Targets that share missing parents would race to create (and report) them, so the parents are
+                # created beforehand, in the order of the targets, and reported along with the first target that needs them
+                from concurrent.futures import ThreadPoolExecutor
+                first_error = None
+                child_reporters = [reporter.for_target() for _ in target_dirs]
+                if not context.dry_run:
+                    for dir, child_reporter in zip(target_dirs, child_reporters):
+                        _make_parent_directories(target_dir=dir, reporter=child_reporter)
+                with ThreadPoolExecutor(max_workers=jobs) as pool:
+                    results = [pool.submit(_generate_skeleton_into_child_reporter, target_dir=dir, plan=plan, context=context,
+                                           reporter=child_reporter)
+                               for dir, child_reporter in zip(target_dirs, child_reporters)]
+                    for result in results:
+                        if result.cancelled():
+                            continue
+                        child_reporter, error = result.result()
+                        reporter.merge(child_reporter)
+                        if (error is not None) and (first_error is None):
+                            first_error = error
+                            for pending in results:
+                                pending.cancel()
+                if first_error is not None:
+                    raise first_error
+
+            if (stats is not None) and (context.src_cache is not None):
+                stats.add_src_cache_counts(context.src_cache)
+        finally:
+            reporter.flush()
+
+
+def generate_archive(*, archive: str, inside: List[str], based_on: Plan, link: str = "", reporter: Optional[Reporter] = None,
+                     stats: Optional[RunStats] = None):
+    # Streams the entries of the skeleton into an archive instead of creating them on disk
+    # Every target becomes a directory inside the archive; without targets, the entries are at the root of the archive
+    plan = based_on
+    reporter = make_reporter() if reporter is None else reporter
+    prefixes = [_archive_prefix(d) for d in inside] or [""]
+
+    with _phase(stats, "generate_skeleton"):
+        writer = archiving.open_archive(archive)
+        try:
+            for prefix in prefixes:
+                _add_archive_entries(inside=prefix, based_on=plan, writer=writer, link=link or "auto", reporter=reporter)
+            writer.close()
+        except BaseException:
+            if archive != archiving.STDOUT:
+                # Don't leave a truncated archive behind
+                writer.stream.close()
+                try:
+                    os.unlink(archive)
+                except OSError:
+                    pass
+            raise
+        finally:
+            reporter.flush()
+
+
+def _archive_prefix(target_dir: str) -> str:
+    # Output: The path of the target inside the archive
+    prefix = posixpath.normpath(target_dir.replace(os.sep, "/")).lstrip("/")
+    if prefix == ".":
+        return ""
+    if prefix == ".." or prefix.startswith("../"):
+        raise BadCmdlineArgument("Targets inside archives can't be outside of the archive: \"{}\"".format(target_dir))
+    return prefix
+
+
+def _add_archive_entries(*, inside: str, based_on: Plan, writer: archiving.ArchiveWriter, link: str, reporter: Reporter):
+    # Mirrors _create_dir_entries(): entries that clash with entries already in the archive are skipped the same way
+    plan = based_on
+    kinds, srcs, links = plan.kinds, plan.srcs, plan.links
+    entries = writer.entries
+    _report_ignored_includes(plan=plan, path=inside, reporter=reporter)
+
+    # Directories of the target itself
+    parts = inside.split("/") if inside else []
+    for n in range(len(parts)):
+        path = "/".join(parts[:n + 1])
+        if entries.get(path) is False:
+            _report_target_clash(target_dir=inside, reporter=reporter)
+            return
+        if path not in entries:
+            writer.add_directory(path)
+            reporter.report_entry(path_type="directory", path=path, created=True)
+        elif n == len(parts) - 1:
+            reporter.report_entry(path_type="directory", path=path, created=False)
+
+    # Directories whose subtree is being added: (position right after the end of the subtree, path)
+    parents = [(len(plan), inside)]
+    skip_until = 0  # Entries before this position belong to a subtree that is skipped
+    for i, (index, end, name) in enumerate(plan.entries()):
+        if i < skip_until:
+            continue
+        while i >= parents[-1][0]:
+            parents.pop()
+        path = posixpath.join(parents[-1][1], name)
+        is_dir = entries.get(path)
+        if kinds[index] == MKDIR:
+            if is_dir is False:
+                # Skip the entry entirely
+                # Do not attempt to add the entries of its children
+                _report_dir_clash(path=path, reporter=reporter)
+                skip_until = end
+                continue
+            if is_dir is None:
+                writer.add_directory(path)
+            reporter.report_entry(path_type="directory", path=path, created=is_dir is None)
+            if end > i + 1:
+                parents.append((end, path))
+        else:
+            if is_dir is None:
+                src = srcs.get(index, "")
+                if not src:
+                    writer.add_file(path)
+                    reporter.report_entry(path_type="file", path=path, created=True)
+                else:
+                    # Hard links and reflinks can't point outside of an archive, so their contents are stored
+                    if links.get(index, link) == "sym":
+                        writer.add_symlink(path, src)
+                        method, copied = copying.SYMLINK, 0
+                    else:
+                        method, copied = archiving.ARCHIVED, writer.add_src_file(path, src)
+                    remarks = [_describe_src_materialization(src=src, method=method, copied=copied)]
+                    reporter.report_entry(path_type="file", path=path, created=True, remarks=remarks, src=src, method=method, bytes=copied)
+            else:
+                _report_file_clash(path=path, is_dir=is_dir, reporter=reporter)
+            _report_ignored_children(plan=plan, index=index, name=name, path=path, reporter=reporter)
+
+
+def _generate_skeleton_in_target(*, target_dir: str, plan: Plan, context: GenerationContext, reporter: Reporter) -> None:
+    # In incremental mode, only the entries that aren't recorded in the manifest of the target are processed
+    _report_ignored_includes(plan=plan, path=target_dir, reporter=reporter)
+    if context.dry_run:
+        _preview_target(target_dir=target_dir, plan=plan, context=context, reporter=reporter)
+        return
+    pending = present = records = None
+    if context.incremental:
+        records = manifest.load_manifest(target_dir)
+        pending = manifest.pending_entries(plan, context.link, context.plan_digest, records.get(plan.name))
+        if context.verify and records:
+            manifest.verify_entries(target_dir, plan, pending)
+        if not manifest.has_pending(pending):
+            reporter.report_message("Up to date: \"{}\"".format(target_dir))
+            previous = records.get(plan.name)
+            if (previous is None) or (previous[0] != context.plan_digest):
+                # Only entries were removed from the template
+                _store_manifest(target_dir=target_dir, plan=plan, context=context, records=records,
+                                present=bytearray(len(plan)), pending=pending, reporter=reporter)
+            return
+        present = bytearray(len(plan))
+
+    # Create the target dir if it doesn't exist
+    # Set up the dir structure as specified by the plan
+    try:
+        if context.atomic and not os.path.lexists(target_dir):
+            _generate_new_target_atomically(target_dir=target_dir, plan=plan, context=context, reporter=reporter,
+                                            pending=pending, present=present)
+            return
+        if records:
+            # The target was generated before; it isn't reported again unless it has to be created
+            target_fd = _open_present_directory(path=target_dir, reporter=reporter)
+        else:
+            make_paths = _make_paths if context.stats is None else context.stats.timed_entry(_make_paths)
+            target_fd = make_paths(path_type="directory", path=target_dir, reporter=reporter, keep_open=True)
+        try:
+            create_dir_entries = _create_dir_entries_concurrently if context.entry_jobs > 1 else _create_dir_entries
+            create_dir_entries(inside=target_dir, based_on=plan, dir_fd=target_fd, context=context, reporter=reporter,
+                               pending=pending, present=present)
+        finally:
+            os.close(target_fd)
+        if present is not None:
+            _store_manifest(target_dir=target_dir, plan=plan, context=context, records=records,
+                            present=present, pending=pending, reporter=reporter)
+    except DirPathBelongsToExistingFile:
+        _report_target_clash(target_dir=target_dir, reporter=reporter)
+    except PermissionError:
+        reporter.report_permission_error(path_type="directory", path=target_dir)
+
+
+def _generate_new_target_atomically(*, target_dir: str, plan: Plan, context: GenerationContext, reporter: Reporter,
+                                    pending: Optional[bytearray], present: Optional[bytearray]) -> None:
+    # Builds a target that doesn't exist yet in a staging directory next to it (so on the same filesystem),
+    # and publishes it with a single rename: the target appears complete or not at all
+    # If anything goes wrong, the staging directory is removed and nothing is left behind
+    parent_dir, name = os.path.split(target_dir)
+    for dir in creation.make_directories(parent_dir):
+        reporter.report_entry(path_type="directory", path=dir, created=True)
+    parent_fd = creation.open_directory(parent_dir)
+    try:
+        staging_name = creation.make_staging_directory(name, dir_fd=parent_fd)
+        staging_dir = os.path.join(parent_dir, staging_name)
+        # The entries are reported with their final paths, and only once the target is published
+        target_reporter = reporter.for_target()
+        try:
+            staging_fd = creation.open_directory(staging_dir)
+            try:
+                create_dir_entries = _create_dir_entries_concurrently if context.entry_jobs > 1 else _create_dir_entries
+                create_dir_entries(inside=target_dir, based_on=plan, dir_fd=staging_fd, context=context, reporter=target_reporter,
+                                   pending=pending, present=present)
+            finally:
+                os.close(staging_fd)
+            if present is not None:
+                _store_manifest(target_dir=staging_dir, plan=plan, context=context, records={},
+                                present=present, pending=pending, reporter=target_reporter)
+            try:
+                creation.rename_no_replace(staging_name, name, dir_fd=parent_fd)
+                published = True
+            except FileExistsError:
+                published = False
+        except BaseException:
+            _remove_staging_directory(staging_name, staging_dir=staging_dir, parent_fd=parent_fd, reporter=reporter)
+            raise
+        if not published:
+            _remove_staging_directory(staging_name, staging_dir=staging_dir, parent_fd=parent_fd, reporter=reporter)
+    finally:
+        os.close(parent_fd)
+
+    if not published:
+        remarks = [
+                "The target was created by someone else while it was being generated",
+                "Nothing was written into it"
+        ]
+        reporter.report_entry(path_type="directory", path=target_dir, created=False, remarks=remarks)
+        return
+    reporter.report_entry(path_type="directory", path=target_dir, created=True)
+    reporter.merge(target_reporter)
+
+
+def _remove_staging_directory(staging_name: str, *, staging_dir: str, parent_fd: int, reporter: Reporter) -> None:
+    # A staging directory that can't be removed is reported, so that it can be removed by hand
+    try:
+        creation.remove_tree(staging_name, dir_fd=parent_fd)
+    except OSError as e:
+        remarks = [
+                "Unable to remove the staging directory of the target",
+                str(e),
+                "It can be removed safely"
+        ]
+        reporter.report_entry(path_type="directory", path=staging_dir, created=False, remarks=remarks)
+
+
+def _preview_target(*, target_dir: str, plan: Plan, context: GenerationContext, reporter: Reporter) -> None:
+    # Dry run: reports what generating the target would do, without changing anything
+    # Every existing directory of the target that the template touches is listed once (see creation.list_directory());
+    # every entry is then looked up in memory
+    missing_dirs = []
+    path = target_dir
+    while True:
+        try:
+            is_dir = stat.S_ISDIR(os.stat(path).st_mode)
+            break
+        except FileNotFoundError:
+            missing_dirs.append(path)
+            path = os.path.dirname(path)
+        except NotADirectoryError:
+            is_dir = False  # One of the parents is a file
+            break
         except PermissionError:
-            _report_permission_error(path_type="directory", path=dir)
+            reporter.report_permission_error(path_type="directory", path=target_dir)
+            return
+        except OSError as e:
+            _report_target_clash(target_dir=target_dir, reporter=reporter, reason=str(e))
+            return
+    if not is_dir:
+        _report_target_clash(target_dir=target_dir, reporter=reporter)
+        return
+    for dir in reversed(missing_dirs):
+        reporter.report_entry(path_type="directory", path=dir, created=True)
+    if missing_dirs:
+        listing = {}
+    else:
+        listing = _list_existing_directory(path=target_dir, reporter=reporter)
+        if listing is None:
+            return
+        reporter.report_entry(path_type="directory", path=target_dir, created=False)
+    _preview_dir_entries(inside=target_dir, based_on=plan, listing=listing, context=context, reporter=reporter)
+
+
+def _preview_dir_entries(*, inside: str, based_on: Plan, listing: Dict[str, bool], context: GenerationContext, reporter: Reporter):
+    # Mirrors _create_dir_entries(), using listings of the directories instead of creating the entries
+    # listing: Maps the basenames of the entries of the target to whether they are directories
+    # The listings are updated with the entries that would be created, so that clashes within the template are reported too
+    plan = based_on
+    kinds, srcs, links = plan.kinds, plan.srcs, plan.links
+
+    # Directories whose subtree is being previewed: (position right after the end of the subtree, path prefix, listing)
+    # Paths are built by concatenation, which is much cheaper than os.path.join() for every entry
+    parents = [(len(plan), os.path.join(inside, ""), listing)]
+    skip_until = 0  # Entries before this position belong to a subtree that is skipped
+    for i, (index, end, name) in enumerate(plan.entries()):
+        if i < skip_until:
+            continue
+        while i >= parents[-1][0]:
+            parents.pop()
+        _, prefix, listing = parents[-1]
+        path = prefix + name
+        is_dir = listing.get(name)
+        if kinds[index] == MKDIR:
+            if is_dir is False:
+                # Skip the entry entirely
+                # Do not preview the entries of its children
+                _report_dir_clash(path=path, reporter=reporter)
+                skip_until = end
+                continue
+            if is_dir is None:
+                reporter.report_entry(path_type="directory", path=path, created=True)
+                listing[name] = True
+                if end > i + 1:
+                    # Directories that would be created are empty
+                    parents.append((end, path + os.sep, {}))
+                continue
+            if end > i + 1:
+                # Existing directories are listed once
+                child_listing = _list_existing_directory(path=path, reporter=reporter)
+                if child_listing is None:
+                    skip_until = end
+                    continue
+                parents.append((end, path + os.sep, child_listing))
+            reporter.report_entry(path_type="directory", path=path, created=False)
+        else:
+            if is_dir is None:
+                listing[name] = False
+                src = srcs.get(index, "")
+                if not src:
+                    reporter.report_entry(path_type="file", path=path, created=True)
+                else:
+                    remarks = ["Would be materialized from \"{}\" (link=\"{}\")".format(src, links.get(index, context.link))]
+                    reporter.report_entry(path_type="file", path=path, created=True, remarks=remarks, src=src)
+            else:
+                _report_file_clash(path=path, is_dir=is_dir, reporter=reporter)
+            _report_ignored_children(plan=plan, index=index, name=name, path=path, reporter=reporter)
+
+
+def _list_existing_directory(*, path: str, reporter: Reporter) -> Optional[Dict[str, bool]]:
+    # Output: The listing of an existing directory, or None if it can't be listed
+    # A directory that can't be listed is reported as skipped, along with its contents: what they
+    # would become can't be predicted
+    try:
+        listing = creation.list_directory(path)
+    except OSError as e:
+        remarks = [
+                "Unable to list the directory: {}".format(e.strerror or e),
+                "Its contents can't be previewed"
+        ]
+        reporter.report_entry(path_type="directory", path=path, created=False, remarks=remarks)
+        return None
+    # The directory may have been removed in the meantime
+    return listing if listing is not None else {}
+
+
+def _store_manifest(*, target_dir: str, plan: Plan, context: GenerationContext, records: manifest.Records,
+                    present: bytearray, pending: bytearray, reporter: Reporter) -> None:
+    # Entries that weren't pending were already present
+    for i in range(len(plan)):
+        if not pending[i]:
+            present[i] = 1
+    records[plan.name] = (context.plan_digest, context.serialized_plan, bytes(present))
+    if not manifest.store_manifest(target_dir, records):
+        reporter.report_message("Unable to write the manifest of \"{}\"; the next run won't be incremental".format(target_dir))
+
+
+def _generate_skeleton_into_child_reporter(*, target_dir: str, plan: Plan, context: GenerationContext,
+                                           reporter: Reporter) -> Tuple[Reporter, Optional[Exception]]:
+    # Runs inside a worker thread
+    # reporter: The child reporter of the target (see Reporter.for_target())
+    # Unexpected errors are handed back to the caller so that they are raised after the output is merged
+    error = None
+    try:
+        _generate_skeleton_in_target(target_dir=target_dir, plan=plan, context=context, reporter=reporter)
+    except Exception as e:
+        error = e
+    return reporter, error
+
+
+def _make_parent_directories(*, target_dir: str, reporter: Reporter) -> None:
+    # Creates the missing parents of a target, and reports them as the target itself would
+    try:
+        created_dirs = creation.make_directories(os.path.dirname(target_dir))
+    except (DirPathBelongsToExistingFile, OSError):
+        return  # Reported by the target itself, when it fails to create them as well
+    for dir in created_dirs:
+        reporter.report_entry(path_type="directory", path=dir, created=True)
 
 
 def check_cli_arguments(args: List[str]) -> None:
@@ -75,165 +679,306 @@ def check_cli_arguments(args: List[str]) -> None:
         raise BadCmdlineArgument("Template names cannot contain path separators ({})".format(os.sep))
 
 
-def _get_available_templates() -> List[str]:
-    return [os.path.splitext(t)[0] for t in os.listdir(TEMPLATES_DIRECTORY) if t.endswith(".xml")]
-
-
-def _validate_xml_element(element: Element, template_path: str, is_root: bool):
-    # Make sure that the tag is valid
-    if element.tag == "noroot":
-        raise NotWellFormedXML(template_path=template_path)
-    if is_root and (element.tag != "root"):
-        # The root element of the document cannot be something other than <root>
-        log_issue(InvalidRootElement(affected_element=element))
-    if element.tag not in VALID_TAGS:
-        log_issue(UnrecognizedTag(affected_element=element))
-
-    # Make sure that mandatory attributes are present for all valid tags
-    if element.tag in VALID_TAGS:
-        for attr in VALID_TAGS[element.tag]:
-            if attr not in element.attrib:
-                log_issue(MissingRequiredAttribute(affected_element=element, attribute=attr))
-
-    # Invoke the appropriate handlers to validate the values of all registered attributes
-    for attr in element.attrib:
-        if attr in validators.REGISTERED_ATTRIBUTE_CHECKERS:
-            validators.REGISTERED_ATTRIBUTE_CHECKERS[attr](element)
-
-    # Validate the element's children unless it is a <file> element
-    if (element.tag == "file"): return
-    if (element.tag == "root") and not is_root:
-        # <root> must be the top level in the template file
-        log_issue(NestedRootTag(affected_element=element))
-
-    # Check all the children of the element recursively
-    for child in element:
-        _validate_xml_element(element=child, template_path=template_path, is_root=False)
-
-
-def _create_dir_entries(*, inside: str, based_on: Element):
-    containing_directory = inside
-    template_element     = based_on
-
-    for child in template_element:
-        # Child elements can only be either <dir> or <file>; a nested <root> will trigger an exception early on
-        if child.tag == "file":
-            file_path = os.path.join(containing_directory, child.get("name"))
-            if "src" in child.attrib:
-                src = resolve_src_attribute(src=child.get("src"))
-            else:
-                src =""
-            _make_paths(path_type="file", path=file_path, src=src)
-            if len(child): # Print warning if <file> has children
-                _report_ignoring_children_of_file_tag(file_elem=child)
-
-        if child.tag == "dir":
-            # Child element is a <dir>
-            # The element represents a subdirectory of the current directory
-            dir_path = os.path.join(containing_directory, child.get("name"))
-            try:
-                _make_paths(path_type="directory", path=dir_path)
-            except DirPathBelongsToExistingFile:
-                # Skip the element entirely
-                # Do not attempt to create the entries of its children
-                remarks = [
-                        "A file already exists at {}".format(dir_path),
-                        "Make sure that no <file> and <dir> under the same parent has the same 'name'"
-                ]
-                _report_path_creation_status(path_type="directory", path=dir_path, skipping=True, remarks=remarks)
-                continue
-            except PermissionError:
-                _report_permission_error(path_type="directory", path=dir_path)
+def _get_template_catalog() -> catalog.Catalog:
+    ensure_resource_directories()
+    return catalog.get_catalog()
+
+
+def _create_dir_entries(*, inside: str, based_on: Plan, dir_fd: int, context: GenerationContext, reporter: Reporter,
+                        pending: Optional[bytearray] = None, present: Optional[bytearray] = None,
+                        subtree: Optional[Tuple[int, int, int]] = None,
+                        offload: Optional[Callable[[int, int, int, str, int], bool]] = None):
+    # dir_fd refers to the target directory; it is owned by the caller
+    # pending: If given, only the entries marked in it are processed (incremental mode)
+    # present: If given, the entries that are present once processed are marked in it
+    # subtree: (index, position, position right after the end of the subtree) of a directory entry; if given, only
+    #          the entries of its subtree are processed, and inside and dir_fd refer to that directory
+    # offload: Called with (index, position, end, path, fd) for every directory with children once it is present;
+    #          if it returns True, the subtree of the directory is created elsewhere, and the fd belongs to the callee
+    target_directory = inside
+    plan             = based_on
+    kinds, srcs, links = plan.kinds, plan.srcs, plan.links
+    make_paths       = _make_paths if context.stats is None else context.stats.timed_entry(_make_paths)
+
+    # Directories whose subtree is being created: [position right after the end of the subtree, fd, path]
+    # Beyond MAX_OPEN_DIRS levels, the fd of a parent is closed while its subtree is being created
+    # and reopened through ".." afterwards, so arbitrarily deep templates don't run out of fds
+    if subtree is None:
+        open_dirs = [[len(plan), dir_fd, target_directory]]
+        entries = enumerate(plan.entries())
+    else:
+        open_dirs = [[subtree[2], dir_fd, target_directory]]
+        entries = enumerate(plan.entries(within=subtree[:2]), start=subtree[1] + 1)
+    skip_until = 0  # Entries before this position belong to a subtree that is skipped
+    try:
+        for i, (index, end, name) in entries:
+            if i < skip_until:
                 continue
-            _create_dir_entries(inside=dir_path, based_on=child)
-
-
-def _make_paths(*, path_type:str, path: str, src: str="") -> None:
+            while i >= open_dirs[-1][0]:
+                _, fd, _ = open_dirs.pop()
+                if open_dirs[-1][1] < 0:
+                    open_dirs[-1][1] = creation.open_parent_directory(fd)
+                os.close(fd)
+            parent_fd = open_dirs[-1][1]
+            path = os.path.join(open_dirs[-1][2], name)
+            is_pending = (pending is None) or pending[i]
+            if kinds[index] == MKDIR:
+                has_children = end > i + 1
+                if not is_pending and not manifest.has_pending(pending, i + 1, end):
+                    # Nothing to do in the whole subtree
+                    skip_until = end
+                    continue
+                try:
+                    if is_pending:
+                        fd = make_paths(path_type="directory", path=path, reporter=reporter, dir_fd=parent_fd, keep_open=has_children)
+                    else:
+                        fd = _open_present_directory(path=path, reporter=reporter, dir_fd=parent_fd)
+                except DirPathBelongsToExistingFile:
+                    # Skip the entry entirely
+                    # Do not attempt to create the entries of its children
+                    _report_dir_clash(path=path, reporter=reporter)
+                    skip_until = end
+                    continue
+                except PermissionError:
+                    reporter.report_permission_error(path_type="directory", path=path)
+                    skip_until = end
+                    continue
+                if present is not None:
+                    present[i] = 1
+                if has_children:
+                    if (offload is not None) and offload(index, i, end, path, fd):
+                        skip_until = end
+                        continue
+                    if len(open_dirs) > MAX_OPEN_DIRS:
+                        os.close(parent_fd)
+                        open_dirs[-1][1] = -1
+                    open_dirs.append([end, fd, path])
+            elif is_pending:
+                relink = (pending is not None) and (pending[i] == manifest.RELINK)
+                status = make_paths(path_type="file", path=path, reporter=reporter, src=srcs.get(index, ""),
+                                     link=links.get(index, context.link), src_cache=context.src_cache, dir_fd=parent_fd,
+                                     relink=relink)
+                if present is not None:
+                    if status == 0:
+                        present[i] = 1
+                    elif status == 1:
+                        present[i] = manifest.RELINK
+                _report_ignored_children(plan=plan, index=index, name=name, path=path, reporter=reporter)
+    finally:
+        for _, fd, _ in open_dirs[1:]:
+            if fd >= 0:
+                os.close(fd)
+
+
+def _create_dir_entries_concurrently(*, inside: str, based_on: Plan, dir_fd: int, context: GenerationContext, reporter: Reporter,
+                                    pending: Optional[bytearray] = None, present: Optional[bytearray] = None):
+    # Like _create_dir_entries(), with the work spread over a pool of context.entry_jobs threads
+    # Once a worker has created a directory, it hands the subtree of the directory (along with its fd) over to the
+    # pool, so its children are created concurrently with the rest of the target; parents are always created
+    # before their children. When QUEUED_SUBTREES_PER_WORKER subtrees per worker are already waiting, the worker
+    # creates the subtree itself, which also bounds the number of open fds.
+    # Workers record their reports, which are replayed in the order of the template: the output is the same as
+    # with a single thread. An unexpected error is raised once the reports that precede it have been replayed;
+    # the subtrees that a single thread wouldn't have reached before the error are abandoned, unless they were
+    # already started.
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    plan = based_on
+    queue_slots = threading.BoundedSemaphore(context.entry_jobs * QUEUED_SUBTREES_PER_WORKER)
+    lock = threading.Lock()
+    abandon_from = [len(plan)]  # Subtrees that start at or after this position are abandoned
+
+    def create_subtree(subtree: Optional[Tuple[int, int, int]], path: str, fd: int) -> _RecordedReports:
+        # subtree: See _create_dir_entries(); None for the whole target, whose fd belongs to the caller
+        recorded = _RecordedReports()
+        def offload(index: int, position: int, end: int, child_path: str, child_fd: int) -> bool:
+            if position >= abandon_from[0]:
+                os.close(child_fd)
+                return True
+            if not queue_slots.acquire(blocking=False):
+                return False
+            recorded.items.append(pool.submit(create_subtree, (index, position, end), child_path, child_fd))
+            return True
+        try:
+            if (subtree is None) or (subtree[1] < abandon_from[0]):
+                _create_dir_entries(inside=path, based_on=plan, dir_fd=fd, context=context, reporter=recorded,
+                                    pending=pending, present=present, subtree=subtree, offload=offload)
+        except Exception as e:
+            # A single thread would have stopped here: nothing after this subtree would have been processed
+            recorded.items.append(e)
+            with lock:
+                abandon_from[0] = min(abandon_from[0], len(plan) if subtree is None else subtree[2])
+        finally:
+            if subtree is not None:
+                os.close(fd)
+                queue_slots.release()
+        return recorded
+
+    with ThreadPoolExecutor(max_workers=context.entry_jobs) as pool:
+        try:
+            # Depth-first replay: every subtree handed over is replayed where its reports would have been
+            replay = [iter([pool.submit(create_subtree, None, inside, dir_fd)])]
+            while replay:
+                item = next(replay[-1], None)
+                if item is None:
+                    replay.pop()
+                elif isinstance(item, tuple):
+                    method, kwargs = item
+                    getattr(reporter, method)(**kwargs)
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    replay.append(iter(item.result().items))
+        except BaseException:
+            # E.g. Ctrl+C: the subtrees that haven't been started yet are abandoned
+            abandon_from[0] = -1
+            raise
+
+
+class _RecordedReports:
+    # Stands in for the reporter of the workers of _create_dir_entries_concurrently()
+    # items: Reports as (method, keyword arguments), futures of the subtrees handed over to other workers,
+    #        and the unexpected error that interrupted the worker, if any, in order
+    __slots__ = ("items",)
+
+    def __init__(self) -> None:
+        self.items: List[object] = []
+
+    def report_entry(self, **kwargs) -> None:
+        self.items.append(("report_entry", kwargs))
+
+    def report_permission_error(self, **kwargs) -> None:
+        self.items.append(("report_permission_error", kwargs))
+
+    def report_ignored_children(self, **kwargs) -> None:
+        self.items.append(("report_ignored_children", kwargs))
+
+
+def _make_paths(*, path_type: str, path: str, reporter: Reporter, src: str = "", link: str = "auto",
+                src_cache: Optional[SrcCache] = None, dir_fd: Optional[int] = None, keep_open: bool = False,
+                relink: bool = False) -> int:
+    # When dir_fd is given, the entry is created relative to it (using the basename of path)
+    # Otherwise, path is an absolute path and missing parent directories are created as well
+    # relink: Whether a previous run found the file present with another link mode (incremental mode)
+    # Output: For directories, the fd of the directory if keep_open is True, otherwise -1
+    #         For files, 0 if a file is present at the path afterwards (created or already existing),
+    #         1 if the file is still present with another link mode (relink), otherwise -1
     if path_type == "file":
-        if os.path.exists(path):
-            # Path already exists. Skip
-            if os.path.isdir(path):
-                remarks = [
-                        "A directory already exists at that path",
-                        "Make sure that no <file> and <dir> under the same parent has the same 'name'"
-                ]
-            else:
-                remarks = [
-                        "A file already exists at that path",
-                        "Make sure that the <file> tag isn't specified more than once in the same parent"
-                ]
-            _report_path_creation_status(path_type=path_type, path=path, skipping=True, remarks=remarks)
-        else:
-            if src: # Source file provided
-                # Copy the source file to the new location
-                shutil.copy(src=src, dst=path)
+        try:
+            status, method, copied = creation.make_file(os.path.basename(path), dir_fd=dir_fd, src=src, link=link, src_cache=src_cache)
+        except LinkNotSupported as e:
+            remarks = [
+                    "Unable to materialize the file with link=\"{}\"".format(e.mode),
+                    e.reason
+            ]
+            reporter.report_entry(path_type=path_type, path=path, created=False, remarks=remarks, src=src)
+            return -1
+        if status == creation.CREATED:
+            if src:
+                remarks = [_describe_src_materialization(src=src, method=method, copied=copied)]
+                reporter.report_entry(path_type=path_type, path=path, created=True, remarks=remarks, src=src, method=method, bytes=copied)
             else:
-                # Create an empty file
-                open(path, "w").close()
-            _report_path_creation_status(path_type=path_type, path=path)
-    if path_type == "directory":
-        if os.path.exists(path):
-            if os.path.isdir(path):
-                # A directory already exists at that path.
-                # Skip
-                _report_path_creation_status(path_type=path_type, path=path, skipping=True)
-
-            if os.path.isfile(path):
-                # A file already exists at that path. 
-                # Skip.
-                # Signal the caller to ignore all the <dir> element's children
-                raise DirPathBelongsToExistingFile()
-        else:
-            # Path doesn't exist yet. Safe to create dir
-            dirs_to_be_created = _list_dirs_that_makedirs_will_create(path)
-            os.makedirs(path)
-            # Report successful creation
-            for dir in dirs_to_be_created:
-                _report_path_creation_status(path_type=path_type, path=dir)
-
-
-def _list_dirs_that_makedirs_will_create(path) -> List[str]:
-    # Input : An absolute path that points to a directory to be created
-    # Output: A list of all directories (including intermediate dirs) that will be created by os.makedirs()
-    result: List[str] = []
-    while path:
-        if os.path.exists(path):
-            # Reached a parent directory that already exists
-            path = ""  # Terminate the loop
-        else:
-            result.append(path)
-            path = os.path.dirname(path)
-    result.reverse() # Make sure that the higher level directories are listed first
-    return result
-
+                reporter.report_entry(path_type=path_type, path=path, created=True)
+            return 0
+        # Path already exists. Skip
+        if status == creation.IS_A_DIRECTORY:
+            _report_file_clash(path=path, is_dir=True, reporter=reporter)
+            return -1
+        if relink:
+            remarks = [
+                    "The file was materialized with another link mode by a previous run",
+                    "Remove it to materialize it with link=\"{}\"".format(link)
+            ]
+            reporter.report_entry(path_type=path_type, path=path, created=False, remarks=remarks)
+            return 1
+        _report_file_clash(path=path, is_dir=False, reporter=reporter)
+        return 0
+
+    # path_type == "directory"
+    # If a file already exists at that path, DirPathBelongsToExistingFile is raised
+    # to signal the caller to ignore all the <dir> element's children
+    if dir_fd is None:
+        created_dirs = creation.make_directories(path)
+        fd = creation.open_directory(path) if keep_open else -1
+    else:
+        created, fd = creation.make_directory(os.path.basename(path), dir_fd=dir_fd, keep_open=keep_open)
+        created_dirs = [path] if created else []
 
-def _report_path_creation_status(*, path_type: str, path: str, skipping: bool = False, remarks: List[str] = []) -> None:
-    successful_creation_msg_format = "✔ Created  {entry_type:<10}: \"{path}\""
-    skipping_creation_msg_format   = "✘ Skipping {entry_type:<10}: \"{path}\""
-    remark_format                  = "  {branch} {remark}"
-    if not skipping:
-        msg = successful_creation_msg_format.format(entry_type=path_type, path=path)
+    if created_dirs:
+        # Report successful creation
+        for dir in created_dirs:
+            reporter.report_entry(path_type=path_type, path=dir, created=True)
+    else:
+        # A directory already exists at that path.
+        # Skip
+        reporter.report_entry(path_type=path_type, path=path, created=False)
+    return fd
+
+
+def _open_present_directory(*, path: str, reporter: Reporter, dir_fd: Optional[int] = None) -> int:
+    # Opens a directory that is recorded as present in the manifest of the target (incremental mode)
+    # Unlike _make_paths(), the directory is only reported if it turns out to be missing and is created
+    # Output: The fd of the directory
+    if dir_fd is None:
+        created_dirs = creation.make_directories(path)
+        fd = creation.open_directory(path)
+    else:
+        created, fd = creation.make_directory(os.path.basename(path), dir_fd=dir_fd, keep_open=True)
+        created_dirs = [path] if created else []
+    for dir in created_dirs:
+        reporter.report_entry(path_type="directory", path=dir, created=True)
+    return fd
+
+
+# Entries that are skipped, or whose children are ignored, are reported the same way whether the skeleton
+# is created on disk, previewed (--dry-run), or written into an archive (--archive)
+
+def _report_target_clash(*, target_dir: str, reporter: Reporter, reason: str = "The path belongs to an existing file") -> None:
+    remarks = [
+            "Unable to create the target directory",
+            reason
+    ]
+    reporter.report_entry(path_type="directory", path=target_dir, created=False, remarks=remarks)
+
+
+def _report_dir_clash(*, path: str, reporter: Reporter) -> None:
+    # A file already exists where the directory would be; its subtree is skipped along with it
+    remarks = [
+            "A file already exists at {}".format(path),
+            "Make sure that no <file> and <dir> under the same parent has the same 'name'"
+    ]
+    reporter.report_entry(path_type="directory", path=path, created=False, remarks=remarks)
+
+
+def _report_file_clash(*, path: str, is_dir: bool, reporter: Reporter) -> None:
+    # is_dir: Whether the entry that already exists where the file would be is a directory
+    if is_dir:
+        remarks = [
+                "A directory already exists at that path",
+                "Make sure that no <file> and <dir> under the same parent has the same 'name'"
+        ]
     else:
-        msg = skipping_creation_msg_format.format(entry_type=path_type, path=path)
-    print(msg)
-    if remarks:
-        normal_branch         = "┣━"
-        last_branch           = "┗━"
-        remarks_to_be_printed = []
-        for num, remark in enumerate(remarks):
-            branch = last_branch if (num == (len(remarks) - 1)) else normal_branch
-            remarks_to_be_printed.append(remark_format.format(branch=branch, remark=remark))
-        print("\n".join(remarks_to_be_printed))
-
-
-def _report_permission_error(*, path_type: str, path: str) -> None:
-    msg = "✘ Skipping {entry_type:<10}: \"{path}\"".format(entry_type=path_type, path=path)
-    branch = "┗━"
-    text = "Do not have permission to create {entry_type}".format(entry_type=path_type)
-    remark = "  {branch} {text}".format(branch=branch, text=text)
-    print(msg + "\n" + remark)
-
-
-def _report_ignoring_children_of_file_tag(*, file_elem: Element): 
-    msg = "❗Ignoring the child elements of <file name=\"{}\">".format(file_elem.get("name"))
-    print(msg)
+        remarks = [
+                "A file already exists at that path",
+                "Make sure that the <file> tag isn't specified more than once in the same parent"
+        ]
+    reporter.report_entry(path_type="file", path=path, created=False, remarks=remarks)
+
+
+def _report_ignored_children(*, plan: Plan, index: int, name: str, path: str, reporter: Reporter) -> None:
+    # Print warning if <file> has children
+    if plan.flags[index] & IGNORES_CHILDREN:
+        reporter.report_ignored_children(name=name, path=path)
+
+
+def _report_ignored_includes(*, plan: Plan, path: str, reporter: Reporter) -> None:
+    # Print warning if <include> has children
+    for template in plan.ignored_includes:
+        reporter.report_ignored_children(tag="include", name=template, path=path)
+
+
+def _describe_src_materialization(*, src: str, method: str, copied: int) -> str:
+    if method in (copying.HARDLINK, copying.SYMLINK):
+        return "Created as a {} to \"{}\"".format(method, src)
+    return "Copied {} byte{} from \"{}\" ({})".format(copied, "" if copied == 1 else "s", src, method)
+
@@ -0,0 +1,198 @@
+# Creation plans: the compiled form of a validated template
+#
+# A plan is a flat, pre-ordered list of operations. Every operation has a kind, the
+# basename of the entry, and (for copies) a resolved src path. Directory operations also
+# record where their subtree ends in the list: the operations in between are the contents
+# of the directory, and the whole subtree can be skipped in one step when the directory
+# can't be created. Only basenames are stored, so the size of a plan doesn't depend on
+# how deeply the template is nested.
+# Plans are computed once per template and then replayed for every target directory.
+# The stat results of the src files are attached to the plan whenever they are known (i.e. when
+# the plan was just compiled or loaded from the cache), so that the files aren't stat()ed again
+# while generating. They aren't part of the serialized plan.
+# Elements with a 'repeat' attribute are compiled once, along with their range of values; their
+# copies are only produced, one at a time, by entries() while generating. Positions (e.g. in
+# the masks of the manifests) always refer to the expanded sequence of entries, in the order
+# in which entries() produces them.
+# <include> elements are resolved at compile time: the plan of the included template is spliced in
+# (see splice()), and its template file is recorded so that the plan is recompiled when it changes.
+# <include> elements have no operation of their own: the ones that had child elements are recorded
+# separately, and reported whenever the plan is applied to a target.
+
+from __future__ import annotations
+
+import os
+
+from array import array
+from itertools import islice
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Iterator, List, Optional, Tuple
+
+# Operation kinds
+MKDIR = 0
+TOUCH = 1
+COPY  = 2
+
+# Operation flags
+IGNORES_CHILDREN = 1  # <file> element that had child elements in the template
+
+
+class Plan:
+    __slots__ = ("kinds", "flags", "ends", "names", "srcs", "links", "repeats", "includes", "ignored_includes", "src_stats", "name", "__sizes")
+
+    def __init__(self) -> None:
+        self.kinds    = array("B")    # One of MKDIR, TOUCH, COPY
+        self.flags    = array("B")    # Bitwise OR of the operation flags
+        self.ends     = array("I")    # Index right after the end of the subtree (MKDIR only)
+        self.names: List[str] = []    # Basenames of the entries (format strings for repeated entries)
+        self.srcs: Dict[int, str] = {}  # Index -> resolved src path (COPY only)
+        self.links: Dict[int, str] = {} # Index -> link mode given in the template (COPY only)
+        self.repeats: Dict[int, Tuple[int, int]] = {}  # Index -> (first, last) value of {i} (repeated entries only)
+        self.includes: List[str] = []   # Template files included (directly or not), in the order in which they were first included
+        self.ignored_includes: List[str] = []  # Templates named by <include> elements that had child elements
+        self.src_stats: Dict[str, os.stat_result] = {}  # Resolved src path -> stat result
+        self.name = ""                  # Name of the template the plan was compiled from
+        self.__sizes: Optional[List[int]] = None  # See __subtree_sizes()
+
+    def __len__(self) -> int:
+        # Number of entries created by the plan, once repeated entries are expanded
+        if not self.repeats:
+            return len(self.kinds)
+        return sum(self.copies())
+
+    def add(self, *, kind: int, name: str, src: str = "", link: str = "", flags: int = 0,
+            repeat: Optional[Tuple[int, int]] = None) -> int:
+        index = len(self.kinds)
+        self.__sizes = None
+        self.kinds.append(kind)
+        self.flags.append(flags)
+        self.ends.append(index + 1)
+        self.names.append(name)
+        if src:
+            self.srcs[index] = src
+        if link:
+            self.links[index] = link
+        if repeat is not None:
+            self.repeats[index] = repeat
+        return index
+
+    def splice(self, fragment: "Plan", *, template_file: str) -> None:
+        # Appends the operations of the plan of an included template
+        offset = len(self.kinds)
+        self.__sizes = None
+        self.kinds.extend(fragment.kinds)
+        self.flags.extend(fragment.flags)
+        self.ends.extend(end + offset for end in fragment.ends)
+        self.names.extend(fragment.names)
+        self.srcs.update((index + offset, src) for index, src in fragment.srcs.items())
+        self.links.update((index + offset, link) for index, link in fragment.links.items())
+        self.repeats.update((index + offset, repeat) for index, repeat in fragment.repeats.items())
+        for included_file in [template_file] + fragment.includes:
+            if included_file not in self.includes:
+                self.includes.append(included_file)
+        self.ignored_includes.extend(fragment.ignored_includes)
+        self.src_stats.update(fragment.src_stats)
+
+    def src_paths(self) -> List[str]:
+        return list(self.srcs.values())
+
+    def dependency_paths(self) -> List[str]:
+        # Output: The files that the plan was compiled from, besides its own template: src files and included templates
+        return self.src_paths() + self.includes
+
+    def entries(self, *, within: Optional[Tuple[int, int]] = None) -> Iterator[Tuple[int, int, str]]:
+        # Expands the plan lazily
+        # within: (index, position) of a directory entry; only the entries of its subtree are produced
+        # Output: (index of the operation, position right after the end of the subtree, basename) for every entry
+        kinds, ends, names, repeats = self.kinds, self.ends, self.names, self.repeats
+        if within is None:
+            first, stop, position = 0, len(kinds), 0
+        else:
+            first, stop, position = within[0] + 1, ends[within[0]], within[1] + 1
+        if not repeats:
+            # Positions are the indexes of the operations
+            if within is None:
+                yield from zip(range(len(kinds)), ends, names)
+            else:
+                yield from zip(range(first, stop), islice(ends, first, stop), islice(names, first, stop))
+            return
+
+        sizes = self.__subtree_sizes()
+        # Sibling operations being expanded: [index of the current operation, end of the siblings,
+        # remaining values of the current operation if it's repeated]
+        frames = [[first, stop, None]]
+        while frames:
+            frame = frames[-1]
+            index = frame[0]
+            if index >= frame[1]:
+                frames.pop()
+                continue
+            repeat = repeats.get(index)
+            if repeat is None:
+                name = names[index]
+                frame[0] = ends[index]
+            else:
+                if frame[2] is None:
+                    frame[2] = iter(range(repeat[0], repeat[1] + 1))
+                value = next(frame[2], None)
+                if value is None:
+                    frame[0], frame[2] = ends[index], None
+                    continue
+                name = names[index].format(i=value)
+            yield index, position + sizes[index], name
+            position += 1
+            if ends[index] > index + 1:
+                frames.append([index + 1, ends[index], None])
+
+    def copies(self) -> List[int]:
+        # Output: The number of entries created by every operation, once repeated entries are expanded
+        repeats, ends = self.repeats, self.ends
+        copies: List[int] = []
+        parents = [(len(self.kinds), 1)]  # (index right after the end of the subtree, copies)
+        for index in range(len(self.kinds)):
+            while index >= parents[-1][0]:
+                parents.pop()
+            repeat = repeats.get(index)
+            count = parents[-1][1] * (1 if repeat is None else repeat[1] - repeat[0] + 1)
+            copies.append(count)
+            if ends[index] > index + 1:
+                parents.append((ends[index], count))
+        return copies
+
+    def __subtree_sizes(self) -> List[int]:
+        # Output: The number of entries in a single copy of the subtree of every operation (including itself)
+        # Computed once, as entries() may be called for many subtrees
+        if self.__sizes is not None:
+            return self.__sizes
+        repeats, ends = self.repeats, self.ends
+        sizes = [1] * len(self.kinds)
+        for index in reversed(range(len(self.kinds))):
+            child = index + 1
+            while child < ends[index]:
+                repeat = repeats.get(child)
+                sizes[index] += sizes[child] * (1 if repeat is None else repeat[1] - repeat[0] + 1)
+                child = ends[child]
+        self.__sizes = sizes
+        return sizes
+
+    def to_record(self) -> tuple:
+        # Converts the plan into plain builtins that can be serialized with marshal
+        return (self.kinds.tobytes(), self.flags.tobytes(), self.ends.tobytes(), tuple(self.names), self.srcs, self.links,
+                self.repeats, tuple(self.includes), tuple(self.ignored_includes))
+
+    @classmethod
+    def from_record(cls, record: tuple) -> "Plan":
+        kinds, flags, ends, names, srcs, links, repeats, includes, ignored_includes = record
+        plan = cls()
+        plan.kinds.frombytes(kinds)
+        plan.flags.frombytes(flags)
+        plan.ends.frombytes(ends)
+        plan.names = list(names)
+        plan.srcs = dict(srcs)
+        plan.links = dict(links)
+        plan.repeats = dict(repeats)
+        plan.includes = list(includes)
+        plan.ignored_includes = list(ignored_includes)
+        return plan
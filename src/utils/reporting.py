@@ -0,0 +1,244 @@
+# Reporting of the entries created (or skipped) while generating skeletons
+#
+# Reporters collect the output in memory and write it to the output stream in large
+# chunks. Every target gets its own child reporter (see for_target()) so that targets
+# can be generated concurrently while their reports still come out grouped and in order.
+#
+# Output formats:
+#   pretty - (default) one human-readable line per entry, plus remarks
+#   jsonl  - one JSON record per entry, for machine consumption
+# In quiet mode, entries are only counted and the summary counts are written at the end.
+# In dry-run mode (--dry-run), entries are reported as what would be created or skipped.
+
+from __future__ import annotations
+
+import sys
+
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional, TextIO
+    from .stats import RunStats
+
+OUTPUT_FORMATS = ("pretty", "jsonl")
+FLUSH_THRESHOLD = 64 * 1024  # Number of characters buffered before writing to the stream
+
+
+class Reporter:
+    def __init__(self, *, stream: Optional[TextIO] = None, quiet: bool = False, dry_run: bool = False,
+                 stats: Optional[RunStats] = None) -> None:
+        self.stream  = stream  # None for child reporters, whose output is merged into their parent
+        self.quiet   = quiet
+        self.dry_run = dry_run
+        self.stats   = stats   # If given, writing the output is timed (--stats)
+        self.counts: Dict[str, int] = {}  # "<status> <path_type>" -> number of entries
+        self.bytes_copied = 0             # Total size of the src files materialized
+        self.__chunks: List[str] = []
+        self.__buffered = 0
+
+    def for_target(self) -> "Reporter":
+        # A child reporter that buffers the output of one target until it is merged
+        return type(self)(quiet=self.quiet, dry_run=self.dry_run)
+
+    def merge(self, child: "Reporter") -> None:
+        for key, count in child.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.bytes_copied += child.bytes_copied
+        for chunk in child.__chunks:
+            self._write(chunk)
+
+    def report_entry(self, *, path_type: str, path: str, created: bool, remarks: List[str] = [], **details) -> None:
+        # details: Extra machine-readable information (e.g. the src of a file)
+        key = "{} {}".format("created" if created else "skipped", path_type)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if "bytes" in details:
+            self.bytes_copied += details["bytes"]
+
+    def report_permission_error(self, *, path_type: str, path: str) -> None:
+        key = "skipped {}".format(path_type)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def report_ignored_children(self, *, name: str, path: str, tag: str = "file") -> None:
+        # tag: "file", or "include" (name is then the included template, and path the target)
+        pass
+
+    def report_message(self, text: str) -> None:
+        pass
+
+    def report_stats(self, stats: dict) -> None:
+        # stats: See stats.RunStats.to_dict(); reported even in quiet mode
+        pass
+
+    def report_job(self, *, line: int, template: str, targets: List[str], counts: Dict[str, int], error: str = "") -> None:
+        # Outcome of a job of a batch (--batch); reported even in quiet mode
+        # line: Line of the job in the batch file
+        # counts: The counts of the job's own reporter
+        # error: Empty if the job succeeded
+        pass
+
+    def finish(self) -> None:
+        # Writes the summary (in quiet mode) and flushes everything
+        self.flush()
+
+    def flush(self) -> None:
+        if self.stream is not None and self.__chunks:
+            if self.stats is None:
+                self.__write_chunks()
+            else:
+                with self.stats.phase("write output"):
+                    self.__write_chunks()
+
+    def __write_chunks(self) -> None:
+        self.stream.write("".join(self.__chunks))
+        self.stream.flush()
+        self.__chunks = []
+        self.__buffered = 0
+
+    def _write(self, text: str) -> None:
+        self.__chunks.append(text)
+        self.__buffered += len(text)
+        if self.__buffered >= FLUSH_THRESHOLD:
+            self.flush()
+
+    def _summary(self, counts: Optional[Dict[str, int]] = None) -> str:
+        counts = self.counts if counts is None else counts
+        parts = []
+        labels = ("Would create", "Would skip") if self.dry_run else ("Created", "Skipped")
+        for status, label in zip(("created", "skipped"), labels):
+            status_counts = []
+            for path_type, plural in (("directory", "directories"), ("file", "files")):
+                count = counts.get("{} {}".format(status, path_type), 0)
+                status_counts.append("{} {}".format(count, path_type if count == 1 else plural))
+            parts.append("{} {}".format(label, ", ".join(status_counts)))
+        return "; ".join(parts)
+
+
+class PrettyReporter(Reporter):
+    def report_entry(self, *, path_type: str, path: str, created: bool, remarks: List[str] = [], **details) -> None:
+        super().report_entry(path_type=path_type, path=path, created=created, remarks=remarks, **details)
+        if self.quiet: return
+        if created:
+            self._write(self.__creation_msg_format().format(entry_type=path_type, path=path))
+        else:
+            self._write(self.__skipping_msg_format().format(entry_type=path_type, path=path))
+        if remarks:
+            self._write(_format_remarks(remarks))
+
+    def report_permission_error(self, *, path_type: str, path: str) -> None:
+        super().report_permission_error(path_type=path_type, path=path)
+        if self.quiet: return
+        msg = self.__skipping_msg_format().format(entry_type=path_type, path=path)
+        text = "Do not have permission to create {entry_type}".format(entry_type=path_type)
+        self._write(msg + _format_remarks([text]))
+
+    def __creation_msg_format(self) -> str:
+        return "✔ Would create {entry_type:<10}: \"{path}\"\n" if self.dry_run else "✔ Created  {entry_type:<10}: \"{path}\"\n"
+
+    def __skipping_msg_format(self) -> str:
+        return "✘ Would skip   {entry_type:<10}: \"{path}\"\n" if self.dry_run else "✘ Skipping {entry_type:<10}: \"{path}\"\n"
+
+    def report_ignored_children(self, *, name: str, path: str, tag: str = "file") -> None:
+        if self.quiet: return
+        attribute = "template" if tag == "include" else "name"
+        self._write("❗Ignoring the child elements of <{} {}=\"{}\">\n".format(tag, attribute, name))
+
+    def report_message(self, text: str) -> None:
+        if self.quiet: return
+        self._write(text + "\n")
+
+    def report_stats(self, stats: dict) -> None:
+        from .stats import format_stats
+        self._write(format_stats(stats) + "\n")
+
+    def report_job(self, *, line: int, template: str, targets: List[str], counts: Dict[str, int], error: str = "") -> None:
+        job = "Line {}: {}{}".format(line, template, "".join(" \"{}\"".format(target) for target in targets))
+        if error:
+            self._write("✘ {} failed\n".format(job) + _format_remarks([line for line in error.splitlines() if line.strip()]))
+        else:
+            self._write("✔ {}\n".format(job) + _format_remarks([self._summary(counts)]))
+
+    def finish(self) -> None:
+        if self.quiet:
+            self._write(self._summary() + "\n")
+        if self.dry_run:
+            self._write("Dry run: nothing was changed\n")
+        super().finish()
+
+
+class JsonLinesReporter(Reporter):
+    def __init__(self, *, stream: Optional[TextIO] = None, quiet: bool = False, dry_run: bool = False,
+                 stats: Optional[RunStats] = None) -> None:
+        super().__init__(stream=stream, quiet=quiet, dry_run=dry_run, stats=stats)
+        import json
+        self.__dumps = json.dumps
+
+    def report_entry(self, *, path_type: str, path: str, created: bool, remarks: List[str] = [], **details) -> None:
+        super().report_entry(path_type=path_type, path=path, created=created, remarks=remarks, **details)
+        if self.quiet: return
+        record = {"event": "entry", "type": path_type, "path": path, "status": "created" if created else "skipped"}
+        record.update(details)
+        if self.dry_run:
+            record["dry_run"] = True
+        if remarks:
+            record["remarks"] = remarks
+        self._write_record(record)
+
+    def report_permission_error(self, *, path_type: str, path: str) -> None:
+        super().report_permission_error(path_type=path_type, path=path)
+        if self.quiet: return
+        record = {"event": "entry", "type": path_type, "path": path, "status": "skipped", "reason": "permission"}
+        if self.dry_run:
+            record["dry_run"] = True
+        self._write_record(record)
+
+    def report_ignored_children(self, *, name: str, path: str, tag: str = "file") -> None:
+        if self.quiet: return
+        record = {"event": "ignored-children", "path": path}
+        if tag != "file":
+            record.update(tag=tag, template=name)
+        self._write_record(record)
+
+    def report_message(self, text: str) -> None:
+        if self.quiet: return
+        self._write_record({"event": "message", "text": text})
+
+    def report_stats(self, stats: dict) -> None:
+        record = {"event": "stats"}
+        record.update(stats)
+        self._write_record(record)
+
+    def report_job(self, *, line: int, template: str, targets: List[str], counts: Dict[str, int], error: str = "") -> None:
+        record = {"event": "job", "line": line, "template": template, "targets": targets,
+                  "status": "failed" if error else "done", "counts": counts}
+        if error:
+            record["error"] = error
+        self._write_record(record)
+
+    def finish(self) -> None:
+        record = {"event": "summary", "counts": self.counts}
+        if self.dry_run:
+            record["dry_run"] = True
+        self._write_record(record)
+        super().finish()
+
+    def _write_record(self, record: dict) -> None:
+        self._write(self.__dumps(record, ensure_ascii=False) + "\n")
+
+
+def make_reporter(*, output_format: str = "pretty", quiet: bool = False, dry_run: bool = False, stream: Optional[TextIO] = None,
+                  stats: Optional[RunStats] = None) -> Reporter:
+    stream = sys.stdout if stream is None else stream
+    if output_format == "jsonl":
+        return JsonLinesReporter(stream=stream, quiet=quiet, dry_run=dry_run, stats=stats)
+    return PrettyReporter(stream=stream, quiet=quiet, dry_run=dry_run, stats=stats)
+
+
+def _format_remarks(remarks: List[str]) -> str:
+    remark_format = "  {branch} {remark}\n"
+    normal_branch = "┣━"
+    last_branch   = "┗━"
+    remarks_to_be_printed = []
+    for num, remark in enumerate(remarks):
+        branch = last_branch if (num == (len(remarks) - 1)) else normal_branch
+        remarks_to_be_printed.append(remark_format.format(branch=branch, remark=remark))
+    return "".join(remarks_to_be_printed)
@@ -0,0 +1,87 @@
+# In-memory cache of the contents of src files
+#
+# When the same src file is used by many <file> elements, or the same template is applied
+# to many targets, the file is read once and every copy is written from memory.
+# Entries are keyed by the resolved src path and validated against the inode and mtime
+# of the file on every lookup. Small files are held as bytes; larger files are mmapped.
+# Stat results that are already known when the cache is created (see Plan.src_stats) are used
+# instead of stat()ing the files again, so they are treated as a snapshot for the whole run.
+# The total size of the cached contents never exceeds the budget: the least recently used
+# entries are evicted first, and files larger than the budget are never cached.
+
+from __future__ import annotations
+
+import os, mmap, threading
+
+from collections import OrderedDict
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Optional, Union
+
+DEFAULT_BUDGET = 64 * 1024 * 1024
+MMAP_THRESHOLD = 1024 * 1024
+
+
+class SrcBlob:
+    __slots__ = ("ino", "mtime_ns", "mode", "data")
+
+    def __init__(self, *, ino: int, mtime_ns: int, mode: int, data: Union[bytes, mmap.mmap]) -> None:
+        self.ino      = ino
+        self.mtime_ns = mtime_ns
+        self.mode     = mode
+        self.data     = data
+
+
+class SrcCache:
+    def __init__(self, *, budget: int = DEFAULT_BUDGET, known_stats: Optional[Dict[str, os.stat_result]] = None) -> None:
+        self.budget    = budget
+        self.used      = 0
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        self.__blobs: "OrderedDict[str, SrcBlob]" = OrderedDict()
+        self.__lock = threading.Lock()  # Targets may be generated concurrently
+        self.__known_stats = known_stats if known_stats is not None else {}
+
+    def lookup(self, src: str) -> Optional[SrcBlob]:
+        # Output: The up-to-date contents of src, or None if src can't be cached
+        st = self.__known_stats.get(src)
+        if st is None:
+            st = os.stat(src)
+        with self.__lock:
+            blob = self.__blobs.get(src)
+            if (blob is not None) and (blob.ino == st.st_ino) and (blob.mtime_ns == st.st_mtime_ns):
+                self.__blobs.move_to_end(src)
+                self.hits += 1
+                return blob
+            self.misses += 1
+            if blob is not None:
+                # Stale entry
+                self.__discard(src)
+        if st.st_size > self.budget:
+            return None
+
+        blob = SrcBlob(ino=st.st_ino, mtime_ns=st.st_mtime_ns, mode=st.st_mode, data=_read(src, st.st_size))
+        with self.__lock:
+            if src in self.__blobs:
+                # Loaded concurrently by another thread
+                self.__discard(src)
+            while self.used + len(blob.data) > self.budget:
+                self.__discard(next(iter(self.__blobs)))
+                self.evictions += 1
+            self.__blobs[src] = blob
+            self.used += len(blob.data)
+        return blob
+
+    def __discard(self, src: str) -> None:
+        # mmaps aren't closed explicitly; a copy may still be writing from them
+        blob = self.__blobs.pop(src)
+        self.used -= len(blob.data)
+
+
+def _read(path: str, size: int) -> Union[bytes, mmap.mmap]:
+    with open(path, "rb") as f:
+        if size >= MMAP_THRESHOLD:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return f.read()
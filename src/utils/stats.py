@@ -0,0 +1,119 @@
+# Run statistics (--stats)
+#
+# A RunStats object accumulates the wall time of every phase of a run, the number of bytes
+# copied, the hits, misses and evictions of the src cache, and the slowest individual entries. With --stats, it is handed explicitly to the
+# functions of each phase (parse_template(), generate_skeleton(), ...), which time their work
+# with it. Runs without --stats don't import this module and don't time anything.
+# Phases are nested: the time of a sub-phase is also part of the time of its parent phase.
+
+from __future__ import annotations
+
+import contextlib, heapq, threading, time
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Callable, Dict, Iterator, List, Tuple
+    from .reporting import Reporter
+    from .srccache import SrcCache
+
+SLOWEST_ENTRIES = 10
+
+# (phase, parent phase or "")
+PHASES = (
+    ("parse_template",        ""),
+    ("load cached template",  "parse_template"),
+    ("validate",              "parse_template"),
+    ("generate_skeleton",     ""),
+    ("create entries",        "generate_skeleton"),
+    ("write output",          ""),
+)
+
+
+class RunStats:
+    def __init__(self) -> None:
+        self.phase_seconds: Dict[str, float] = {}
+        self.src_cache_counts: Dict[str, int] = {}  # "hits", "misses", "evictions", summed over every src cache of the run
+        # Min-heap of the slowest entries: (seconds, path_type, path)
+        self.slowest: List[Tuple[float, str, str]] = []
+        self.__lock = threading.Lock()  # Entries may be created by several threads (--jobs)
+
+    def add_phase_time(self, phase: str, seconds: float) -> None:
+        with self.__lock:
+            self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + seconds
+
+    def add_src_cache_counts(self, src_cache: SrcCache) -> None:
+        for counter in ("hits", "misses", "evictions"):
+            self.src_cache_counts[counter] = self.src_cache_counts.get(counter, 0) + getattr(src_cache, counter)
+
+    @contextlib.contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        # Adds the run time of the block to the phase
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_time(phase, time.perf_counter() - start)
+
+    def timed(self, phase: str, function: Callable) -> Callable:
+        # Output: A wrapper of function that adds its run time to the phase
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add_phase_time(phase, time.perf_counter() - start)
+        return timed_function
+
+    def timed_entry(self, function: Callable) -> Callable:
+        # Like timed(), for functions that create a single entry (with path_type and path keyword arguments)
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record_entry(time.perf_counter() - start, kwargs["path_type"], kwargs["path"])
+        return timed_function
+
+    def record_entry(self, seconds: float, path_type: str, path: str) -> None:
+        with self.__lock:
+            self.phase_seconds["create entries"] = self.phase_seconds.get("create entries", 0.0) + seconds
+            if len(self.slowest) < SLOWEST_ENTRIES:
+                heapq.heappush(self.slowest, (seconds, path_type, path))
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, path_type, path))
+
+    def to_dict(self, reporter: Reporter) -> Dict:
+        # Output: The statistics as plain builtins, ready to be reported
+        return {
+            "phases_ms": {phase: round(self.phase_seconds[phase] * 1000, 3) for phase, _ in PHASES if phase in self.phase_seconds},
+            "counts": dict(reporter.counts),
+            "bytes_copied": reporter.bytes_copied,
+            "src_cache": dict(self.src_cache_counts),
+            "slowest": [{"type": path_type, "path": path, "ms": round(seconds * 1000, 3)}
+                        for seconds, path_type, path in sorted(self.slowest, reverse=True)],
+        }
+
+
+def format_stats(stats: Dict) -> str:
+    # Human-readable form of RunStats.to_dict()
+    lines = ["Statistics:", "  Wall time per phase:"]
+    depth = {phase: (1 if parent else 0) for phase, parent in PHASES}
+    for phase, ms in stats["phases_ms"].items():
+        label = "  " * depth.get(phase, 0) + phase
+        lines.append("    {:<28} {:>10.1f} ms".format(label, ms))
+    counts = stats["counts"]
+    for status in ("created", "skipped"):
+        dirs, files = counts.get(status + " directory", 0), counts.get(status + " file", 0)
+        lines.append("  {:<30} {} director{}, {} file{}".format(status.capitalize() + ":", dirs, "y" if dirs == 1 else "ies",
+                                                               files, "" if files == 1 else "s"))
+    lines.append("  {:<30} {}".format("Bytes copied:", stats["bytes_copied"]))
+    if stats["src_cache"]:
+        hits, misses, evictions = (stats["src_cache"][counter] for counter in ("hits", "misses", "evictions"))
+        lines.append("  {:<30} {} hit{}, {} miss{}, {} eviction{}".format("Source cache:", hits, "" if hits == 1 else "s",
+                                                                         misses, "" if misses == 1 else "es",
+                                                                         evictions, "" if evictions == 1 else "s"))
+    if stats["slowest"]:
+        lines.append("  Slowest entries:")
+        for entry in stats["slowest"]:
+            lines.append("    {:>8.2f} ms  {:<10} \"{}\"".format(entry["ms"], entry["type"], entry["path"]))
+    return "\n".join(lines)
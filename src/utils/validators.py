@@ -1,12 +1,93 @@
 # This module contains specific handlers to validate the values of attributes
+#
+# Every handler receives the element and the ValidationContext of the template being validated.
+# Checks that involve the filesystem are deferred until the whole template has been read, so
+# that they are done once per distinct path rather than once per element.
 
-import os
+import os, re, stat, string
 from .error_handling import *
+from .copying import LINK_MODES
 from lxml.etree import _Element as Element
-from typing import Callable, Dict
+from concurrent.futures import ThreadPoolExecutor
+from .plan import Plan
+from typing import Callable, Dict, List, Optional, Tuple
 
+# Number of threads used to stat absolute src paths (which may be on slow mounts)
+MAX_STAT_THREADS = 16
 
-def _check_name_attribute(elem: Element) -> None:
+# Format specifications allowed for {i} in the name of a repeated element: an optional
+# zero-padded width and the 'd' presentation type, e.g. {i}, {i:4}, {i:04d}
+REPEAT_FORMAT_SPEC = re.compile(r"0?([0-9]*)d?")
+
+# Longest basename (in bytes) that common filesystems accept; also bounds the width of {i}
+NAME_MAX = 255
+
+
+class ValidationContext:
+    # State shared by the handlers while a template is validated
+    # including: The template files whose compilation led to this one (outermost first), to detect include cycles
+    # load_fragment: Returns the plan of an included template file; raises InvalidTemplateFile if it's invalid
+    def __init__(self, *, issues: IssueCollector, template_file: str = "", including: Tuple[str, ...] = (),
+                 load_fragment: Optional[Callable[[str, Tuple[str, ...]], Plan]] = None) -> None:
+        self.issues = issues
+        self.template_file = template_file
+        self.including = including
+        self.load_fragment = load_fragment
+        # Included template file -> its plan, for the <include> elements that are valid
+        self.fragments: Dict[str, Plan] = {}
+        # Resolved src path -> (first <file> element referring to it, source lines of all of them)
+        # Issues are only created by check_src_paths(), for the paths that turn out to be invalid
+        self.src_paths: Dict[str, Tuple[Element, Dict[int, None]]] = {}
+
+
+def check_src_paths(context: ValidationContext) -> Dict[str, os.stat_result]:
+    # Checks every distinct src path referenced by the template
+    # Output: The stat results of the valid src paths
+    paths = list(context.src_paths)
+    # Relative src paths usually name files directly inside FILE_SRC_DIRECTORY, which is local
+    filesrc_paths = [p for p in paths if os.path.dirname(p) == FILE_SRC_DIRECTORY]
+    other_paths   = [p for p in paths if os.path.dirname(p) != FILE_SRC_DIRECTORY]
+
+    stats: Dict[str, Optional[os.stat_result]] = {p: _stat_or_none(p) for p in filesrc_paths}
+    if len(other_paths) > 1:
+        with ThreadPoolExecutor(max_workers=min(len(other_paths), MAX_STAT_THREADS)) as pool:
+            stats.update(zip(other_paths, pool.map(_stat_or_none, other_paths)))
+    else:
+        stats.update((p, _stat_or_none(p)) for p in other_paths)
+
+    valid_stats = {}
+    for src_path in paths:
+        st = stats[src_path]
+        if (st is not None) and stat.S_ISREG(st.st_mode):
+            valid_stats[src_path] = st
+            continue
+        if (st is not None) and stat.S_ISDIR(st.st_mode):
+            descriptions = [
+                "The value of 'src' must point to an existing file",
+                "The path \"{}\" belongs to a directory".format(src_path)
+            ]
+        else:
+            descriptions = [
+                "The file \"{}\" does not exist".format(src_path),
+                "Relative paths assigned to 'src' will be resolved relative to the filesrc directory",
+                "To use a file outside the filesrc directory, provide an absolute path instead",
+            ]
+        element, lines = context.src_paths[src_path]
+        issue = InvalidAttributeValue(affected_element=element, attribute_name="src", attribute_value=src_path)
+        issue.lines.update(lines)
+        issue.add_descriptions(desc=descriptions)
+        context.issues.log_issue(issue)
+    return valid_stats
+
+
+def _stat_or_none(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def _check_name_attribute(elem: Element, context: ValidationContext) -> None:
     # Ignore anything other than a <dir> or <file>
     if elem.tag == "dir" or elem.tag == "file":
         if os.sep in elem.get("name"):
@@ -16,7 +97,7 @@ def _check_name_attribute(elem: Element) -> None:
             ]
             issue = InvalidAttributeValue(affected_element=elem, attribute_name="name", attribute_value=elem.get("name"))
             issue.add_descriptions(desc=descriptions)
-            log_issue(issue)
+            context.issues.log_issue(issue)
 
         if not elem.get("name"):
             descriptions = [
@@ -25,10 +106,10 @@ def _check_name_attribute(elem: Element) -> None:
             ]
             issue = InvalidAttributeValue(affected_element=elem, attribute_name="name", attribute_value="")
             issue.add_descriptions(desc=descriptions)
-            log_issue(issue)
+            context.issues.log_issue(issue)
 
 
-def _check_src_attribute(elem: Element) -> None:
+def _check_src_attribute(elem: Element, context: ValidationContext) -> None:
     # Ignore the src attribute for any element other than <file>
     if elem.tag == "file":
         src = elem.get("src")
@@ -39,28 +120,163 @@ def _check_src_attribute(elem: Element) -> None:
             ]
             issue = InvalidAttributeValue(affected_element=elem, attribute_name="src", attribute_value="")
             issue.add_descriptions(desc=descriptions)
-            log_issue(issue)
+            context.issues.log_issue(issue)
         else:
+            # The path itself is checked by check_src_paths()
             src_path = resolve_src_attribute(src=src)
-            if not os.path.isfile(src_path):
-                if os.path.isdir(src_path):
+            seen = context.src_paths.get(src_path)
+            if seen is None:
+                context.src_paths[src_path] = (elem, {elem.sourceline: None})
+            else:
+                seen[1][elem.sourceline] = None
+
+
+def _check_link_attribute(elem: Element, context: ValidationContext) -> None:
+    # Ignore the link attribute for any element other than <file>
+    if elem.tag == "file":
+        link = elem.get("link")
+        if link not in LINK_MODES:
+            descriptions = [
+                "\"{}\" is not a valid link mode".format(link),
+                "The value of 'link' must be one of: {}".format(", ".join(LINK_MODES))
+            ]
+            issue = InvalidAttributeValue(affected_element=elem, attribute_name="link", attribute_value=link)
+            issue.add_descriptions(desc=descriptions)
+            context.issues.log_issue(issue)
+        elif "src" not in elem.attrib:
+            descriptions = [
+                "The 'link' attribute only applies to files that have a 'src' attribute",
+            ]
+            issue = InvalidAttributeValue(affected_element=elem, attribute_name="link", attribute_value=link)
+            issue.add_descriptions(desc=descriptions)
+            context.issues.log_issue(issue)
+
+
+def _check_repeat_attribute(elem: Element, context: ValidationContext) -> None:
+    # Only <dir> and <file> can be repeated; unrecognized tags are reported on their own
+    if elem.tag in VALID_TAGS and elem.tag not in ("dir", "file"):
+        descriptions = [
+            "The 'repeat' attribute only applies to <dir> and <file> elements",
+        ]
+        issue = InvalidAttributeValue(affected_element=elem, attribute_name="repeat", attribute_value=elem.get("repeat"))
+        issue.add_descriptions(desc=descriptions)
+        context.issues.log_issue(issue)
+    elif elem.tag == "dir" or elem.tag == "file":
+        repeat = elem.get("repeat")
+        values = parse_repeat_attribute(repeat=repeat)
+        if values is None:
+            descriptions = [
+                "The value assigned to 'repeat' must be a range of non-negative integers, written as first..last (both inclusive)",
+                "E.g: repeat=\"0..9\" creates 10 copies of the {}, with {{i}} in its 'name' replaced by 0 to 9".format(
+                    "directory (and its contents)" if (elem.tag == "dir") else elem.tag)
+            ]
+            issue = InvalidAttributeValue(affected_element=elem, attribute_name="repeat", attribute_value=repeat)
+            issue.add_descriptions(desc=descriptions)
+            context.issues.log_issue(issue)
+            return
+
+        # Every copy must get its own name, and the names of the copies must be valid basenames
+        # Only {i} and integer format specifications are allowed, so that {i} is always replaced by digits
+        name = elem.get("name") or ""
+        try:
+            fields = [(field, spec, conversion) for (_, field, spec, conversion) in string.Formatter().parse(name)
+                      if field is not None]
+        except ValueError:
+            fields = []
+        specs = [REPEAT_FORMAT_SPEC.fullmatch(spec) for (_, spec, _) in fields]
+        valid = bool(fields) and all(
+            (field == "i") and (conversion is None) and (spec is not None)
+            for (field, _, conversion), spec in zip(fields, specs)
+        )
+        if valid:
+            # The widths are checked before any name is formatted, so that huge widths are never allocated
+            # The copy with the last value has the longest name
+            widths = [spec.group(1) for spec in specs]
+            if any(len(width) > 3 or int(width or 0) > NAME_MAX for width in widths) or \
+                    len(os.fsencode(name.format(i=values[1]))) > NAME_MAX:
+                descriptions = [
+                    "The names of the copies cannot be longer than {} bytes".format(NAME_MAX),
+                    "Shorten the 'name', or the width of {i}"
+                ]
+                issue = InvalidAttributeValue(affected_element=elem, attribute_name="name", attribute_value=name)
+                issue.add_descriptions(desc=descriptions)
+                context.issues.log_issue(issue)
+        else:
+            descriptions = [
+                "The 'name' of a repeated {} must contain {{i}}, which is replaced by the value of each copy".format(
+                    "directory" if (elem.tag == "dir") else elem.tag),
+                "Integer format specifications are allowed (e.g. name=\"shard{i:04d}\"), but no other replacement fields, conversions, or attribute and index lookups",
+                "Literal braces must be doubled: {{ and }}"
+            ]
+            issue = InvalidAttributeValue(affected_element=elem, attribute_name="name", attribute_value=name)
+            issue.add_descriptions(desc=descriptions)
+            context.issues.log_issue(issue)
+
+
+def _check_template_attribute(elem: Element, context: ValidationContext) -> None:
+    # Ignore the template attribute for any element other than <include>
+    if elem.tag != "include":
+        return
+    template = elem.get("template")
+    descriptions = []
+    fragment_issues = []
+    if not template:
+        descriptions = [
+            "The value assigned to 'template' cannot be empty",
+            "The value of 'template' should be the name of another template, e.g. template=\"gradle-java\""
+        ]
+    elif os.sep in template:
+        descriptions = [
+            "The value assigned to 'template' cannot contain any path separators",
+            "Templates are referred to by name, like on the command line"
+        ]
+    else:
+        template_file = os.path.join(TEMPLATES_DIRECTORY, "{}.xml".format(template))
+        chain = context.including + (context.template_file,)
+        if template_file in chain:
+            cycle = [os.path.splitext(os.path.basename(f))[0] for f in chain[chain.index(template_file):]] + [template]
+            descriptions = [
+                "Templates cannot include themselves, directly or not",
+                "Include cycle: {}".format(" → ".join(cycle))
+            ]
+        elif not os.path.isfile(template_file):
+            descriptions = [
+                "The template file \"{}\" does not exist".format(template_file),
+            ]
+        elif template_file not in context.fragments and context.load_fragment is not None:
+            try:
+                fragment = context.load_fragment(template_file, chain)
+            except InvalidTemplateFile as e:
+                # The issues of the included template are reported after this one, with their own line numbers
+                # Issues of templates included by the included template already name their own file
+                descriptions = [
+                    "The included template \"{}\" is invalid".format(template_file),
+                    "Its issues are listed below, prefixed with \"(in {})\"".format(os.path.basename(template_file))
+                ]
+                fragment_issues = [
+                    issue if isinstance(issue, IncludedTemplateIssue) else IncludedTemplateIssue(template_file=template_file, issue=issue)
+                    for issue in e.issues
+                ]
+            else:
+                if any(f in chain for f in fragment.includes):
                     descriptions = [
-                        "The value of 'src' must point to an existing file",
-                        "The path \"{}\" belongs to a directory".format(src_path)
+                        "Templates cannot include themselves, directly or not",
                     ]
                 else:
-                    descriptions = [
-                        "The file \"{}\" does not exist".format(src_path),
-                        "Relative paths assigned to 'src' will be resolved relative to the filesrc directory",
-                        "To use a file outside the filesrc directory, provide an absolute path instead",
-                    ]
-                issue = InvalidAttributeValue(affected_element=elem, attribute_name="src", attribute_value=src_path)
-                issue.add_descriptions(desc=descriptions)
-                log_issue(issue)
+                    context.fragments[template_file] = fragment
+    if descriptions:
+        issue = InvalidAttributeValue(affected_element=elem, attribute_name="template", attribute_value=template or "")
+        issue.add_descriptions(desc=descriptions)
+        context.issues.log_issue(issue)
+    for issue in fragment_issues:
+        context.issues.log_issue(issue)
 
 
-REGISTERED_ATTRIBUTE_CHECKERS: Dict[str, Callable[[Element, str], None]]
+REGISTERED_ATTRIBUTE_CHECKERS: Dict[str, Callable[[Element, ValidationContext], None]]
 REGISTERED_ATTRIBUTE_CHECKERS = {
     "name": _check_name_attribute,
     "src" : _check_src_attribute,
+    "link": _check_link_attribute,
+    "repeat": _check_repeat_attribute,
+    "template": _check_template_attribute,
 }
@@ -0,0 +1,105 @@
+# Shared fixtures of the test suite
+#
+# Every test case gets a private copy of skel (like benchmarks/suite.py), so that the tests neither
+# read nor pollute the real templates, src files, and cache, and a scratch directory for its targets.
+# skel is run as a separate process, exactly as it is run from the command line.
+
+import os, os.path, sys, shutil, subprocess, tempfile, time, unittest
+
+SKEL_HOME = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional
+
+
+class SkelTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.workdir = tempfile.mkdtemp(prefix="skel-test-")
+        self.addCleanup(_remove_tree, self.workdir)
+        self.skel_home = os.path.join(self.workdir, "skel")
+        shutil.copytree(os.path.join(SKEL_HOME, "src"), os.path.join(self.skel_home, "src"),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+        self.templates_dir = os.path.join(self.skel_home, "resources", "templates")
+        self.filesrc_dir   = os.path.join(self.skel_home, "resources", "filesrc")
+        os.makedirs(self.templates_dir)
+        os.makedirs(self.filesrc_dir)
+        self.targets_dir = os.path.join(self.workdir, "targets")
+        os.makedirs(self.targets_dir)
+
+    def add_template(self, name: str, xml: str, *, recent: bool = False) -> str:
+        # recent: Whether to keep the mtime of the file; otherwise it's set in the past, like the mtime of
+        #         an installed template, so that the template can be cached right away
+        path = os.path.join(self.templates_dir, "{}.xml".format(name))
+        with open(path, "w") as f:
+            f.write(xml)
+        if not recent:
+            _backdate(path)
+        return path
+
+    def add_src_file(self, name: str, contents: str) -> str:
+        path = os.path.join(self.filesrc_dir, name)
+        with open(path, "w") as f:
+            f.write(contents)
+        _backdate(path)
+        return path
+
+    def cached_plans(self) -> "List[str]":
+        # Output: The names of the templates whose compiled plan is in the cache
+        cache_dir = os.path.join(self.skel_home, "resources", "cache")
+        if not os.path.isdir(cache_dir):
+            return []
+        return sorted(name[:-len(".xml.plan")] for name in os.listdir(cache_dir) if name.endswith(".xml.plan"))
+
+    def target(self, *parts: str) -> str:
+        return os.path.join(self.targets_dir, *parts)
+
+    def skel(self, *args: str, patch: str = "") -> str:
+        # Runs skel with the given arguments in the targets directory
+        # patch: Python code run before skel, e.g. to simulate failures (the utils package is importable)
+        # Output: What skel printed
+        main = os.path.join(self.skel_home, "src", "main.py")
+        code = "import sys, runpy\nsys.path.insert(0, {!r})\n{}\nsys.argv = [{!r}] + sys.argv[1:]\nrunpy.run_path({!r}, run_name='__main__')\n".format(
+            os.path.dirname(main), patch, main, main)
+        # Never hand the command over to a daemon that may be running
+        env = dict(os.environ, SKEL_SOCKET=os.path.join(self.workdir, "no-daemon.sock"))
+        result = subprocess.run([sys.executable, "-c", code] + list(args), cwd=self.targets_dir, env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=300)
+        return result.stdout
+
+    def tree(self, path: str) -> "Dict[str, Optional[str]]":
+        # Output: Relative path -> contents of every file (None for directories) below path
+        entries = {}
+        for parent, dirs, files in os.walk(path):
+            for name in dirs:
+                entries[os.path.relpath(os.path.join(parent, name), path)] = None
+            for name in files:
+                with open(os.path.join(parent, name)) as f:
+                    entries[os.path.relpath(os.path.join(parent, name), path)] = f.read()
+        return entries
+
+
+def deep_template(depth: int, *, name: str = "d") -> str:
+    # A directory nested depth times, with a file in every level
+    return "<root>{}{}</root>".format('<dir name="{}"><file name="f"/>'.format(name) * depth, "</dir>" * depth)
+
+
+# Runs skel as if lxml wasn't installed: only templates that are cached can be applied
+WITHOUT_LXML = """
+class HideLxml:
+    def find_spec(self, name, path, target=None):
+        if name.partition(".")[0] == "lxml":
+            raise ModuleNotFoundError("No module named 'lxml'", name="lxml")
+sys.meta_path.insert(0, HideLxml())
+"""
+
+
+def _backdate(path: str) -> None:
+    # Every call sets a different mtime, since the current time is part of it
+    past_ns = time.time_ns() - 60 * 10 ** 9
+    os.utime(path, ns=(past_ns, past_ns))
+
+
+def _remove_tree(path: str) -> None:
+    # shutil.rmtree() is recursive, and runs out of stack on deep trees
+    subprocess.run(["rm", "-rf", "--", path], check=True)
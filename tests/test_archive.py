@@ -0,0 +1,68 @@
+import io, os, subprocess, sys, tarfile, unittest, zipfile
+
+from support import SkelTestCase
+
+
+class ArchiveTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.license = self.add_src_file("license.txt", "MIT")
+        self.add_template("app", '<root><dir name="src"><file name="main.py"/></dir><file name="LICENSE" src="license.txt"/>'
+                                 '<file name="COPYING" src="license.txt" link="sym"/></root>')
+        self.archive = os.path.join(self.workdir, "out")
+
+    def tar_contents(self, path):
+        # Output: Name -> contents of files, "dir" for directories, "-> target" for symbolic links
+        with tarfile.open(path) as archive:
+            return {member.name: "dir" if member.isdir() else "-> " + member.linkname if member.issym()
+                    else archive.extractfile(member).read().decode() for member in archive}
+
+    def test_tar(self):
+        for extension in (".tar", ".tar.gz", ".tgz"):
+            with self.subTest(extension=extension):
+                output = self.skel("--archive", self.archive + extension, "app", "a", "b")
+                self.assertIn("Created  file      : \"a/LICENSE\"", output)
+                contents = {"src": "dir", "src/main.py": "", "LICENSE": "MIT", "COPYING": "-> " + self.license}
+                expected = {"a": "dir", "b": "dir"}
+                for target in ("a", "b"):
+                    expected.update({target + "/" + name: content for name, content in contents.items()})
+                self.assertEqual(self.tar_contents(self.archive + extension), expected)
+
+    def test_zip(self):
+        self.skel("--archive", self.archive + ".zip", "app")
+        with zipfile.ZipFile(self.archive + ".zip") as archive:
+            self.assertEqual(sorted(archive.namelist()), ["COPYING", "LICENSE", "src/", "src/main.py"])
+            self.assertEqual(archive.read("LICENSE"), b"MIT")
+            self.assertEqual(archive.read("COPYING").decode(), self.license)
+            self.assertEqual(archive.getinfo("COPYING").external_attr >> 28, 0o12)  # S_IFLNK
+
+    def test_archive_to_stdout(self):
+        process = subprocess.run([sys.executable, os.path.join(self.skel_home, "src", "main.py"), "--archive", "-", "app"],
+                                 cwd=self.workdir, env=dict(os.environ, SKEL_SOCKET=os.path.join(self.workdir, "none")),
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.assertIn("Created  file      : \"LICENSE\"", process.stderr.decode())
+        with tarfile.open(fileobj=io.BytesIO(process.stdout)) as archive:
+            self.assertEqual(sorted(archive.getnames()), ["COPYING", "LICENSE", "src", "src/main.py"])
+
+    def test_clashes_are_skipped_like_on_disk(self):
+        self.add_template("clash", '<root><dir name="a"/><file name="a"/><file name="b"/><dir name="b"><file name="c"/></dir></root>')
+        archived = self.skel("--archive", self.archive + ".tar", "clash", "t")
+        created = self.skel("clash", self.target("t"))
+        self.assertEqual(archived, created.replace(self.target("t"), "t"))
+        self.assertEqual(self.tar_contents(self.archive + ".tar"), {"t": "dir", "t/a": "dir", "t/b": ""})
+
+    def test_target_clash(self):
+        output = self.skel("--archive", self.archive + ".tar", "app", "a", "a/LICENSE/b")
+        self.assertIn("Skipping directory : \"a/LICENSE/b\"\n  ┣━ Unable to create the target directory", output)
+        self.assertNotIn("a/LICENSE/b/", str(self.tar_contents(self.archive + ".tar")))
+
+    def test_targets_outside_of_the_archive(self):
+        self.assertIn("can't be outside of the archive: \"../t\"", self.skel("--archive", self.archive + ".tar", "app", "../t"))
+        self.assertFalse(os.path.exists(self.archive + ".tar"))
+
+    def test_unknown_extension(self):
+        self.assertIn("The archive must end with one of", self.skel("--archive", self.archive + ".rar", "app"))
+
+
+if __name__ == "__main__":
+    unittest.main()
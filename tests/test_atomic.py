@@ -0,0 +1,61 @@
+import os, sys, unittest
+
+from support import SkelTestCase, SKEL_HOME, deep_template
+
+# Simulates a target created by someone else while it was being generated
+LOST_RACE = """
+import errno
+from utils import creation
+def rename_no_replace(name, new_name, *, dir_fd):
+    raise FileExistsError(errno.EEXIST, "File exists", new_name)
+creation.rename_no_replace = rename_no_replace
+"""
+
+
+class AtomicTest(SkelTestCase):
+    def test_new_target_is_published(self):
+        self.add_template("app", '<root><dir name="src"><file name="main.py"/></dir></root>')
+        output = self.skel("--atomic", "app", "t")
+        self.assertEqual(self.tree(self.target("t")), {"src": None, "src/main.py": ""})
+        # Entries are reported with their final paths, and no staging directory is left behind
+        self.assertIn(self.target("t", "src", "main.py"), output)
+        self.assertEqual(os.listdir(self.targets_dir), ["t"])
+
+    def test_existing_target_is_updated_in_place(self):
+        self.add_template("app", '<root><file name="new"/></root>')
+        os.makedirs(self.target("t"))
+        self.skel("--atomic", "app", "t")
+        self.assertEqual(set(self.tree(self.target("t"))), {"new"})
+
+    def test_lost_race_removes_the_staging_directory(self):
+        self.add_template("app", '<root><dir name="src"><file name="main.py"/></dir></root>')
+        output = self.skel("--atomic", "app", "t", patch=LOST_RACE)
+        self.assertIn("The target was created by someone else while it was being generated", output)
+        self.assertEqual(os.listdir(self.targets_dir), [])
+
+    def test_lost_race_with_a_deep_template(self):
+        # Deeper than the recursion limit of Python, and than PATH_MAX
+        self.add_template("deep", deep_template(2000, name="dd"))
+        output = self.skel("--atomic", "--quiet", "deep", "t", patch=LOST_RACE)
+        self.assertNotIn("Traceback", output)
+        self.assertEqual(os.listdir(self.targets_dir), [])
+
+    def test_remove_tree(self):
+        sys.path.insert(0, os.path.join(SKEL_HOME, "src"))
+        self.addCleanup(sys.path.remove, os.path.join(SKEL_HOME, "src"))
+        from utils import creation
+        self.add_template("deep", deep_template(1500, name="dd"))
+        self.skel("--quiet", "deep", "t")
+        os.symlink(self.templates_dir, self.target("t", "dd", "link"))
+        fd = os.open(self.targets_dir, os.O_RDONLY)
+        try:
+            creation.remove_tree("t", dir_fd=fd)
+        finally:
+            os.close(fd)
+        self.assertEqual(os.listdir(self.targets_dir), [])
+        # Symbolic links are removed, not followed
+        self.assertTrue(os.listdir(self.templates_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import os, unittest
+
+from support import SkelTestCase, deep_template
+
+
+class BatchTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_template("app", '<root><dir name="src"><file name="main.py"/></dir></root>')
+        self.add_template("deep", deep_template(300))
+        self.batch_file = os.path.join(self.workdir, "jobs")
+
+    def write_batch_file(self, text):
+        with open(self.batch_file, "w") as f:
+            f.write(text)
+
+    def test_batch(self):
+        self.write_batch_file("# Jobs\napp a b\n{\"template\": \"deep\", \"targets\": [\"c\"]}\nmissing d\n")
+        output = self.skel("--jobs", "2", "--batch", self.batch_file)
+        self.assertEqual(sorted(os.listdir(self.targets_dir)), ["a", "b", "c"])
+        self.assertIn("Line 2: app \"a\" \"b\"", output)
+        self.assertIn("Line 3: deep \"c\"", output)
+        self.assertIn("Line 4: missing \"d\" failed", output)
+        self.assertEqual(self.tree(self.target("b")), {"src": None, "src/main.py": ""})
+
+    def test_jobs_are_reported_in_order(self):
+        self.write_batch_file("".join("app t{}\n".format(n) for n in range(8)))
+        output = self.skel("--jobs", "4", "--quiet", "--batch", self.batch_file)
+        lines = [line for line in output.splitlines() if line.startswith("✔ Line")]
+        self.assertEqual(lines, ["✔ Line {}: app \"t{}\"".format(n + 1, n) for n in range(8)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os, unittest
+
+from support import SkelTestCase, WITHOUT_LXML
+
+TEMPLATE = '<root><dir name="src"><file name="main.py"/></dir></root>'
+
+
+class CacheTest(SkelTestCase):
+    def test_cached_template_is_applied_without_lxml(self):
+        self.add_template("app", TEMPLATE)
+        self.skel("app", "a")
+        self.assertEqual(self.cached_plans(), ["app"])
+        output = self.skel("app", "b", patch=WITHOUT_LXML)
+        self.assertNotIn("Missing dependency", output)
+        self.assertTrue(os.path.isfile(self.target("b", "src", "main.py")))
+
+    def test_modified_template_is_compiled_again(self):
+        self.add_template("app", TEMPLATE)
+        self.skel("app", "a")
+        # Same size, so only the mtime tells the versions apart
+        self.add_template("app", TEMPLATE.replace("main.py", "util.py"))
+        self.assertIn("Missing dependency", self.skel("app", "b", patch=WITHOUT_LXML))
+        self.skel("app", "b")
+        self.assertEqual(set(self.tree(self.target("b"))), {"src", "src/util.py"})
+
+    def test_touched_template_is_still_cached(self):
+        path = self.add_template("app", TEMPLATE)
+        self.skel("app", "a")
+        os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns - 10 ** 9))
+        self.assertNotIn("Missing dependency", self.skel("app", "b", patch=WITHOUT_LXML))
+
+    def test_modified_src_file_invalidates_the_template(self):
+        self.add_src_file("license.txt", "MIT")
+        self.add_template("app", '<root><file name="LICENSE" src="license.txt"/></root>')
+        self.skel("app", "a")
+        self.add_src_file("license.txt", "BSD")
+        self.assertIn("Missing dependency", self.skel("app", "b", patch=WITHOUT_LXML))
+        # Removing the src file makes the template invalid
+        os.unlink(os.path.join(self.filesrc_dir, "license.txt"))
+        self.assertIn("license.txt\" does not exist", self.skel("app", "c"))
+
+    def test_recently_modified_template_isnt_cached(self):
+        # It could be modified again within the same mtime tick, and the change would go unnoticed
+        self.add_template("app", TEMPLATE, recent=True)
+        self.skel("app", "a")
+        self.assertEqual(self.cached_plans(), [])
+        self.add_template("app", TEMPLATE)
+        self.skel("app", "a")
+        self.assertEqual(self.cached_plans(), ["app"])
+
+    def test_corrupted_cache_entry_is_ignored(self):
+        self.add_template("app", TEMPLATE)
+        self.skel("app", "a")
+        with open(os.path.join(self.skel_home, "resources", "cache", "app.xml.plan"), "wb") as f:
+            f.write(b"\x00garbage")
+        self.skel("app", "b")
+        self.assertTrue(os.path.isfile(self.target("b", "src", "main.py")))
+        self.assertNotIn("Missing dependency", self.skel("app", "c", patch=WITHOUT_LXML))
+
+
+if __name__ == "__main__":
+    unittest.main()
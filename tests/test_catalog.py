@@ -0,0 +1,72 @@
+import os, unittest
+
+from support import SkelTestCase, WITHOUT_LXML
+
+# Reports every listing of the templates directory
+REPORT_SCANS = """
+import sys
+def report_scans(event, args):
+    if (event == "os.scandir") and str(args[0]).endswith("templates"):
+        print("Scanned the templates directory")
+sys.addaudithook(report_scans)
+"""
+
+
+class CatalogTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_src_file("license.txt", "MIT")
+        self.add_template("app", '<root><dir name="src"/><file name="LICENSE" src="license.txt"/></root>')
+
+    def listed_templates(self, **kwargs):
+        # Output: Name -> statistics shown by skel without arguments ("" if none)
+        output = self.skel(**kwargs)
+        templates = {}
+        for line in output.split("Available templates:\n", 1)[1].splitlines():
+            name, _, stats = line[2:].partition("  ")
+            templates[name.strip()] = stats.strip()
+        return templates
+
+    def test_templates_are_listed(self):
+        self.assertEqual(self.listed_templates(), {"app": ""})
+        self.add_template("lib", "<root/>")
+        self.assertEqual(self.listed_templates(), {"app": "", "lib": ""})
+        os.unlink(os.path.join(self.templates_dir, "app.xml"))
+        self.assertEqual(self.listed_templates(), {"lib": ""})
+
+    def test_statistics_of_compiled_templates(self):
+        self.skel("app", "t")
+        # The statistics are shown without compiling the template again
+        self.assertEqual(self.listed_templates(patch=WITHOUT_LXML),
+                         {"app": "(1 directory, 1 file, 3 bytes from src files)"})
+
+    def test_statistics_of_modified_templates_arent_shown(self):
+        self.skel("app", "t")
+        self.add_template("app", '<root><dir name="src"/><dir name="docs"/></root>')
+        self.assertEqual(self.listed_templates(), {"app": ""})
+        self.skel("app", "t")
+        self.assertEqual(self.listed_templates(), {"app": "(2 directories, 0 files)"})
+
+    def test_statistics_of_templates_with_modified_src_files_arent_shown(self):
+        self.skel("app", "t")
+        self.add_src_file("license.txt", "Apache")
+        self.assertEqual(self.listed_templates(), {"app": ""})
+        self.skel("app", "t")
+        self.assertEqual(self.listed_templates(), {"app": "(1 directory, 1 file, 6 bytes from src files)"})
+
+    def test_compiling_a_template_doesnt_scan_the_templates_directory(self):
+        self.assertIn("Scanned the templates directory", self.skel(patch=REPORT_SCANS))
+        self.add_template("lib", "<root/>")
+        output = self.skel("app", "t", patch=REPORT_SCANS)
+        self.assertNotIn("Scanned the templates directory", output)
+        self.assertEqual(self.listed_templates(), {"app": "(1 directory, 1 file, 3 bytes from src files)", "lib": ""})
+
+    def test_missing_template(self):
+        output = self.skel("missing", "t")
+        self.assertIn("The template file \"{}\" doesn't exist".format(os.path.join(self.templates_dir, "missing.xml")), output)
+        os.mkdir(os.path.join(self.templates_dir, "dir.xml"))
+        self.assertIn("dir.xml\" doesn't exist", self.skel("dir", "t"))
+
+
+if __name__ == "__main__":
+    unittest.main()
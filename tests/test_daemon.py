@@ -0,0 +1,94 @@
+import os, shutil, signal, stat, subprocess, sys, time, unittest
+
+from support import SkelTestCase
+
+# Pretends that the daemon belongs to another user
+OTHER_USER = """
+import os
+from utils import daemon, operations
+daemon._peer_uid = lambda connection, *, socket_file: os.getuid() + 1
+run = operations.run
+def run_in_process(*args, **kwargs):
+    print("Run in-process")
+    return run(*args, **kwargs)
+operations.run = run_in_process
+"""
+
+
+# Reports the commands run by the client itself
+REPORT_IN_PROCESS = """
+from utils import daemon, operations
+run = operations.run
+def run_in_process(*args, **kwargs):
+    print("Run in-process")
+    return run(*args, **kwargs)
+operations.run = run_in_process
+daemon.CLIENT_TIMEOUT = 0.5
+"""
+
+
+class DaemonTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_template("app", '<root><dir name="src"><file name="main.py"/></dir></root>')
+        self.socket_file = os.path.join(self.workdir, "skel.sock")
+        main = os.path.join(self.skel_home, "src", "main.py")
+        self.daemon = subprocess.Popen([sys.executable, main, "--serve"], cwd=self.workdir,
+                                       env=dict(os.environ, SKEL_SOCKET=self.socket_file),
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        self.addCleanup(self._stop_daemon)
+        self.assertIn("Listening on", self.daemon.stdout.readline())
+
+    def _stop_daemon(self):
+        self.daemon.terminate()
+        self.daemon.wait(timeout=10)
+        self.daemon.stdout.close()
+
+    def skel_client(self, *args, umask, patch=""):
+        main = os.path.join(self.skel_home, "src", "main.py")
+        code = "import os, sys, runpy\nos.umask({})\nsys.path.insert(0, {!r})\n{}\nsys.argv = [{!r}] + sys.argv[1:]\nrunpy.run_path({!r}, run_name='__main__')\n".format(
+            umask, os.path.dirname(main), patch, main, main)
+        result = subprocess.run([sys.executable, "-c", code] + list(args), cwd=self.targets_dir,
+                                env=dict(os.environ, SKEL_SOCKET=self.socket_file),
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=60)
+        return result.stdout
+
+    def test_entries_are_created_with_the_umask_of_the_client(self):
+        for umask, mode in ((0o077, 0o700), (0o002, 0o775), (0o027, 0o750)):
+            with self.subTest(umask=oct(umask)):
+                target = "t{:o}".format(umask)
+                output = self.skel_client("app", target, umask=umask)
+                self.assertIn(self.target(target, "src", "main.py"), output)
+                self.assertEqual(stat.S_IMODE(os.stat(self.target(target, "src")).st_mode), mode)
+
+    def test_daemon_runs_the_command(self):
+        output = self.skel_client("app", "t", umask=0o022, patch=REPORT_IN_PROCESS)
+        self.assertNotIn("Run in-process", output)
+        self.assertIn(self.target("t", "src", "main.py"), output)
+        self.assertTrue(os.path.isfile(self.target("t", "src", "main.py")))
+
+    def test_client_runs_the_command_itself_if_the_daemon_is_unresponsive(self):
+        os.kill(self.daemon.pid, signal.SIGSTOP)
+        try:
+            start = time.monotonic()
+            output = self.skel_client("app", "t", umask=0o022, patch=REPORT_IN_PROCESS)
+            self.assertLess(time.monotonic() - start, 30)
+        finally:
+            os.kill(self.daemon.pid, signal.SIGCONT)
+        self.assertIn("Run in-process", output)
+        self.assertTrue(os.path.isfile(self.target("t", "src", "main.py")))
+        # The daemon gets the request once it resumes, but doesn't run the command: the client never confirmed it
+        shutil.rmtree(self.target("t"))
+        time.sleep(1)
+        self.assertFalse(os.path.exists(self.target("t")))
+        # The daemon still serves other clients
+        self.assertNotIn("Run in-process", self.skel_client("app", "t2", umask=0o022, patch=REPORT_IN_PROCESS))
+
+    def test_client_runs_the_command_itself_if_the_daemon_belongs_to_another_user(self):
+        output = self.skel_client("app", "t", umask=0o022, patch=OTHER_USER)
+        self.assertIn("Run in-process", output)
+        self.assertTrue(os.path.isfile(self.target("t", "src", "main.py")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import os, unittest
+
+from support import SkelTestCase, deep_template
+
+
+class DryRunTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_src_file("data.txt", "data")
+        self.add_template("wide", "<root>{}</root>".format("".join(
+            '<dir name="d{0}"><file name="f{0}"/><file name="c{0}" src="data.txt"/><dir name="e{0}"><file name="g"/></dir></dir>'.format(n)
+            for n in range(40))))
+
+    def test_dry_run_matches_the_real_run(self):
+        os.makedirs(self.target("t", "d3"))
+        with open(self.target("t", "d5"), "w"):
+            pass  # A file where the template expects a directory
+        preview = self.skel("--dry-run", "--quiet", "wide", "t")
+        self.assertEqual(set(os.listdir(self.target("t"))), {"d3", "d5"})
+        real = self.skel("--quiet", "wide", "t")
+        self.assertEqual(preview.splitlines()[0].replace("Would create", "Created").replace("Would skip", "Skipped"),
+                         real.splitlines()[0])
+
+    def test_nothing_is_changed(self):
+        output = self.skel("--dry-run", "wide", "a/b")
+        self.assertIn("✔ Would create directory : \"{}\"".format(self.target("a")), output)
+        self.assertIn("Would be materialized from", output)
+        self.assertTrue(output.rstrip().endswith("Dry run: nothing was changed"))
+        self.assertEqual(os.listdir(self.targets_dir), [])
+
+    def test_dry_run_reports_directories_that_cant_be_listed(self):
+        self.add_template("deeper", deep_template(1500, name="dd"))
+        self.skel("--quiet", "deeper", "t")
+        output = self.skel("--dry-run", "deeper", "t")
+        self.assertIn("Unable to list the directory", output)
+        self.assertNotIn("Would create", output.replace("Would create 0 directories, 0 files", ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
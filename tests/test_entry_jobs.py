@@ -0,0 +1,44 @@
+import unittest
+
+from support import SkelTestCase, deep_template
+
+# Simulates a failure halfway through the creation of a target
+FAILING_FILE = """
+from utils import creation
+make_file = creation.make_file
+def failing_make_file(name, **kwargs):
+    if name == "f7":
+        raise OSError("Injected failure")
+    return make_file(name, **kwargs)
+creation.make_file = failing_make_file
+"""
+
+
+class EntryJobsTest(SkelTestCase):
+    # --jobs with a single target: the entries of the target are created concurrently
+    def setUp(self):
+        super().setUp()
+        self.add_src_file("data.txt", "data")
+        self.add_template("wide", "<root>{}</root>".format("".join(
+            '<dir name="d{0}"><file name="f{0}"/><file name="c{0}" src="data.txt"/><dir name="e{0}"><file name="g"/></dir></dir>'.format(n)
+            for n in range(40))))
+        self.add_template("deep", deep_template(300))
+
+    def test_concurrent_creation_matches_serial_creation(self):
+        # Without the src cache, which thread reads a src file first (and how it's copied) doesn't matter
+        for template in ("wide", "deep"):
+            with self.subTest(template=template):
+                serial = self.skel("--src-cache", "0", template, "serial-" + template)
+                concurrent = self.skel("--src-cache", "0", "--jobs", "4", template, "concurrent-" + template)
+                self.assertEqual(serial.replace("serial-", "concurrent-"), concurrent)
+                self.assertEqual(self.tree(self.target("serial-" + template)), self.tree(self.target("concurrent-" + template)))
+
+    def test_concurrent_creation_stops_at_the_first_error(self):
+        serial = self.skel("--src-cache", "0", "wide", "serial", patch=FAILING_FILE)
+        concurrent = self.skel("--src-cache", "0", "--jobs", "4", "wide", "concurrent", patch=FAILING_FILE)
+        self.assertIn("Injected failure", serial)
+        self.assertEqual(serial.replace("serial", "concurrent"), concurrent)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os, time, unittest
+
+from support import SkelTestCase
+
+
+class IncludeTest(SkelTestCase):
+    def test_included_entries_are_spliced_in_place(self):
+        self.add_template("ci", '<root><dir name=".ci"><file name="lint.yml"/></dir></root>')
+        self.add_template("main", '<root><dir name="app"><include template="ci"/><file name="main.py"/></dir></root>')
+        self.skel("main", "t")
+        self.assertEqual(self.tree(self.target("t")), {
+            "app": None, "app/.ci": None, "app/.ci/lint.yml": "", "app/main.py": "",
+        })
+
+    def test_nested_includes(self):
+        self.add_template("license", '<root><file name="LICENSE"/></root>')
+        self.add_template("lib", '<root><include template="license"/><dir name="src"/></root>')
+        self.add_template("main", '<root><dir name="a"><include template="lib"/></dir><include template="license"/></root>')
+        self.skel("main", "t")
+        self.assertEqual(set(self.tree(self.target("t"))), {"a", "a/LICENSE", "a/src", "LICENSE"})
+
+    def test_include_cycles_are_reported(self):
+        self.add_template("a", '<root><dir name="x"><include template="b"/></dir></root>')
+        self.add_template("b", '<root><include template="a"/></root>')
+        output = self.skel("a", "t")
+        self.assertIn("Include cycle: a → b → a", output)
+        self.assertFalse(os.path.exists(self.target("t")))
+
+    def test_self_include_is_reported(self):
+        self.add_template("a", '<root><include template="a"/></root>')
+        self.assertIn("Include cycle: a → a", self.skel("a", "t"))
+
+    def test_issues_of_included_templates_are_listed_with_their_own_lines(self):
+        self.add_template("bad", '<root>\n\n  <dir/>\n</root>')
+        self.add_template("middle", '<root>\n  <include template="bad"/>\n</root>')
+        self.add_template("main", '<root>\n  <dir name="x">\n    <include template="middle"/>\n  </dir>\n</root>')
+        output = self.skel("main", "t")
+        self.assertIn("Invalid 'template' in <include> (line: 3)", output)
+        self.assertIn("(in middle.xml) Invalid 'template' in <include> (line: 2)", output)
+        self.assertIn("(in bad.xml) Missing required attribute (line: 3)", output)
+        # Issues are flattened, not nested inside the descriptions of other issues
+        self.assertNotIn("•   ", output)
+
+    def test_unparsable_included_template(self):
+        self.add_template("garbage", "not xml")
+        self.add_template("main", '<root><include template="garbage"/></root>')
+        self.assertIn("(in garbage.xml) Failed to parse the template file", self.skel("main", "t"))
+
+    def test_children_of_include_are_reported(self):
+        self.add_template("ci", '<root><file name="lint.yml"/></root>')
+        self.add_template("main", '<root><include template="ci"><dir name="lost"/></include></root>')
+        output = self.skel("main", "t")
+        self.assertIn("Ignoring the child elements of <include template=\"ci\">", output)
+        self.assertEqual(set(self.tree(self.target("t"))), {"lint.yml"})
+        # Also when the plan is loaded from the cache
+        self.assertIn("Ignoring the child elements of <include template=\"ci\">", self.skel("main", "u"))
+
+    def test_changes_to_included_templates_are_picked_up(self):
+        self.add_template("ci", '<root><file name="one"/></root>')
+        self.add_template("main", '<root><include template="ci"/></root>')
+        self.skel("main", "t")
+        time.sleep(0.01)
+        self.add_template("ci", '<root><file name="one"/><file name="two"/></root>')
+        self.skel("main", "u")
+        self.assertEqual(set(self.tree(self.target("u"))), {"one", "two"})
+        self.assertIn("main  (0 directories, 2 files)", self.skel())
+
+
+if __name__ == "__main__":
+    unittest.main()
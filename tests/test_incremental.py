@@ -0,0 +1,60 @@
+import os, unittest
+
+from support import SkelTestCase
+
+
+class IncrementalTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_src_file("license.txt", "MIT")
+        self.add_template("app", '<root><file name="LICENSE" src="license.txt"/><dir name="src"><file name="main.py"/></dir></root>')
+
+    def test_unchanged_template_is_up_to_date(self):
+        self.skel("--incremental", "app", "t")
+        self.assertIn("Up to date", self.skel("--incremental", "app", "t"))
+
+    def test_only_new_entries_are_processed(self):
+        self.skel("--incremental", "app", "t")
+        self.add_template("app", '<root><file name="LICENSE" src="license.txt"/><dir name="src"><file name="main.py"/><file name="util.py"/></dir></root>')
+        output = self.skel("--incremental", "app", "t")
+        self.assertIn(self.target("t", "src", "util.py"), output)
+        self.assertNotIn(self.target("t", "src", "main.py"), output)
+
+    def test_changing_the_link_mode_processes_src_files_again(self):
+        self.skel("--incremental", "--link", "copy", "app", "t")
+        output = self.skel("--incremental", "--link", "sym", "app", "t")
+        self.assertNotIn("Up to date", output)
+        self.assertIn("Skipping file      : \"{}\"".format(self.target("t", "LICENSE")), output)
+        self.assertIn("Remove it to materialize it with link=\"sym\"", output)
+        self.assertNotIn(self.target("t", "src", "main.py"), output)
+        # The copy isn't recorded as materialized with link="sym", so it's reported again
+        output = self.skel("--incremental", "--link", "sym", "app", "t")
+        self.assertNotIn("Up to date", output)
+        self.assertIn("Remove it to materialize it with link=\"sym\"", output)
+        self.assertFalse(os.path.islink(self.target("t", "LICENSE")))
+        # Once removed, the file is materialized with the new link mode, and recorded as such
+        os.unlink(self.target("t", "LICENSE"))
+        output = self.skel("--incremental", "--link", "sym", "app", "t")
+        self.assertIn("Created  file      : \"{}\"".format(self.target("t", "LICENSE")), output)
+        self.assertTrue(os.path.islink(self.target("t", "LICENSE")))
+        self.assertIn("Up to date", self.skel("--incremental", "--link", "sym", "app", "t"))
+
+    def test_changing_the_template_and_the_link_mode(self):
+        self.skel("--incremental", "--link", "copy", "app", "t")
+        self.skel("--incremental", "--link", "sym", "app", "t")
+        # Files present with another link mode are still reported once the template changes
+        self.add_template("app", '<root><file name="LICENSE" src="license.txt"/><dir name="src"><file name="util.py"/></dir></root>')
+        output = self.skel("--incremental", "--link", "sym", "app", "t")
+        self.assertIn("Remove it to materialize it with link=\"sym\"", output)
+        self.assertIn(self.target("t", "src", "util.py"), output)
+
+    def test_verify_recreates_missing_entries(self):
+        self.skel("--incremental", "app", "t")
+        os.unlink(self.target("t", "src", "main.py"))
+        self.assertIn("Up to date", self.skel("--incremental", "app", "t"))
+        self.skel("--verify", "app", "t")
+        self.assertTrue(os.path.isfile(self.target("t", "src", "main.py")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os, unittest
+
+from support import SkelTestCase
+
+# Simulates an unexpected failure in the target "t1"
+FAILING_TARGET = """
+from utils import creation
+make_directories = creation.make_directories
+def failing_make_directories(path):
+    if os.path.basename(path) == "t1":
+        raise OSError("Injected failure")
+    return make_directories(path)
+creation.make_directories = failing_make_directories
+import os
+"""
+
+
+class JobsTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_src_file("data.txt", "data")
+        self.add_template("app", "<root>{}</root>".format("".join(
+            '<dir name="d{0}"><file name="f{0}"/><file name="c{0}" src="data.txt"/></dir>'.format(n) for n in range(50))))
+
+    def test_concurrent_targets_match_serial_targets(self):
+        targets = ["t{}".format(n) for n in range(6)]
+        # Without the src cache, which target reads a src file first (and how it's copied) doesn't matter
+        serial = self.skel("--src-cache", "0", "app", *("serial/" + t for t in targets))
+        concurrent = self.skel("--src-cache", "0", "--jobs", "3", "app", *("concurrent/" + t for t in targets))
+        self.assertEqual(serial.replace("/serial", "/concurrent"), concurrent)
+        self.assertEqual(self.tree(self.target("serial")), self.tree(self.target("concurrent")))
+
+    def test_failure_stops_a_serial_run(self):
+        output = self.skel("app", "t0", "t1", "t2", patch=FAILING_TARGET)
+        self.assertTrue(output.rstrip().endswith("Injected failure"))
+        self.assertTrue(os.path.isfile(self.target("t0", "d49", "c49")))
+        self.assertFalse(os.path.exists(self.target("t2")))
+
+    def test_failure_reports_every_target_that_was_started(self):
+        for jobs in ("2", "3"):
+            with self.subTest(jobs=jobs):
+                targets = [os.path.join(jobs, "t{}".format(n)) for n in range(8)]
+                output = self.skel("--jobs", jobs, "app", *targets, patch=FAILING_TARGET)
+                self.assertTrue(output.rstrip().endswith("Injected failure"))
+                for target in targets:
+                    if target.endswith("t1"):
+                        continue
+                    # The targets that were started before the failure are created and reported; the others are abandoned
+                    created = os.path.exists(self.target(target))
+                    self.assertEqual(created, "\"{}\"".format(self.target(target, "d49", "c49")) in output, target)
+                    self.assertEqual(created, os.path.isfile(self.target(target, "d49", "c49")), target)
+                # Targets before the failing one are always complete
+                self.assertTrue(os.path.isfile(self.target(targets[0], "d49", "c49")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os, stat, unittest
+
+from support import SkelTestCase
+
+# Simulates filesystems without the faster ways of copying files
+NO_REFLINK = """
+import errno, fcntl
+def ioctl(*args):
+    raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+fcntl.ioctl = ioctl
+"""
+NO_COPY_FILE_RANGE = """
+import errno, os
+def copy_file_range(*args):
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+os.copy_file_range = copy_file_range
+"""
+NO_SENDFILE = """
+import errno, os
+def sendfile(*args):
+    raise OSError(errno.EINVAL, "Invalid argument")
+os.sendfile = sendfile
+"""
+NO_CROSS_DEVICE_LINKS = """
+import errno, os
+def link(*args, **kwargs):
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+os.link = link
+"""
+
+
+class LinksTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.src = self.add_src_file("run.sh", "#!/bin/sh\n")
+        os.chmod(self.src, 0o750)
+        self.add_template("app", '<root><file name="run.sh" src="run.sh"/></root>')
+
+    def test_copy(self):
+        output = self.skel("--link", "copy", "--src-cache", "0", "app", "t")
+        path = self.target("t", "run.sh")
+        self.assertIn("Copied 10 bytes from \"{}\"".format(self.src), output)
+        self.assertEqual(self.tree(self.target("t")), {"run.sh": "#!/bin/sh\n"})
+        self.assertNotEqual(os.stat(path).st_ino, os.stat(self.src).st_ino)
+        # Permission bits are copied too
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o750)
+
+    def test_hard_link(self):
+        output = self.skel("--link", "hard", "app", "t")
+        self.assertIn("Created as a hard link to \"{}\"".format(self.src), output)
+        self.assertEqual(os.stat(self.target("t", "run.sh")).st_ino, os.stat(self.src).st_ino)
+
+    def test_symbolic_link(self):
+        output = self.skel("--link", "sym", "app", "t")
+        self.assertIn("Created as a symbolic link to \"{}\"".format(self.src), output)
+        self.assertEqual(os.readlink(self.target("t", "run.sh")), self.src)
+
+    def test_link_attribute_overrides_the_option(self):
+        self.add_template("app", '<root><file name="a" src="run.sh" link="sym"/><file name="b" src="run.sh"/></root>')
+        self.skel("--link", "hard", "app", "t")
+        self.assertTrue(os.path.islink(self.target("t", "a")))
+        self.assertEqual(os.stat(self.target("t", "b")).st_ino, os.stat(self.src).st_ino)
+
+    def test_unsupported_reflink(self):
+        output = self.skel("--link", "reflink", "app", "t", patch=NO_REFLINK)
+        self.assertIn("Unable to materialize the file with link=\"reflink\"", output)
+        self.assertIn("The filesystem doesn't support reflinks", output)
+        # No empty file is left behind
+        self.assertEqual(os.listdir(self.target("t")), [])
+
+    def test_unsupported_hard_link(self):
+        output = self.skel("--link", "hard", "app", "t", patch=NO_CROSS_DEVICE_LINKS)
+        self.assertIn("Unable to hard-link \"{}\": Invalid cross-device link".format(self.src), output)
+        self.assertEqual(os.listdir(self.target("t")), [])
+
+    def test_copy_backend_fallback(self):
+        patches = (
+            (NO_REFLINK, "copy_file_range"),
+            (NO_REFLINK + NO_COPY_FILE_RANGE, "sendfile"),
+            (NO_REFLINK + NO_COPY_FILE_RANGE + NO_SENDFILE, "buffered copy"),
+        )
+        for n, (patch, method) in enumerate(patches):
+            with self.subTest(method=method):
+                target = "t{}".format(n)
+                output = self.skel("--src-cache", "0", "app", target, patch=patch)
+                self.assertIn("Copied 10 bytes from \"{}\" ({})".format(self.src, method), output)
+                self.assertEqual(self.tree(self.target(target)), {"run.sh": "#!/bin/sh\n"})
+                self.assertEqual(stat.S_IMODE(os.stat(self.target(target, "run.sh")).st_mode), 0o750)
+
+    def test_copies_from_memory(self):
+        self.add_template("app", "<root>{}</root>".format("".join('<file name="f{}" src="run.sh"/>'.format(n) for n in range(3))))
+        output = self.skel("--link", "copy", "app", "t")
+        self.assertEqual(output.count("(copy from memory)"), 3)
+        self.assertEqual(self.tree(self.target("t")), {"f{}".format(n): "#!/bin/sh\n" for n in range(3)})
+
+
+if __name__ == "__main__":
+    unittest.main()
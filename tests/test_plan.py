@@ -0,0 +1,63 @@
+import os, unittest
+
+from support import SkelTestCase, WITHOUT_LXML
+
+TEMPLATE = """<root>
+    <dir name="src">
+        <dir name="pkg">
+            <file name="__init__.py"/>
+            <dir name="empty"/>
+        </dir>
+        <file name="main.py"/>
+    </dir>
+    <!-- Comments are ignored -->
+    <dir name="docs"/>
+    <file name="README.md"/>
+</root>
+"""
+
+
+class PlanTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_template("app", TEMPLATE)
+
+    def test_entries_are_created_in_the_order_of_the_template(self):
+        output = self.skel("app", "t")
+        paths = [line.split("\"")[1] for line in output.splitlines() if line.startswith("✔")]
+        self.assertEqual(paths, [self.target("t")] + [self.target("t", *path.split("/")) for path in
+                                 ("src", "src/pkg", "src/pkg/__init__.py", "src/pkg/empty", "src/main.py", "docs", "README.md")])
+
+    def test_cached_plan_is_replayed_identically(self):
+        compiled = self.skel("app", "t")
+        replayed = self.skel("app", "u", patch=WITHOUT_LXML)
+        self.assertEqual(compiled.replace(self.target("t"), self.target("u")), replayed)
+        self.assertEqual(self.tree(self.target("t")), self.tree(self.target("u")))
+
+    def test_plan_is_replayed_in_every_target(self):
+        output = self.skel("app", "a", os.path.join("b", "c"))
+        self.assertIn("✔ Created  directory : \"{}\"".format(self.target("b")), output)
+        self.assertEqual(self.tree(self.target("a")), self.tree(self.target("b", "c")))
+
+    def test_existing_entries_are_skipped(self):
+        self.skel("app", "t")
+        with open(self.target("t", "README.md"), "w") as f:
+            f.write("Kept")
+        output = self.skel("app", "t")
+        self.assertNotIn("✔", output)
+        self.assertIn("✘ Skipping file      : \"{}\"".format(self.target("t", "README.md")), output)
+        with open(self.target("t", "README.md")) as f:
+            self.assertEqual(f.read(), "Kept")
+
+    def test_clashing_entries_skip_their_subtree(self):
+        os.makedirs(self.target("t"))
+        with open(self.target("t", "src"), "w"):
+            pass
+        output = self.skel("app", "t")
+        self.assertIn("A file already exists at {}".format(self.target("t", "src")), output)
+        self.assertFalse(os.path.exists(self.target("t", "src", "pkg")))
+        self.assertTrue(os.path.isdir(self.target("t", "docs")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from support import SkelTestCase
+
+
+class RepeatTest(SkelTestCase):
+    def test_copies_are_created_with_formatted_names(self):
+        self.add_template("shards", '<root><dir name="shard{i:03d}" repeat="8..10"><file name="{{{i}}}" repeat="1..1"/></dir></root>')
+        self.skel("shards", "t")
+        self.assertEqual(set(self.tree(self.target("t"))), {
+            "shard008", "shard008/{1}", "shard009", "shard009/{1}", "shard010", "shard010/{1}",
+        })
+
+    def test_nested_repeats(self):
+        self.add_template("grid", '<root><dir name="r{i}" repeat="0..1"><file name="c{i}" repeat="0..2"/></dir></root>')
+        self.skel("grid", "t")
+        self.assertEqual(len(self.tree(self.target("t"))), 2 + 2 * 3)
+
+    def test_invalid_names_are_reported(self):
+        for name in ("a{i[0]}", "{i.real}", "{i!r}", "{i:c}", "{i:/>4}", "{j}", "{}", "plain", "{i"):
+            with self.subTest(name=name):
+                self.add_template("bad", '<root><dir name="{}" repeat="47..48"/></root>'.format(name.replace(">", "&gt;")))
+                output = self.skel("bad", "t")
+                self.assertIn("Invalid 'name' in <dir>", output)
+                self.assertNotIn("Traceback", output)
+                self.assertEqual(self.tree(self.targets_dir), {})
+
+    def test_names_longer_than_name_max_are_reported(self):
+        for name, repeat in (("a{i:1000000000}", "0..1"), ("a{i:256}", "0..1"), ("{}{{i}}".format("a" * 254), "0..10"),
+                             ("{}{{i:0255d}}".format("é"), "0..1")):
+            with self.subTest(name=name):
+                self.add_template("long", '<root><file name="{}" repeat="{}"/></root>'.format(name, repeat))
+                output = self.skel("long", "t")
+                self.assertIn("Invalid 'name' in <file>", output)
+                self.assertIn("cannot be longer than 255 bytes", output)
+                self.assertEqual(self.tree(self.targets_dir), {})
+        self.add_template("long", '<root><file name="{}{{i}}" repeat="0..9"/><dir name="{{i:0255}}" repeat="0..0"/></root>'.format("a" * 254))
+        self.skel("long", "t")
+        self.assertEqual(len(self.tree(self.target("t"))), 11)
+
+    def test_repeat_is_only_valid_on_dirs_and_files(self):
+        self.add_template("lib", '<root><file name="lib.py"/></root>')
+        for template in ('<root repeat="0..1"><dir name="d"/></root>', '<root><include template="lib" repeat="0..1"/></root>'):
+            with self.subTest(template=template):
+                self.add_template("bad", template)
+                output = self.skel("bad", "t")
+                tag = "include" if "include" in template else "root"
+                self.assertIn("Invalid 'repeat' in <{}>".format(tag), output)
+                self.assertIn("only applies to <dir> and <file> elements", output)
+                self.assertEqual(self.tree(self.targets_dir), {})
+
+    def test_invalid_ranges_are_reported(self):
+        for repeat in ("", "1", "2..1", "a..b", "-1..2", "²..3", "0..{}".format("9" * 5000)):
+            with self.subTest(repeat=repeat):
+                self.add_template("bad", '<root><file name="f{{i}}" repeat="{}"/></root>'.format(repeat))
+                output = self.skel("bad", "t")
+                self.assertIn("Invalid 'repeat' in <file>", output)
+                self.assertNotIn("Traceback", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import json, os, unittest
+
+from support import SkelTestCase
+
+
+class ReportingTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_src_file("license.txt", "MIT")
+        self.add_template("app", '<root><dir name="src"><file name="main.py"/></dir><file name="LICENSE" src="license.txt"/></root>')
+        os.makedirs(self.target("t", "src"))
+
+    def test_pretty(self):
+        output = self.skel("app", "t")
+        self.assertEqual(output.splitlines()[:4], [
+            "✘ Skipping directory : \"{}\"".format(self.target("t")),
+            "✘ Skipping directory : \"{}\"".format(self.target("t", "src")),
+            "✔ Created  file      : \"{}\"".format(self.target("t", "src", "main.py")),
+            "✔ Created  file      : \"{}\"".format(self.target("t", "LICENSE")),
+        ])
+
+    def test_quiet(self):
+        output = self.skel("--quiet", "app", "t")
+        self.assertEqual(output, "Created 0 directories, 2 files; Skipped 2 directories, 0 files\n")
+
+    def test_jsonl(self):
+        records = [json.loads(line) for line in self.skel("--format", "jsonl", "app", "t").splitlines()]
+        entries = [record for record in records if record["event"] == "entry"]
+        self.assertEqual([(record["type"], record["path"], record["status"]) for record in entries], [
+            ("directory", self.target("t"), "skipped"),
+            ("directory", self.target("t", "src"), "skipped"),
+            ("file", self.target("t", "src", "main.py"), "created"),
+            ("file", self.target("t", "LICENSE"), "created"),
+        ])
+        license = entries[-1]
+        self.assertEqual(license["src"], os.path.join(self.filesrc_dir, "license.txt"))
+        self.assertEqual(license["bytes"], 3)
+        self.assertIn("method", license)
+        self.assertEqual(records[-1], {"event": "summary", "counts": {"skipped directory": 2, "created file": 2}})
+
+    def test_quiet_jsonl_only_writes_the_summary(self):
+        output = self.skel("--quiet", "--format", "jsonl", "app", "t")
+        self.assertEqual([json.loads(line)["event"] for line in output.splitlines()], ["summary"])
+
+    def test_ignored_children(self):
+        self.add_template("app", '<root><file name="a"><dir name="b"/></file></root>')
+        self.assertIn("❗Ignoring the child elements of <file name=\"a\">", self.skel("app", "t"))
+        records = [json.loads(line) for line in self.skel("--format", "jsonl", "app", "u").splitlines()]
+        self.assertIn({"event": "ignored-children", "path": self.target("u", "a")}, records)
+
+    def test_large_output_is_complete(self):
+        # The output is buffered, and written in chunks
+        self.add_template("app", "<root>{}</root>".format("".join('<file name="f{}"/>'.format(n) for n in range(5000))))
+        output = self.skel("app", "t")
+        self.assertEqual(output.count("✔ Created  file"), 5000)
+        self.assertTrue(output.rstrip().endswith("f4999\""))
+
+
+if __name__ == "__main__":
+    unittest.main()
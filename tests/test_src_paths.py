@@ -0,0 +1,66 @@
+import os, unittest
+
+from support import SkelTestCase
+
+# Reports how many times the src file "data.txt" was stat()ed once skel is done
+COUNT_STATS = """
+import atexit, os
+calls = [0]
+real_stat = os.stat
+def counting_stat(path, *args, **kwargs):
+    if str(path).endswith("data.txt"):
+        calls[0] += 1
+    return real_stat(path, *args, **kwargs)
+os.stat = counting_stat
+atexit.register(lambda: print("stat() calls: {}".format(calls[0])))
+"""
+
+
+class SrcPathsTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = self.add_src_file("data.txt", "data")
+
+    def add_files(self, count, *, src):
+        self.add_template("app", "<root>\n{}</root>".format("".join(
+            '<file name="f{}" src="{}"/>\n'.format(n, src) for n in range(count))))
+
+    def test_each_distinct_src_path_is_checked_once(self):
+        calls = []
+        for count in (10, 1000):
+            self.add_files(count, src="data.txt")
+            output = self.skel("--quiet", "app", "t{}".format(count), patch=COUNT_STATS)
+            self.assertIn("Created 1 directory, {} files".format(count), output)
+            calls.append(output.rsplit("stat() calls: ", 1)[1].strip())
+        self.assertEqual(calls[0], calls[1])
+
+    def test_missing_src_file_is_reported_once(self):
+        self.add_files(3, src="missing.txt")
+        output = self.skel("app", "t")
+        self.assertEqual(output.count("Invalid 'src' in <file>"), 1)
+        self.assertIn("Invalid 'src' in <file> (line: 2, 3, 4)", output)
+        self.assertIn("The file \"{}\" does not exist".format(os.path.join(self.filesrc_dir, "missing.txt")), output)
+        self.assertFalse(os.path.exists(self.target("t")))
+
+    def test_src_directory_is_reported(self):
+        os.mkdir(os.path.join(self.filesrc_dir, "docs"))
+        self.add_files(1, src="docs")
+        self.assertIn("The path \"{}\" belongs to a directory".format(os.path.join(self.filesrc_dir, "docs")), self.skel("app", "t"))
+
+    def test_absolute_src_paths(self):
+        outside = os.path.join(self.workdir, "outside.txt")
+        with open(outside, "w") as f:
+            f.write("outside")
+        self.add_template("app", '<root><file name="a" src="{}"/><file name="b" src="{}"/><file name="c" src="data.txt"/></root>'.format(
+            outside, os.path.join(self.workdir, "missing.txt")))
+        output = self.skel("app", "t")
+        self.assertIn("The file \"{}\" does not exist".format(os.path.join(self.workdir, "missing.txt")), output)
+        self.assertNotIn("outside.txt", output)
+        self.assertNotIn("data.txt", output)
+        self.add_template("app", '<root><file name="a" src="{}"/><file name="c" src="data.txt"/></root>'.format(outside))
+        self.skel("app", "t")
+        self.assertEqual(self.tree(self.target("t")), {"a": "outside", "c": "data"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import json, unittest
+
+from support import SkelTestCase
+
+
+class SrcCacheTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_src_file("a.txt", "aaaaaa")
+        self.add_src_file("b.txt", "bbbbbb")
+        self.add_src_file("big.txt", "x" * 100)
+        # a and b alternate, so a budget that only fits one of them evicts on every lookup
+        self.add_template("app", '<root>{}<file name="big" src="big.txt"/></root>'.format("".join(
+            '<file name="a{0}" src="a.txt"/><file name="b{0}" src="b.txt"/>'.format(n) for n in range(3))))
+
+    def src_cache_counts(self, *args):
+        # With --link copy, every copy is written from the cache (no reflink is attempted first)
+        output = self.skel("--stats", "--quiet", "--format", "jsonl", "--link", "copy", *args)
+        stats = [json.loads(line) for line in output.splitlines() if '"event": "stats"' in line]
+        return stats[0]["src_cache"]
+
+    def expected_tree(self):
+        tree = {"big": "x" * 100}
+        for n in range(3):
+            tree.update({"a{}".format(n): "aaaaaa", "b{}".format(n): "bbbbbb"})
+        return tree
+
+    def test_counts_are_only_reported_with_stats(self):
+        output = self.skel("--link", "copy", "app", "t")
+        self.assertNotIn("Source cache", output)
+        self.assertIn("Source cache:                  4 hits, 3 misses, 0 evictions", self.skel("--stats", "--link", "copy", "app", "t2"))
+
+    def test_hits(self):
+        self.assertEqual(self.src_cache_counts("app", "t"), {"hits": 4, "misses": 3, "evictions": 0})
+        self.assertEqual(self.tree(self.target("t")), self.expected_tree())
+
+    def test_least_recently_used_files_are_evicted(self):
+        # Files larger than the budget (big.txt) are never cached
+        self.assertEqual(self.src_cache_counts("--src-cache", "10", "app", "t"), {"hits": 0, "misses": 7, "evictions": 5})
+        self.assertEqual(self.tree(self.target("t")), self.expected_tree())
+        self.assertEqual(self.src_cache_counts("--src-cache", "12", "app", "t2"), {"hits": 4, "misses": 3, "evictions": 0})
+        self.assertEqual(self.tree(self.target("t2")), self.expected_tree())
+
+    def test_cache_is_shared_by_the_targets(self):
+        self.assertEqual(self.src_cache_counts("app", "t0", "t1"), {"hits": 11, "misses": 3, "evictions": 0})
+        self.assertEqual(self.tree(self.target("t1")), self.expected_tree())
+
+    def test_disabled_cache(self):
+        self.assertEqual(self.src_cache_counts("--src-cache", "0", "app", "t"), {})
+        self.assertEqual(self.tree(self.target("t")), self.expected_tree())
+
+    def test_modified_src_file_isnt_served_from_the_cache(self):
+        self.skel("app", "t")
+        self.add_src_file("a.txt", "AAAAAA")
+        self.skel("app", "t2")
+        self.assertEqual(self.tree(self.target("t2"))["a2"], "AAAAAA")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import json, os, pstats, unittest
+
+from support import SkelTestCase
+
+# Reports whether any function of the skel modules was replaced once skel is done
+REPORT_PATCHED_FUNCTIONS = """
+import atexit
+from utils import compiler, creation, operations, reporting, validators
+modules = (compiler, creation, operations, reporting, validators)
+originals = [dict(vars(module)) for module in modules]
+def report_patched_functions():
+    patched = [name for module, functions in zip(modules, originals)
+               for name, function in functions.items() if callable(function) and vars(module)[name] is not function]
+    print("Patched functions: {}".format(", ".join(patched) or "none"))
+atexit.register(report_patched_functions)
+"""
+
+
+class StatsTest(SkelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_src_file("data.txt", "data")
+        self.add_template("app", '<root><dir name="d"><file name="f"/></dir><file name="c" src="data.txt"/></root>')
+
+    def test_pretty_statistics(self):
+        output = self.skel("--stats", "app", "t")
+        statistics = output.split("Statistics:\n", 1)[1]
+        for phase in ("parse_template", "validate", "generate_skeleton", "create entries", "write output"):
+            self.assertIn(" {} ".format(phase), statistics)
+        self.assertIn("Created:                       2 directories, 2 files", statistics)
+        self.assertIn("Bytes copied:                  4", statistics)
+        self.assertIn("file       \"{}\"".format(self.target("t", "c")), statistics)
+        # The second run uses the cached template, and skips everything
+        statistics = self.skel("--stats", "app", "t").split("Statistics:\n", 1)[1]
+        self.assertIn(" load cached template ", statistics)
+        self.assertNotIn(" validate ", statistics)
+        self.assertIn("Skipped:                       2 directories, 2 files", statistics)
+
+    def test_jsonl_statistics(self):
+        records = [json.loads(line) for line in self.skel("--stats", "--quiet", "--format", "jsonl", "app", "t").splitlines()]
+        stats = [record for record in records if record["event"] == "stats"]
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]["counts"], {"created directory": 2, "created file": 2})
+        self.assertEqual(stats[0]["bytes_copied"], 4)
+        self.assertLessEqual(stats[0]["phases_ms"]["create entries"], stats[0]["phases_ms"]["generate_skeleton"])
+        self.assertEqual({entry["path"] for entry in stats[0]["slowest"]},
+                         {self.target("t"), self.target("t", "d"), self.target("t", "d", "f"), self.target("t", "c")})
+
+    def test_statistics_dont_patch_any_module(self):
+        output = self.skel("--stats", "--jobs", "2", "app", "t0", "t1", patch=REPORT_PATCHED_FUNCTIONS)
+        self.assertIn("Statistics:", output)
+        self.assertIn("Patched functions: none", output)
+
+    def test_no_statistics_by_default(self):
+        self.assertNotIn("Statistics:", self.skel("app", "t"))
+
+    def test_profile(self):
+        profile = os.path.join(self.workdir, "skel.prof")
+        output = self.skel("--profile", profile, "app", "t")
+        self.assertIn("Created  file", output)
+        self.assertTrue(os.path.isfile(self.target("t", "c")))
+        functions = {function for _, _, function in pstats.Stats(profile).stats}
+        self.assertIn("generate_skeleton", functions)
+
+
+if __name__ == "__main__":
+    unittest.main()